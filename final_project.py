@@ -1,50 +1,213 @@
+from __future__ import annotations
+
+import argparse
 import asyncio
+import hashlib
+import hmac
+import json
 import logging
-from pathlib import Path
+import multiprocessing
 import os
+import re
+import secrets
+import sqlite3
+import threading
+import time
+import urllib.request
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import closing, contextmanager
+from datetime import datetime, timezone
+from http import HTTPStatus
+from importlib.util import find_spec
+from pathlib import Path
+from textwrap import shorten
+from typing import TYPE_CHECKING, Iterator
+
 if "KMP_DUPLICATE_LIB_OK" not in os.environ:
     os.environ["KMP_DUPLICATE_LIB_OK"] = "TRUE"
 
+MODULE_STARTED = time.perf_counter()
+
 PERSIST_DIR = "policy_index"  # on-disk Chroma DB for policies
+COLLECTION_NAME = "usafa_policy_rag"
+# Sits next to PERSIST_DIR; records what is already embedded so restarts can skip it.
+MANIFEST_PATH = Path(f"{PERSIST_DIR}_manifest.json")
+MANIFEST_VERSION = 1
+# Bump when the stored chunk format/metadata changes; forces a full re-ingest.
+INGEST_VERSION = 4
+EMBED_MODEL_NAME = "all-MiniLM-L6-v2"
+# Semantic answer cache for the REPL (see policy_cache.AnswerCache).
+ANSWER_CACHE_SIZE = int(os.environ.get("ANSWER_CACHE_SIZE", "256"))
+ANSWER_CACHE_TTL_S = float(os.environ.get("ANSWER_CACHE_TTL_S", "86400"))
+ANSWER_CACHE_THRESHOLD = float(os.environ.get("ANSWER_CACHE_THRESHOLD", "0.95"))
+# Defaults for command-line options, defined up here so the parser needs nothing heavy.
+EMBED_BATCH_SIZE = int(os.environ.get("EMBED_BATCH_SIZE", "64"))  # chunks per forward pass
+CHECK_CONCURRENCY = int(os.environ.get("CHECK_CONCURRENCY", "4"))  # documents reviewed at once
+CHECK_REPORT_DIRNAME = "compliance_reports"  # created inside the checked directory
+CHECK_SUMMARY_NAME = "summary.jsonl"
+SERVE_PORT = int(os.environ.get("POLICY_API_PORT", "8765"))  # --serve on 127.0.0.1
+
+# --------------- STARTUP PROFILING ---------------
+
+# (step, seconds) in completion order, printed by --profile-startup.
+STARTUP_TIMINGS: list[tuple[str, float]] = []
+
+
+@contextmanager
+def startup_phase(name: str):
+    """Time one startup step (an import, model load or index check) for --profile-startup."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STARTUP_TIMINGS.append((name, time.perf_counter() - started))
 
 
-import argparse
-import urllib.request
-from textwrap import shorten
+def print_startup_profile() -> None:
+    print("\n⏱️  Startup profile (background steps overlap the others):")
+    for name, seconds in STARTUP_TIMINGS:
+        print(f"   {seconds * 1000:9.1f} ms  {name}")
+    print(f"   {(time.perf_counter() - MODULE_STARTED) * 1000:9.1f} ms  total since module start\n")
 
-# Optional dependencies for vector store and PDF/OCR
-try:
-    import chromadb
-    CHROMADB_LOADED = True
-except ImportError:
-    print("chromadb not found. Run 'pip install chromadb'")
-    chromadb = None
-    CHROMADB_LOADED = False
 
-try:
-    from pypdf import PdfReader
-    PYPDF_AVAILABLE = True
-except ImportError:
-    PdfReader = None
-    PYPDF_AVAILABLE = False
+# --------------- COMMAND LINE ---------------
+
+def positive_int(value: str) -> int:
+    """argparse type for counts that must be at least 1 (workers, batch sizes, ...)."""
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid int value: {value!r}") from None
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {number}")
+    return number
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="USAFA Policy RAG Assistant"
+    )
+    parser.add_argument(
+        "--check-doc",
+        dest="check_doc",
+        type=str,
+        help="Path to a document to check for compliance against USAFA standards.",
+    )
+    parser.add_argument(
+        "--check-dir",
+        dest="check_dir",
+        type=str,
+        metavar="DIR",
+        help=(
+            "Review every .txt/.md/.pdf file in DIR for compliance; writes per-file reports and "
+            f"a {CHECK_SUMMARY_NAME} summary to DIR/{CHECK_REPORT_DIRNAME}. Already-reviewed files are skipped."
+        ),
+    )
+    parser.add_argument(
+        "--concurrency",
+        dest="concurrency",
+        type=positive_int,
+        default=CHECK_CONCURRENCY,
+        metavar="N",
+        help=f"Documents reviewed at once with --check-dir (default: {CHECK_CONCURRENCY}).",
+    )
+    parser.add_argument(
+        "--build-index-only",
+        dest="build_index_only",
+        action="store_true",
+        help="Ingest policies into the vector store and exit (no CLI interaction).",
+    )
+    parser.add_argument(
+        "--workers",
+        dest="workers",
+        type=positive_int,
+        default=None,
+        metavar="N",
+        help="Worker processes for PDF/OCR extraction during ingestion (default: CPU count).",
+    )
+    parser.add_argument(
+        "--embed-batch-size",
+        dest="embed_batch_size",
+        type=positive_int,
+        default=EMBED_BATCH_SIZE,
+        metavar="N",
+        help=f"Chunks per embedding forward pass during ingestion (default: {EMBED_BATCH_SIZE}).",
+    )
+    parser.add_argument(
+        "--embed-processes",
+        dest="embed_processes",
+        type=positive_int,
+        default=1,
+        metavar="N",
+        help="Encode chunks in N worker processes instead of one multi-threaded process (default: 1).",
+    )
+    parser.add_argument(
+        "--serve",
+        dest="serve",
+        action="store_true",
+        help="Run as a long-lived local API daemon (see policy_client.py) instead of the CLI loop.",
+    )
+    parser.add_argument(
+        "--port",
+        dest="port",
+        type=int,
+        default=SERVE_PORT,
+        metavar="N",
+        help=f"Localhost port for --serve (default: {SERVE_PORT}, or POLICY_API_PORT).",
+    )
+    parser.add_argument(
+        "--socket",
+        dest="socket_path",
+        type=str,
+        default=None,
+        metavar="PATH",
+        help="Serve on this Unix socket instead of a localhost port.",
+    )
+    parser.add_argument(
+        "--profile-startup",
+        dest="profile_startup",
+        action="store_true",
+        help="Print how long each startup step (imports, model load, index check) took.",
+    )
+    parser.add_argument(
+        "--fake-llm",
+        dest="fake_llm",
+        action="store_true",
+        help="Use the offline scripted LLM stand-in instead of OpenAI (also POLICY_LLM=fake).",
+    )
+    parser.add_argument(
+        "--clear-ocr-cache",
+        dest="clear_ocr_cache",
+        action="store_true",
+        help="Delete the cached per-page OCR results before ingesting.",
+    )
+    return parser
+
+
+# Parse the command line before fairlib, chromadb and the model stack are
+# imported, so --help and usage errors return immediately.
+CLI_ARGS = build_arg_parser().parse_args() if __name__ == "__main__" else None
+
+
+# Optional dependencies for vector store and PDF/OCR. Only their presence is
+# checked here; each is imported on first use so --help and the index check
+# never wait on them.
+CHROMADB_AVAILABLE = find_spec("chromadb") is not None
+PYPDF_AVAILABLE = find_spec("pypdf") is not None
 
 # Optional OCR support for image-only PDFs (EXORD, etc.)
-try:
-    from pdf2image import convert_from_path
-    import pytesseract
-    # Point pytesseract directly to the Homebrew-installed tesseract binary
-    # Adjust this if `which tesseract` gives a different path.
-    pytesseract.pytesseract.tesseract_cmd = "/opt/homebrew/bin/tesseract"
-    OCR_AVAILABLE = True
-except ImportError:
-    OCR_AVAILABLE = False
+OCR_AVAILABLE = find_spec("pdf2image") is not None and find_spec("pytesseract") is not None
+# Point pytesseract directly to the Homebrew-installed tesseract binary
+# Adjust this if `which tesseract` gives a different path.
+TESSERACT_CMD = "/opt/homebrew/bin/tesseract"
 
 
-# Optional: handle pdf2image's need for Poppler (pdfinfo, etc.)
-try:
-    from pdf2image.exceptions import PDFInfoNotInstalledError
-except ImportError:
-    PDFInfoNotInstalledError = Exception  # fallback
+def load_pytesseract():
+    """Import pytesseract on first OCR use, pointed at TESSERACT_CMD."""
+    import pytesseract
+    pytesseract.pytesseract.tesseract_cmd = TESSERACT_CMD
+    return pytesseract
+
 
 # Try to detect Poppler path (Homebrew on Apple Silicon/Intel)
 POPPLER_PATH = None
@@ -61,22 +224,32 @@ if OCR_AVAILABLE:
             POPPLER_PATH = "/usr/local/bin"
 
 
-from fairlib.utils.document_processor import DocumentProcessor
-
-from fairlib import (
-    settings,
-    OpenAIAdapter,
-    ToolRegistry,
-    ToolExecutor,
-    WorkingMemory,
-    LongTermMemory,
-    ChromaDBVectorStore,
-    ReActPlanner,
-    SimpleAgent,
-    SentenceTransformerEmbedder,
-    SimpleRetriever,
-    KnowledgeBaseQueryTool,
-)
+# fairlib loads its components lazily, so only the light core is imported here;
+# the agent classes, OpenAIAdapter and the embedder are imported where used.
+with startup_phase("import fairlib core"):
+    from fairlib import settings
+    from fairlib.core.interfaces.memory import AbstractRetriever
+    from fairlib.core.types import Document
+    from fairlib.core.message import Message
+
+with startup_phase("import policy_cache, policy_search"):
+    from policy_cache import AnswerCache, EmbeddingCache, index_version, normalize_question
+    from policy_search import (
+        CROSS_ENCODER_AVAILABLE,
+        BM25Index,
+        CrossEncoderReranker,
+        count_tokens,
+        hybrid_query,
+        pack_context,
+        truncate_to_tokens,
+    )
+
+# Subclasses fairlib's chat model interface, so it is timed on its own.
+with startup_phase("import policy_fake_llm"):
+    from policy_fake_llm import LLM_BACKEND, FakeLLM
+
+if TYPE_CHECKING:
+    from fairlib import SimpleAgent
 
 # ----------------- BASIC CONFIG -----------------
 
@@ -123,100 +296,1381 @@ def split_text(text: str, chunk_size: int = 3000, chunk_overlap: int = 200) -> l
     return chunks
 
 
+# --------------- STRUCTURE-AWARE CHUNKER ---------------
+
+# AFI/AFCWI paragraph numbers at the start of a line: "3.", "3.1", "3.5.1.C4Cs ..."
+PARA_NUMBER_RE = re.compile(r"^\s*((?:\d{1,2}\.)+\d{0,2})\s*(?=[A-Z“\"(])")
+MARKDOWN_HEADING_RE = re.compile(r"^\s*(#{1,6})\s+(.+?)\s*#*\s*$")
+CHAPTER_RE = re.compile(r"^\s*(Chapter\s+\d+)\s*[–—-]?\s*(.*)$", re.IGNORECASE)
+# Outline headings: "IV. Other Notable Changes" (roman), then "B. Headgear" (lettered).
+ROMAN_HEADING_RE = re.compile(r"^\s*([IVX]{1,5})\.\s+([A-Z][^.:]{0,80})$")
+LETTER_HEADING_RE = re.compile(r"^\s*([A-Z])\.\s+([A-Z][^.:]{0,80})$")
+# MFR preamble blocks; only recognized before the first numbered paragraph or chapter.
+MFR_BLOCK_RE = re.compile(
+    r"^\s*(MEMORANDUM FOR|SUBJECT|REFERENCES|APPLICABILITY|PURPOSE|ATTACHMENTS?)\b\s*:?"
+)
+# Table-of-contents entries ("2.1. Customs and Courtesies<TAB>5") are not section starts.
+TOC_LINE_RE = re.compile(r"(\t\s*\d+\s*$)|(\.{4,}\s*\d+\s*$)|(\s{3,}\d+\s*$)")
+# Chunks smaller than this (TOC residue, the tail of a split section) join a neighbour.
+MIN_CHUNK_TOKENS = 32
+
+
+def approx_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token) for chunk budgeting."""
+    return max(1, len(text) // 4)
+
+
+def _short_title(text: str, max_words: int = 8) -> str:
+    """First sentence/phrase of a heading line, trimmed to a few words."""
+    title = re.split(r"(?<=[a-z\)])\.\s|:\s", text.strip(), maxsplit=1)[0].strip(" .:")
+    words = title.split()
+    return " ".join(words[:max_words]) + (" …" if len(words) > max_words else "")
+
+
+def detect_heading(line: str, in_preamble: bool = True) -> tuple[int, str] | None:
+    """
+    Return (level, label) if a line starts a section, else None. Levels:
+    markdown '#'/chapters/MFR blocks are outermost, then roman and lettered
+    outline headings, and numbered paragraphs by depth ("3" < "3.2" < "3.2.1").
+    MFR blocks only count in the preamble.
+    """
+    if not line.strip() or TOC_LINE_RE.search(line):
+        return None
+    m = MARKDOWN_HEADING_RE.match(line)
+    if m:
+        return len(m.group(1)) - 1, _short_title(m.group(2))
+    m = CHAPTER_RE.match(line)
+    if m:
+        title = _short_title(m.group(2))
+        return 0, f"{m.group(1)} {title}".strip()
+    m = MFR_BLOCK_RE.match(line) if in_preamble else None
+    if m:
+        return 1, m.group(1).upper()
+    for level, pattern in ((1, ROMAN_HEADING_RE), (2, LETTER_HEADING_RE)):
+        m = pattern.match(line)
+        if m:
+            return level, f"{m.group(1)}. {_short_title(m.group(2))}"
+    m = PARA_NUMBER_RE.match(line)
+    if m:
+        number = m.group(1).rstrip(".")
+        depth = number.count(".") + 1
+        title = _short_title(line[m.end():])
+        return depth, f"{number} {title}".strip()
+    return None
+
+
+def split_into_sections(text: str) -> list[dict]:
+    """
+    Split text into section blocks, in document order. Pages are separated by
+    form feeds ("\\f") in extracted PDF text; each block records the pages it
+    spans, or None for unpaginated documents.
+    """
+    paginated = "\f" in text
+    sections: list[dict] = []
+    stack: list[tuple[int, str]] = []
+    current_lines: list[str] = []
+    current_pages: list[int] = []
+    current_path = ""
+    chapter = ""
+    in_preamble = True
+
+    def flush() -> None:
+        body = "\n".join(current_lines).strip()
+        if body:
+            sections.append(
+                {
+                    "section_path": current_path,
+                    "chapter": chapter,
+                    "text": body,
+                    "page_start": min(current_pages) if paginated else None,
+                    "page_end": max(current_pages) if paginated else None,
+                }
+            )
+
+    for page_no, page in enumerate(text.split("\f"), start=1):
+        for line in page.splitlines():
+            heading = detect_heading(line, in_preamble)
+            if heading is not None:
+                level, label = heading
+                chapter_no = re.match(r"Chapter\s+(\d+)", chapter)
+                para_no = PARA_NUMBER_RE.match(line)
+                # Inside "Chapter 4", only 4.x paragraphs are headings; "1. Athletic
+                # Fields" style lists stay part of the body.
+                if chapter_no and para_no and para_no.group(1).split(".")[0] != chapter_no.group(1):
+                    heading = None
+            if heading is not None:
+                if not MFR_BLOCK_RE.match(line):
+                    in_preamble = False
+                flush()
+                current_lines = []
+                current_pages = []
+                while stack and stack[-1][0] >= level:
+                    stack.pop()
+                stack.append((level, label))
+                current_path = " > ".join(label for _, label in stack)
+                if level == 0:
+                    chapter = label
+            current_lines.append(line)
+            if line.strip():
+                current_pages.append(page_no)
+    flush()
+    return sections
+
+
+def _split_oversized(text: str, max_tokens: int) -> list[str]:
+    """Break one section that exceeds the budget on paragraph, then character, boundaries."""
+    pieces: list[str] = []
+    current = ""
+    for para in re.split(r"\n\s*\n", text):
+        candidate = f"{current}\n\n{para}" if current else para
+        if approx_tokens(candidate) <= max_tokens:
+            current = candidate
+            continue
+        if current:
+            pieces.append(current)
+        if approx_tokens(para) <= max_tokens:
+            current = para
+        else:
+            pieces.extend(split_text(para, chunk_size=max_tokens * 4, chunk_overlap=0))
+            current = ""
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def section_range(first: str, last: str) -> str:
+    """Path label for a chunk packing several sections: "Ch 3 > 3.1 A – 3.4 B"."""
+    if not last or last == first:
+        return first
+    if not first:
+        return last
+    head, tail = first.split(" > "), last.split(" > ")
+    shared = 0
+    while shared < min(len(head), len(tail) - 1) and head[shared] == tail[shared]:
+        shared += 1
+    return f"{first} – {' > '.join(tail[shared:])}"
+
+
+def chunk_by_sections(text: str, max_tokens: int = 512) -> list[dict]:
+    """
+    Structure-aware chunker for the policy corpus: recognizes AFI/AFCWI paragraph
+    numbering, chapter and markdown headings and MFR blocks, and packs whole
+    consecutive sections (never across chapters) up to max_tokens. Fragments
+    under MIN_CHUNK_TOKENS are merged into the chunk before them (or after, at
+    the start). A packed chunk's section_path spans its first and last section
+    (see section_range). Returns [{"text", "section_path", "page_start", "page_end"}] in document order.
+    """
+    chunks: list[dict] = []
+    current: dict | None = None
+
+    for section in split_into_sections(text):
+        body = section["text"]
+        if approx_tokens(body) > max_tokens:
+            if current:
+                chunks.append(current)
+                current = None
+            chunks.extend({**section, "text": piece} for piece in _split_oversized(body, max_tokens))
+            continue
+        if (
+            current
+            and current["chapter"] == section["chapter"]
+            and approx_tokens(current["text"]) + approx_tokens(body) <= max_tokens
+        ):
+            current["text"] += "\n" + body
+            current["section_path_end"] = section["section_path"]
+            if section["page_end"] is not None:
+                current["page_end"] = max(current["page_end"], section["page_end"])
+            continue
+        if current:
+            chunks.append(current)
+        current = dict(section)
+    if current:
+        chunks.append(current)
+
+    merged: list[dict] = []
+    for c in chunks:
+        if not merged or min(approx_tokens(c["text"]), approx_tokens(merged[-1]["text"])) >= MIN_CHUNK_TOKENS:
+            merged.append(dict(c))
+            continue
+        prev = merged[-1]
+        prev["text"] += "\n" + c["text"]
+        if not prev["section_path"]:
+            prev["section_path"] = c["section_path"]
+        prev["section_path_end"] = c.get("section_path_end") or c["section_path"]
+        if c["page_end"] is not None:
+            prev["page_start"] = min(prev["page_start"], c["page_start"])
+            prev["page_end"] = max(prev["page_end"], c["page_end"])
+    chunks = merged
+
+    return [
+        {
+            "text": c["text"],
+            "section_path": section_range(c["section_path"], c.get("section_path_end", "")),
+            "page_start": c["page_start"],
+            "page_end": c["page_end"],
+        }
+        for c in chunks
+    ]
+
+
+def extract_pdf_page_range(path_str: str, start: int, stop: int) -> list[str]:
+    """pypdf text for pages [start, stop) of one PDF (top-level so a process pool can run it)."""
+    from pypdf import PdfReader
+
+    reader = PdfReader(path_str)
+    return [reader.pages[i].extract_text() or "" for i in range(start, stop)]
+
+
+def pdf_page_count(path: Path) -> int:
+    """Number of pages in a PDF, or 0 if pypdf is missing or cannot open it."""
+    if not PYPDF_AVAILABLE:
+        return 0
+    from pypdf import PdfReader
+
+    try:
+        return len(PdfReader(str(path)).pages)
+    except Exception as e:
+        logger.error("pypdf failed on %s: %s", path, e, exc_info=True)
+        return 0
+
+
 def extract_pdf_text_basic(path: Path) -> str:
     """Basic PDF text extraction using pypdf, if available."""
     if not PYPDF_AVAILABLE:
         logger.warning("pypdf not installed; cannot extract PDF text for %s", path)
         return ""
     try:
-        reader = PdfReader(str(path))
-        text_parts = []
-        for page in reader.pages:
-            page_text = page.extract_text() or ""
-            text_parts.append(page_text)
-        return "\n".join(text_parts)
+        page_count = pdf_page_count(path)
+        return "\f".join(extract_pdf_page_range(str(path), 0, page_count))
     except Exception as e:
         logger.error("pypdf failed on %s: %s", path, e, exc_info=True)
         return ""
 
 
-try:
-    from pdf2image.exceptions import PDFInfoNotInstalledError
-except ImportError:
-    PDFInfoNotInstalledError = Exception  # fallback
+def ocr_available_for(path: Path) -> bool:
+    """Check OCR prerequisites (libraries + Poppler), logging why OCR is skipped."""
+    if not OCR_AVAILABLE:
+        logger.warning(
+            "OCR libraries (pdf2image + pytesseract) not installed; cannot OCR %s",
+            path,
+        )
+        return False
+
+    if POPPLER_PATH is None:
+        logger.warning(
+            "POPPLER_PATH is not set and pdfinfo is not auto-detected; "
+            "skipping OCR for %s.",
+            path,
+        )
+        return False
+    return True
+
+
+def ocr_pdf_page(path_str: str, page_no: int) -> str:
+    """Rasterize and OCR a single page, so a worker never holds more than one page image."""
+    from pdf2image import convert_from_path
+
+    # Tell pdf2image explicitly where Poppler lives
+    images = convert_from_path(
+        path_str,
+        dpi=OCR_DPI,
+        poppler_path=POPPLER_PATH,
+        first_page=page_no,
+        last_page=page_no,
+    )
+    return load_pytesseract().image_to_string(images[0]) if images else ""
+
+
+def pdf_page_count_poppler(path: Path) -> int:
+    """Page count via Poppler's pdfinfo, for PDFs pypdf cannot open."""
+    from pdf2image import pdfinfo_from_path
+
+    info = pdfinfo_from_path(str(path), poppler_path=POPPLER_PATH)
+    return int(info.get("Pages", 0))
+
+
+# --------------- OCR PAGE CACHE ---------------
+
+OCR_DPI = 200  # pdf2image's default; part of the cache key
+OCR_CACHE_PATH = Path(PERSIST_DIR) / "ocr_cache.sqlite3"
+OCR_CACHE_MAX_BYTES = int(os.environ.get("OCR_CACHE_MAX_MB", "256")) * 1024 * 1024
+OCR_WORKERS = min(4, os.cpu_count() or 1)  # pages rasterized/OCR'd concurrently per PDF
+OCR_CACHE_BATCH_PAGES = 8  # OCR'd pages written per cache transaction
+
+
+def tesseract_version() -> str:
+    """Installed Tesseract version; part of the cache key so upgrades re-OCR."""
+    return str(load_pytesseract().get_tesseract_version())
+
+
+def _open_ocr_cache() -> sqlite3.Connection:
+    OCR_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(OCR_CACHE_PATH, timeout=30)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS ocr_pages ("
+        " pdf_sha256 TEXT NOT NULL,"
+        " page INTEGER NOT NULL,"
+        " dpi INTEGER NOT NULL,"
+        " tesseract_version TEXT NOT NULL,"
+        " text TEXT NOT NULL,"
+        " size INTEGER NOT NULL,"
+        " last_used REAL NOT NULL,"
+        " PRIMARY KEY (pdf_sha256, page, dpi, tesseract_version))"
+    )
+    return conn
+
+
+def ocr_cache_get(conn: sqlite3.Connection, pdf_hash: str, dpi: int, version: str) -> dict[int, str]:
+    """All cached OCR pages for one PDF/DPI/Tesseract version, as {page_number: text}."""
+    key = (pdf_hash, dpi, version)
+    with conn:
+        rows = conn.execute(
+            "SELECT page, text FROM ocr_pages"
+            " WHERE pdf_sha256 = ? AND dpi = ? AND tesseract_version = ?",
+            key,
+        ).fetchall()
+        if rows:
+            conn.execute(
+                "UPDATE ocr_pages SET last_used = ?"
+                " WHERE pdf_sha256 = ? AND dpi = ? AND tesseract_version = ?",
+                (time.time(), *key),
+            )
+    return dict(rows)
+
+
+def ocr_cache_put(
+    conn: sqlite3.Connection, pdf_hash: str, dpi: int, version: str, page_texts: list[tuple[int, str]]
+) -> None:
+    """Store freshly OCR'd pages (blank ones too, so they are not retried) in one transaction."""
+    if not page_texts:
+        return
+    now = time.time()
+    with conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO ocr_pages VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [
+                (pdf_hash, page_no, dpi, version, text, len(text.encode("utf-8")), now)
+                for page_no, text in page_texts
+            ],
+        )
+
+
+def evict_ocr_cache(conn: sqlite3.Connection, max_bytes: int) -> None:
+    """Drop least-recently-used pages until the cached text fits in max_bytes."""
+    total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM ocr_pages").fetchone()[0]
+    if total <= max_bytes:
+        return
+    evicted = 0
+    for rowid, size in conn.execute(
+        "SELECT rowid, size FROM ocr_pages ORDER BY last_used ASC"
+    ).fetchall():
+        conn.execute("DELETE FROM ocr_pages WHERE rowid = ?", (rowid,))
+        total -= size
+        evicted += 1
+        if total <= max_bytes:
+            break
+    logger.info("OCR cache over %d bytes; evicted %d page(s).", max_bytes, evicted)
+
+
+def clear_ocr_cache() -> None:
+    """Delete the on-disk OCR cache (--clear-ocr-cache)."""
+    if OCR_CACHE_PATH.exists():
+        OCR_CACHE_PATH.unlink()
+        logger.info("Cleared OCR cache at %s", OCR_CACHE_PATH)
+    else:
+        logger.info("No OCR cache to clear at %s", OCR_CACHE_PATH)
+
+
+def iter_ocr_pages(
+    path: Path, pages: list[int] | None = None, max_workers: int = OCR_WORKERS
+) -> Iterator[tuple[int, str]]:
+    """
+    Yield (page_number, text) for the given 1-based pages of a PDF (all pages if
+    None), in page order, as soon as each page is ready. Cached pages come
+    straight from the OCR cache; the rest are rasterized one page at a time
+    across a small thread pool (pdftoppm and tesseract run as subprocesses),
+    with at most max_workers pages in flight, so memory stays flat regardless
+    of page count. New pages are written to the cache in batches over one
+    connection, and the cache is trimmed once the document is done.
+    """
+    if pages is None:
+        page_count = pdf_page_count(path) or pdf_page_count_poppler(path)
+        pages = list(range(1, page_count + 1))
+    else:
+        pages = sorted(pages)
+    pdf_hash = file_sha256(path)
+    version = tesseract_version()
+    with closing(_open_ocr_cache()) as conn:
+        cached = ocr_cache_get(conn, pdf_hash, OCR_DPI, version)
+        if cached:
+            logger.info("OCR cache hit for %d page(s) of %s", len(cached), path.name)
+
+        todo = iter([page_no for page_no in pages if page_no not in cached])
+        pending: list[tuple[int, str]] = []
+        ocr_done = False
+        try:
+            with ThreadPoolExecutor(max_workers=max_workers) as pool:
+                in_flight: dict[int, Future] = {}
+
+                def refill() -> None:
+                    while len(in_flight) < max_workers:
+                        page_no = next(todo, None)
+                        if page_no is None:
+                            return
+                        in_flight[page_no] = pool.submit(ocr_pdf_page, str(path), page_no)
+
+                refill()
+                for page_no in pages:
+                    if page_no in cached:
+                        yield page_no, cached[page_no]
+                        continue
+                    text = in_flight.pop(page_no).result()
+                    ocr_done = True
+                    pending.append((page_no, text))
+                    if len(pending) >= OCR_CACHE_BATCH_PAGES:
+                        ocr_cache_put(conn, pdf_hash, OCR_DPI, version, pending)
+                        pending = []
+                    refill()
+                    yield page_no, text
+        finally:
+            # Also runs if the caller stops early, so finished pages are never lost.
+            ocr_cache_put(conn, pdf_hash, OCR_DPI, version, pending)
+            if ocr_done:
+                with conn:
+                    evict_ocr_cache(conn, OCR_CACHE_MAX_BYTES)
+
+
+def iter_pdf_text_ocr(path: Path) -> Iterator[str]:
+    """Stream one block per page: "[OCR PAGE n]" plus its text, or "" for blank pages."""
+    for page_no, text in iter_ocr_pages(path):
+        yield f"[OCR PAGE {page_no}]\n{text}" if text.strip() else ""
+
+
+def extract_pdf_text_ocr(path: Path) -> str:
+    """Try to OCR pages of a PDF if normal text extraction fails."""
+    if not ocr_available_for(path):
+        return ""
+    from pdf2image.exceptions import PDFInfoNotInstalledError
+
+    pytesseract = load_pytesseract()
+    try:
+        # Pages stay "\f"-separated so chunks can record their page range.
+        full_ocr_text = "\f".join(iter_pdf_text_ocr(path))
+        if full_ocr_text.strip():
+            logger.info("OCR successfully extracted text from %s", path)
+        else:
+            logger.warning("OCR produced no text for %s", path)
+            return ""
+        return full_ocr_text
+    except pytesseract.TesseractNotFoundError:
+        logger.warning(
+            "Tesseract not accessible from pytesseract; skipping OCR for %s.",
+            path,
+        )
+        return ""
+    except PDFInfoNotInstalledError:
+        logger.warning(
+            "Poppler/pdfinfo still not accessible for %s. "
+            "Check that Poppler is installed and POPPLER_PATH is correct.",
+            path,
+        )
+        return ""
+    except Exception as e:
+        logger.error("OCR failed on %s: %s", path, e, exc_info=True)
+        return ""
+
+
+# --------------- SELECTIVE (PER-PAGE) OCR ---------------
+
+OCR_MIN_PAGE_CHARS = 80  # pages whose pypdf text has fewer alphanumerics than this get OCR'd
+
+
+def page_text_density(text: str) -> int:
+    """Crude text-layer score for a page: number of alphanumeric characters."""
+    return sum(ch.isalnum() for ch in text)
+
+
+def ocr_pdf_pages(path: Path, pages: list[int]) -> dict[int, str]:
+    """OCR just the given pages; returns {} if OCR is unavailable or fails."""
+    if not pages or not ocr_available_for(path):
+        return {}
+    from pdf2image.exceptions import PDFInfoNotInstalledError
+
+    pytesseract = load_pytesseract()
+    try:
+        return dict(iter_ocr_pages(path, pages=pages))
+    except pytesseract.TesseractNotFoundError:
+        logger.warning(
+            "Tesseract not accessible from pytesseract; skipping OCR for %s.",
+            path,
+        )
+    except PDFInfoNotInstalledError:
+        logger.warning(
+            "Poppler/pdfinfo still not accessible for %s. "
+            "Check that Poppler is installed and POPPLER_PATH is correct.",
+            path,
+        )
+    except Exception as e:
+        logger.error("OCR failed on %s: %s", path, e, exc_info=True)
+    return {}
+
+
+def merge_pdf_pages_with_ocr(path: Path, page_texts: list[str]) -> str:
+    """
+    Per-page routing for PDFs: keep pypdf text for text-rich pages, OCR only
+    the low-density ones (scanned annexes, image-only pages) and merge
+    everything back in page order.
+    """
+    sparse = [
+        page_no
+        for page_no, text in enumerate(page_texts, start=1)
+        if page_text_density(text) < OCR_MIN_PAGE_CHARS
+    ]
+    if sparse:
+        logger.info(
+            "%d of %d page(s) in %s have little or no text layer; sending them to OCR.",
+            len(sparse),
+            len(page_texts),
+            path.name,
+        )
+    ocr_texts = ocr_pdf_pages(path, sparse)
+
+    merged: list[str] = []
+    for page_no, text in enumerate(page_texts, start=1):
+        ocr_text = ocr_texts.get(page_no, "")
+        if page_text_density(ocr_text) > page_text_density(text):
+            merged.append(f"[OCR PAGE {page_no}]\n{ocr_text}")
+        else:
+            merged.append(text)
+    # Pages stay "\f"-separated so chunks can record their page range.
+    return "\f".join(merged)
+
+
+def extract_pdf_text(path: Path) -> str:
+    """
+    Sequential PDF extractor:
+    1) pypdf page by page,
+    2) OCR only for pages with little or no text layer,
+    3) whole-document OCR if pypdf cannot read the file at all.
+    Ingestion uses the page-parallel extract_pdf_text_parallel instead.
+    """
+    page_count = pdf_page_count(path)
+    if page_count:
+        try:
+            page_texts = extract_pdf_page_range(str(path), 0, page_count)
+            return merge_pdf_pages_with_ocr(path, page_texts)
+        except Exception as e:
+            logger.error("pypdf failed on %s: %s", path, e, exc_info=True)
+
+    logger.info("No text from pypdf for %s, attempting OCR...", path)
+    ocr_text = extract_pdf_text_ocr(path)
+    return ocr_text
+
+
+def load_text_file(path: Path) -> str:
+    """Load a text-like file as best as we can (UTF-8 with errors ignored)."""
+    return path.read_text(encoding="utf-8", errors="ignore")
+
+
+def extract_policy_text(path_str: str, files_dir: str) -> str:
+    """Extract the full text of one non-PDF policy document (top-level so a process pool can run it)."""
+    path = Path(path_str)
+    if path.suffix.lower() in {".md", ".txt"}:
+        # Manual read to ensure full content (CS34 MFR, Hawg Spins)
+        return load_text_file(path)
+
+    from fairlib.utils.document_processor import DocumentProcessor
+
+    doc_proc = DocumentProcessor({"files_directory": files_dir})
+    docs = doc_proc.process_file(path_str) or []
+    return "\n\n".join(getattr(doc_obj, "page_content", "") or "" for doc_obj in docs)
+
+
+def chunking_params_for(path: Path) -> dict:
+    """Chunker settings for a given policy document (recorded in the index manifest)."""
+    # Smaller chunks for CS34; larger section packs for the big instructions
+    if path.name == "CS34_Discipline_and_Reward_MFR.md":
+        return {"chunker": "sections", "max_tokens": 300}
+    return {"chunker": "sections", "max_tokens": 512}
+
+
+# --------------- PARALLEL EXTRACTION STAGE ---------------
+
+PDF_PAGES_PER_TASK = 8  # pages per pypdf task when a PDF is fanned out to the pool
+
+
+def page_ranges(page_count: int, per_task: int = PDF_PAGES_PER_TASK) -> list[tuple[int, int]]:
+    """Split [0, page_count) into consecutive [start, stop) windows."""
+    return [(start, min(start + per_task, page_count)) for start in range(0, page_count, per_task)]
+
+
+async def extract_pdf_text_parallel(path: Path, pool: ProcessPoolExecutor) -> str:
+    """
+    Same per-page pypdf/OCR routing as extract_pdf_text, but with pypdf page
+    ranges fanned out to the process pool and reassembled in page order.
+    """
+    loop = asyncio.get_running_loop()
+    page_count = await loop.run_in_executor(pool, pdf_page_count, path)
+    ranges = page_ranges(page_count)
+
+    if page_count:
+        parts = await asyncio.gather(
+            *(loop.run_in_executor(pool, extract_pdf_page_range, str(path), start, stop)
+              for start, stop in ranges)
+        )
+        page_texts = [page_text for part in parts for page_text in part]
+        # Only low-density pages are OCR'd; keep that (threaded) work off the event loop.
+        return await asyncio.to_thread(merge_pdf_pages_with_ocr, path, page_texts)
+
+    logger.info("No text from pypdf for %s, attempting OCR...", path)
+    # OCR already streams pages across its own small pool; keep it off the event loop.
+    return await asyncio.to_thread(extract_pdf_text_ocr, path)
+
+
+async def extract_policy_documents(paths: list[Path], workers: int | None = None) -> dict[str, str]:
+    """
+    Extraction stage for ingestion: every file, and every page window of each PDF,
+    runs in a ProcessPoolExecutor so one large PDF no longer gates the others and
+    the event loop is never blocked. Workers are spawned rather than forked, since
+    the parent may already hold embedder/Chroma threads by the time this runs.
+    Logs per-file wall time.
+    """
+    if not paths:
+        return {}
+
+    loop = asyncio.get_running_loop()
+    files_dir = str(Path(".").resolve())
+    logger.info("Using files directory: %s", files_dir)
+    logger.info("Extracting %d document(s) with up to %s worker process(es)...",
+                len(paths), workers or os.cpu_count())
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+
+        async def extract_one(path: Path) -> tuple[str, str]:
+            started = time.perf_counter()
+            try:
+                if path.suffix.lower() == ".pdf":
+                    text = await extract_pdf_text_parallel(path, pool)
+                else:
+                    text = await loop.run_in_executor(pool, extract_policy_text, str(path), files_dir)
+            except Exception as e:
+                logger.error("Error extracting %s: %s", path, e, exc_info=True)
+                text = ""
+            logger.info(
+                "  → extracted %s in %.2fs (%d chars)",
+                path.name,
+                time.perf_counter() - started,
+                len(text),
+            )
+            return path.name, text
+
+        results = await asyncio.gather(*(extract_one(path) for path in paths))
+
+    return dict(results)
+
+
+# --------------- EMBEDDING STAGE ---------------
+
+EMBED_THREADS = os.cpu_count() or 1  # intra-op torch threads for single-process encoding
+# Shared with streamlit_app.py; keyed by (model, sha256(text)) so re-chunking only
+# re-encodes chunks whose text actually changed.
+EMBED_CACHE_DIR = Path(PERSIST_DIR) / "embedding_cache"
+# Lexical (BM25) index over the same chunks, fused with vector hits at query time.
+BM25_PATH = Path(PERSIST_DIR) / "bm25_index.json"
+# Hybrid candidates fetched per search before cross-encoder reranking trims them.
+RERANK_POOL = int(os.environ.get("RERANK_POOL", "20"))
+# Token budget for the passages one knowledge-base search hands back to the agent.
+RETRIEVAL_TOKEN_BUDGET = int(os.environ.get("RETRIEVAL_TOKEN_BUDGET", "800"))
+
+
+class BackgroundEmbedder:
+    """
+    SentenceTransformerEmbedder loaded on a daemon thread, so startup can check
+    the index manifest (and the REPL can take the first question) meanwhile.
+    Attribute access (embed_query, model, ...) waits for the load to finish and
+    is then forwarded to the real embedder.
+    """
+
+    def __init__(self, model_name: str = EMBED_MODEL_NAME):
+        self.model_name = model_name
+        self._embedder = None
+        self._error: Exception | None = None
+        self._ready = threading.Event()
+        threading.Thread(target=self._load, name="embedder-loader", daemon=True).start()
+
+    def _load(self) -> None:
+        try:
+            with startup_phase(f"load embedder {self.model_name} (background)"):
+                from fairlib import SentenceTransformerEmbedder
+
+                self._embedder = SentenceTransformerEmbedder(model_name=self.model_name)
+        except Exception as e:
+            self._error = e
+        finally:
+            self._ready.set()
+
+    def get(self):
+        self._ready.wait()
+        if self._embedder is None:
+            raise RuntimeError(f"Could not load embedding model {self.model_name}: {self._error}")
+        return self._embedder
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+
+def configure_torch_threads(threads: int = EMBED_THREADS) -> None:
+    """Let torch use every core for matmuls (its default is often far lower on CPU hosts)."""
+    try:
+        import torch
+    except ImportError:
+        return
+    if torch.get_num_threads() != threads:
+        torch.set_num_threads(threads)
+        logger.info("Torch intra-op threads set to %d.", threads)
+
+
+def embed_texts(embedder, texts: list[str], batch_size: int = EMBED_BATCH_SIZE,
+                processes: int = 1) -> list[list[float]]:
+    """
+    Encode texts in fixed-size batches. With processes > 1, sentence-transformers'
+    multi-process pool splits the batches across worker processes (each with one
+    torch thread); otherwise a single process encodes with all cores.
+    """
+    if not texts:
+        return []
+    model = getattr(embedder, "model", None)
+    if model is None:
+        # Not a SentenceTransformer wrapper; fall back to its own batching.
+        return embedder.embed_documents(texts)
+
+    if processes > 1 and len(texts) > batch_size:
+        pool = model.start_multi_process_pool(target_devices=["cpu"] * processes)
+        try:
+            vectors = model.encode_multi_process(texts, pool, batch_size=batch_size)
+        finally:
+            model.stop_multi_process_pool(pool)
+    else:
+        configure_torch_threads()
+        vectors = model.encode(
+            texts,
+            batch_size=batch_size,
+            convert_to_numpy=True,
+            show_progress_bar=False,
+        )
+    return vectors.tolist()
+
+
+def upsert_batch_size(chroma_client) -> int:
+    """Largest upsert Chroma accepts in one call (older clients don't report it)."""
+    get_max = getattr(chroma_client, "get_max_batch_size", None)
+    try:
+        return int(get_max()) if get_max else 5000
+    except Exception:
+        return 5000
+
+
+def bulk_upsert(collection, ids: list[str], documents: list[str], embeddings: list[list[float]],
+                metadatas: list[dict], batch_size: int) -> None:
+    """Write precomputed vectors to Chroma in as few upsert calls as it allows."""
+    for start in range(0, len(ids), batch_size):
+        stop = start + batch_size
+        collection.upsert(
+            ids=ids[start:stop],
+            documents=documents[start:stop],
+            embeddings=embeddings[start:stop],
+            metadatas=metadatas[start:stop],
+        )
+
+
+# --------------- INDEX MANIFEST (INCREMENTAL INGESTION) ---------------
+
+def file_sha256(path: Path) -> str:
+    """SHA-256 of a file's bytes, read in blocks so large PDFs stay cheap."""
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def chunk_ids_for(doc_name: str, file_hash: str, count: int) -> list[str]:
+    """Deterministic Chroma IDs for a document's chunks (stable across runs)."""
+    return [f"{doc_name}::{file_hash[:12]}::{idx:05d}" for idx in range(count)]
+
+
+def chunk_metadata(doc_name: str, chunk_index: int, chunk: dict) -> dict:
+    """Chroma metadata stored with each chunk (page range only for paginated sources)."""
+    meta = {
+        "source": doc_name,
+        "section": chunk["section_path"],
+        "chunk_index": chunk_index,
+        "ingest_version": INGEST_VERSION,
+    }
+    if chunk.get("page_start") is not None:
+        meta["page_start"] = chunk["page_start"]
+        meta["page_end"] = chunk["page_end"]
+    return meta
+
+
+def format_chunk_label(meta: dict) -> str:
+    """Human-readable provenance label, e.g. [SOURCE: x.pdf | SECTION 3.1 ... | PAGES 4-5]."""
+    parts = [f"SOURCE: {meta.get('source', 'unknown')}"]
+    if meta.get("section"):
+        parts.append(f"SECTION {meta['section']}")
+    if meta.get("page_start") is not None:
+        pages = meta["page_start"]
+        if meta.get("page_end") not in (None, pages):
+            pages = f"{pages}-{meta['page_end']}"
+        parts.append(f"PAGES {pages}")
+    return "[" + " | ".join(parts) + "]"
+
+
+def new_index_manifest() -> dict:
+    """An empty manifest for the current ingestion settings."""
+    return {
+        "manifest_version": MANIFEST_VERSION,
+        "ingest_version": INGEST_VERSION,
+        "collection": COLLECTION_NAME,
+        "embedder": EMBED_MODEL_NAME,
+        "documents": {},
+    }
+
+
+def load_index_manifest() -> dict:
+    """Load the ingestion manifest, or an empty one if missing/unreadable."""
+    empty = new_index_manifest()
+    if not MANIFEST_PATH.exists():
+        return empty
+    try:
+        manifest = json.loads(MANIFEST_PATH.read_text(encoding="utf-8"))
+    except (OSError, ValueError) as e:
+        logger.warning("Could not read index manifest %s (%s); rebuilding.", MANIFEST_PATH, e)
+        return empty
+    if not isinstance(manifest.get("documents"), dict):
+        return empty
+    return manifest
+
+
+def save_index_manifest(manifest: dict) -> None:
+    """Atomically write the ingestion manifest next to PERSIST_DIR."""
+    tmp_path = MANIFEST_PATH.with_suffix(".json.tmp")
+    tmp_path.write_text(json.dumps(manifest, indent=2, sort_keys=True), encoding="utf-8")
+    tmp_path.replace(MANIFEST_PATH)
+
+
+def rebuild_bm25_index(collection) -> BM25Index:
+    """Rebuild the lexical index from everything in the collection and persist it."""
+    data = collection.get(include=["documents", "metadatas"])
+    index = BM25Index.build(data.get("ids") or [], data.get("documents") or [], data.get("metadatas") or [])
+    index.save(BM25_PATH)
+    logger.info("BM25 index rebuilt over %d chunks → %s", len(index), BM25_PATH)
+    return index
+
+
+async def sync_policy_index(
+    chroma_client,
+    embedder,
+    workers: int | None = None,
+    embed_batch_size: int = EMBED_BATCH_SIZE,
+    embed_processes: int = 1,
+) -> int:
+    """
+    Bring the persistent Chroma collection in line with POLICY_DOC_PATHS:
+    - unchanged documents (same hash, chunking, ingest version and embedder) are skipped,
+    - changed documents are extracted in parallel, chunked, embedded together in
+      one batched stage, their old chunks deleted and new ones bulk-upserted,
+    - documents that disappeared from disk/config are purged.
+    The BM25 index is rebuilt whenever the collection changed (or is missing).
+    Returns the number of chunks in the collection afterwards.
+    """
+    manifest = load_index_manifest()
+    collection = chroma_client.get_or_create_collection(name=COLLECTION_NAME)
+
+    settings_changed = (
+        manifest.get("manifest_version") != MANIFEST_VERSION
+        or manifest.get("ingest_version") != INGEST_VERSION
+        or manifest.get("embedder") != EMBED_MODEL_NAME
+    )
+    index_changed = False
+    if settings_changed or (not manifest["documents"] and collection.count() > 0):
+        # Either the vectors are incompatible or the collection predates the
+        # manifest (random IDs, duplicates from earlier runs): start clean.
+        logger.info("Index manifest missing or stale; recreating collection '%s'.", COLLECTION_NAME)
+        chroma_client.delete_collection(name=COLLECTION_NAME)
+        collection = chroma_client.get_or_create_collection(name=COLLECTION_NAME)
+        manifest = new_index_manifest()
+        save_index_manifest(manifest)
+        index_changed = True
+
+    documents: dict = manifest["documents"]
+    present = {path.name for path in POLICY_DOC_PATHS if path.exists()}
+
+    # --------- Purge documents that are gone ---------
+    for name in sorted(set(documents) - present):
+        old_ids = documents[name].get("chunk_ids", [])
+        if old_ids:
+            collection.delete(ids=old_ids)
+        del documents[name]
+        save_index_manifest(manifest)
+        index_changed = True
+        logger.info("  → %s no longer present; removed %d chunks.", name, len(old_ids))
+
+    # --------- Work out which documents changed ---------
+    pending: list[tuple[Path, str, dict]] = []
+    for path in POLICY_DOC_PATHS:
+        if not path.exists():
+            logger.warning("Policy document '%s' not found. Skipping.", path)
+            continue
+        file_hash = file_sha256(path)
+        params = chunking_params_for(path)
+        entry = documents.get(path.name)
+        if entry and entry.get("sha256") == file_hash and entry.get("chunking") == params:
+            logger.info("  → %s unchanged; skipping.", path.name)
+            continue
+        pending.append((path, file_hash, params))
+
+    # --------- Extract changed documents in parallel ---------
+    texts = await extract_policy_documents([path for path, _, _ in pending], workers=workers)
+
+    # --------- Chunk changed documents ---------
+    chunked: list[tuple[Path, str, dict, list[dict]]] = []
+    for path, file_hash, params in pending:
+        text = texts.get(path.name, "")
+        if not text.strip():
+            logger.warning("No text extracted from %s; skipping.", path)
+            continue
+        try:
+            section_chunks = chunk_by_sections(text, max_tokens=params["max_tokens"])
+        except Exception as e:
+            logger.error("Error chunking %s: %s", path, e, exc_info=True)
+            continue
+        chunked.append((path, file_hash, params, section_chunks))
+
+    # --------- Embed every new chunk in one batched stage ---------
+    # Only the chunk text is embedded; provenance lives in metadata so it
+    # can be filtered on server-side and shown as a label at query time.
+    all_texts = [c["text"] for _, _, _, section_chunks in chunked for c in section_chunks]
+    if all_texts:
+        cache = EmbeddingCache(EMBED_CACHE_DIR, EMBED_MODEL_NAME)
+        started = time.perf_counter()
+        all_vectors = await asyncio.to_thread(
+            cache.embed,
+            all_texts,
+            lambda missing: embed_texts(embedder, missing, embed_batch_size, embed_processes),
+        )
+        elapsed = time.perf_counter() - started
+        logger.info(
+            "Embedded %d chunks in %.2fs (%.1f chunks/sec, %d from cache, batch size %d, %d process(es)).",
+            len(all_texts),
+            elapsed,
+            len(all_texts) / elapsed if elapsed > 0 else float("inf"),
+            cache.hits,
+            embed_batch_size,
+            max(1, embed_processes),
+        )
+    else:
+        all_vectors = []
+
+    # --------- Replace each document's chunks with bulk upserts ---------
+    max_batch = upsert_batch_size(chroma_client)
+    offset = 0
+    for path, file_hash, params, section_chunks in chunked:
+        chunks = [c["text"] for c in section_chunks]
+        vectors = all_vectors[offset:offset + len(chunks)]
+        offset += len(chunks)
+        try:
+            ids = chunk_ids_for(path.name, file_hash, len(chunks))
+
+            entry = documents.get(path.name)
+            old_ids = entry.get("chunk_ids", []) if entry else []
+            if old_ids:
+                collection.delete(ids=old_ids)
+            bulk_upsert(
+                collection,
+                ids,
+                chunks,
+                vectors,
+                [chunk_metadata(path.name, idx, c) for idx, c in enumerate(section_chunks)],
+                batch_size=max_batch,
+            )
+
+            documents[path.name] = {
+                "sha256": file_hash,
+                "chunking": params,
+                "chunk_ids": ids,
+                "ingested_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            }
+            save_index_manifest(manifest)
+            index_changed = True
+            logger.info("  → %s split into %d chunks.", path.name, len(chunks))
+
+        except Exception as e:
+            logger.error("Error processing %s: %s", path, e, exc_info=True)
+
+    if index_changed or not BM25_PATH.exists():
+        rebuild_bm25_index(collection)
+
+    return collection.count()
+
+
+# --------------- POLICY RETRIEVER ---------------
+
+class PolicyRetriever(AbstractRetriever):
+    """
+    Retriever over the policy collection. Queries Chroma directly so a document
+    scope can be applied server-side (`where` on the source metadata), fuses in
+    BM25 hits when a lexical index is available, and prefixes each hit with its
+    provenance label, which is not embedded.
+    """
+
+    def __init__(self, collection, embedder, source_filter: str | None = None,
+                 bm25: BM25Index | None = None, reranker: CrossEncoderReranker | None = None,
+                 rerank_pool: int = RERANK_POOL, token_budget: int = RETRIEVAL_TOKEN_BUDGET,
+                 token_model: str = "gpt-4o"):
+        self.collection = collection
+        self.embedder = embedder
+        self.source_filter = source_filter
+        self.bm25 = bm25
+        self.reranker = reranker
+        self.rerank_pool = rerank_pool
+        self.token_budget = token_budget
+        self.token_model = token_model
+        # Optional progress hook, called as on_retrieve(query, hits) after each search.
+        self.on_retrieve = None
+
+    def query(self, query: str, top_k: int = 5) -> list[dict]:
+        """
+        Top-k hits as {"id", "text", "metadata", "distance", "score"} dicts. With a
+        reranker, a wider hybrid pool is fetched and cut down by cross-encoder score.
+        """
+        if not query or top_k <= 0:
+            return []
+        hits = hybrid_query(
+            self.collection,
+            query,
+            self.embedder.embed_query(query),
+            max(top_k, self.rerank_pool) if self.reranker else top_k,
+            bm25=self.bm25,
+            source=self.source_filter,
+        )
+        if self.reranker:
+            hits = self.reranker.rerank(query, hits, top_k)
+        return hits
+
+    def retrieve(self, query: str, top_k: int = 5, **kwargs) -> list[Document]:
+        """Hits packed into token_budget (deduped, trimmed to query-relevant sentences)."""
+        hits, _ = pack_context(
+            query,
+            self.query(query, top_k=top_k),
+            self.token_budget,
+            self.token_model,
+            label=lambda hit: format_chunk_label(hit["metadata"]) + "\n",
+        )
+        if self.on_retrieve:
+            self.on_retrieve(query, hits)
+        return [
+            Document(
+                page_content=f"{format_chunk_label(hit['metadata'])}\n{hit['text']}",
+                metadata=hit["metadata"],
+            )
+            for hit in hits
+        ]
+
+    async def aretrieve(self, query: str, top_k: int = 5, **kwargs) -> list[Document]:
+        return await asyncio.to_thread(self.retrieve, query, top_k)
+
+
+def match_indexed_source(name: str) -> str | None:
+    """Resolve a user-typed document name to an indexed source file name."""
+    sources = sorted(load_index_manifest()["documents"])
+    needle = name.strip().lower()
+    for source in sources:
+        if source.lower() == needle:
+            return source
+    matches = [source for source in sources if needle in source.lower()]
+    return matches[0] if len(matches) == 1 else None
+
+
+# --------------- STREAMING OUTPUT ---------------
+
+class FinalAnswerStream:
+    """
+    Pulls the final_answer tool_input out of a streamed ReActPlanner JSON reply
+    as it arrives, decoding JSON string escapes, and hands each piece to `emit`.
+    Replies that call any other tool never emit anything.
+    """
+
+    START_RE = re.compile(r'"tool_name"\s*:\s*"final_answer".*?"tool_input"\s*:\s*"', re.S)
+    ESCAPES = {"n": "\n", "t": "\t", "r": "\r", "b": "\b", "f": "\f", '"': '"', "\\": "\\", "/": "/"}
+
+    def __init__(self, emit):
+        self.emit = emit
+        self.buffer = ""
+        self.pos: int | None = None  # start of undecoded answer text in buffer
+        self.done = False
+        self.emitted = False
+
+    def feed(self, delta: str) -> None:
+        self.buffer += delta
+        if self.done:
+            return
+        if self.pos is None:
+            match = self.START_RE.search(self.buffer)
+            if not match:
+                return
+            self.pos = match.end()
+
+        buf, i, out = self.buffer, self.pos, []
+        while i < len(buf):
+            ch = buf[i]
+            if ch == '"':
+                self.done = True
+                break
+            if ch == "\\":
+                if i + 1 >= len(buf):
+                    break  # wait for the rest of the escape
+                nxt = buf[i + 1]
+                if nxt == "u":
+                    if i + 6 > len(buf):
+                        break
+                    try:
+                        out.append(chr(int(buf[i + 2:i + 6], 16)))
+                    except ValueError:
+                        out.append(buf[i:i + 6])
+                    i += 6
+                    continue
+                out.append(self.ESCAPES.get(nxt, nxt))
+                i += 2
+                continue
+            out.append(ch)
+            i += 1
+        self.pos = i
+        if out:
+            self.emitted = True
+            self.emit("".join(out))
+
+
+class StreamingLLM:
+    """
+    Wraps the agent's LLM adapter so planner calls go through astream(). The
+    ReAct loop still gets the complete reply, while the final answer is handed
+    to `on_answer_delta` token by token. Everything else passes through.
+    """
+
+    def __init__(self, llm):
+        self.llm = llm
+        self.on_answer_delta = None
+        self.answer_streamed = False
+
+    def __getattr__(self, name):
+        return getattr(self.llm, name)
 
+    async def ainvoke(self, messages, **kwargs):
+        if self.on_answer_delta is None or not hasattr(self.llm, "astream"):
+            return await self.llm.ainvoke(messages, **kwargs)
+        parser = FinalAnswerStream(self.on_answer_delta)
+        async for chunk in self.llm.astream(messages, **kwargs):
+            parser.feed(chunk.content or "")
+        self.answer_streamed = self.answer_streamed or parser.emitted
+        return Message(role="assistant", content=parser.buffer)
 
-def extract_pdf_text_ocr(path: Path) -> str:
-    """Try to OCR pages of a PDF if normal text extraction fails."""
-    if not OCR_AVAILABLE:
-        logger.warning(
-            "OCR libraries (pdf2image + pytesseract) not installed; cannot OCR %s",
-            path,
-        )
-        return ""
 
-    if POPPLER_PATH is None:
-        logger.warning(
-            "POPPLER_PATH is not set and pdfinfo is not auto-detected; "
-            "skipping OCR for %s.",
-            path,
-        )
-        return ""
+def print_retrieval_progress(query: str, hits: list[dict]) -> None:
+    """CLI progress event for each knowledge-base search the agent makes."""
+    sources = sorted({hit["metadata"].get("source", "unknown") for hit in hits})
+    tokens = sum(hit.get("tokens", 0) for hit in hits)
+    print(f"   🔎 Searched policies for '{shorten(query, width=70)}' → "
+          f"{len(hits)} passage(s), {tokens} tokens, from {', '.join(sources) or 'no documents'}")
+
 
+async def stream_reply(llm: StreamingLLM, label: str, run) -> str:
+    """
+    Await an agent call, printing the final answer as it streams in. Falls back
+    to printing the whole reply if nothing streamed (e.g. malformed JSON).
+    """
+    started = False
+
+    def emit(delta: str) -> None:
+        nonlocal started
+        if not started:
+            print(f"\n🤖 {label}:")
+            started = True
+        print(delta, end="", flush=True)
+
+    print(f"🤖 {label}: thinking...\n")
+    llm.on_answer_delta = emit
+    llm.answer_streamed = False
     try:
-        # Tell pdf2image explicitly where Poppler lives
-        images = convert_from_path(str(path), poppler_path=POPPLER_PATH)
-        ocr_text_parts = []
-        for idx, img in enumerate(images):
-            try:
-                page_text = pytesseract.image_to_string(img)
-            except pytesseract.TesseractNotFoundError:
-                logger.warning(
-                    "Tesseract not accessible from pytesseract; skipping OCR for %s.",
-                    path,
-                )
-                return ""
-            if page_text.strip():
-                ocr_text_parts.append(f"[OCR PAGE {idx+1}]\n{page_text}")
-        full_ocr_text = "\n\n".join(ocr_text_parts)
-        if full_ocr_text.strip():
-            logger.info("OCR successfully extracted text from %s", path)
-        else:
-            logger.warning("OCR produced no text for %s", path)
-            return ""
-        return full_ocr_text
-    except PDFInfoNotInstalledError:
-        logger.warning(
-            "Poppler/pdfinfo still not accessible for %s. "
-            "Check that Poppler is installed and POPPLER_PATH is correct.",
-            path,
-        )
-        return ""
-    except Exception as e:
-        logger.error("OCR failed on %s: %s", path, e, exc_info=True)
-        return ""
+        result = await run
+    finally:
+        llm.on_answer_delta = None
+    if llm.answer_streamed:
+        print("\n")
+    else:
+        print(f"🤖 {label}:\n{result}\n")
+    return result
 
 
-def extract_pdf_text(path: Path) -> str:
+# --------------- MAP-REDUCE DOCUMENT ANALYSIS ---------------
+
+# Documents longer than one section are analyzed section by section, then reduced.
+MAP_SECTION_TOKENS = int(os.environ.get("MAP_SECTION_TOKENS", "2000"))
+MAP_CONCURRENCY = int(os.environ.get("MAP_CONCURRENCY", "4"))  # sections analyzed at once
+MAP_REDUCE_TOKENS = int(os.environ.get("MAP_REDUCE_TOKENS", "6000"))  # section results per reduce call
+
+
+def split_document_sections(text: str, max_tokens: int = MAP_SECTION_TOKENS) -> list[dict]:
     """
-    Combined PDF extractor:
-    1) Try built-in DocumentProcessor (handled elsewhere),
-    2) Then pypdf,
-    3) Then OCR as last resort.
+    Split an uploaded document into map sections on heading/paragraph
+    boundaries (via the structure-aware chunker), keeping its line breaks.
     """
-    # Here we only implement steps 2 and 3; step 1 is in main via DocumentProcessor.
-    text = extract_pdf_text_basic(path)
-    if text.strip():
-        return text
+    return [s for s in chunk_by_sections(text, max_tokens=max_tokens) if s["text"].strip()]
 
-    logger.info("No text from pypdf for %s, attempting OCR...", path)
-    ocr_text = extract_pdf_text_ocr(path)
-    return ocr_text
 
+def fork_agent(agent: SimpleAgent) -> SimpleAgent:
+    """
+    Independent worker sharing the agent's tools but with its own planner and
+    WorkingMemory, so concurrent map calls never see each other's history.
+    Map workers call the plain LLM so only the reduced report streams.
+    """
+    from fairlib import ReActPlanner, SimpleAgent, WorkingMemory
+
+    llm = agent.llm.llm if isinstance(agent.llm, StreamingLLM) else agent.llm
+    worker = SimpleAgent(llm, ReActPlanner(llm, agent.planner.tool_registry), agent.tool_executor, WorkingMemory())
+    worker.role_description = agent.role_description
+    return worker
+
+
+def group_by_tokens(texts: list[str], max_tokens: int, model: str) -> list[list[int]]:
+    """Indices of `texts` in consecutive runs of at most max_tokens (a longer text gets a run of its own)."""
+    groups: list[list[int]] = []
+    used = 0
+    for i, text in enumerate(texts):
+        cost = count_tokens(text, model)
+        if not groups or used + cost > max_tokens:
+            groups.append([])
+            used = 0
+        groups[-1].append(i)
+        used += cost
+    return groups
+
+
+def section_heading(index: int, total: int, section: dict) -> str:
+    heading = f"Section {index} of {total}"
+    if section.get("section_path"):
+        heading += f" ({section['section_path']})"
+    return heading
+
+
+async def analyze_document(
+    agent: SimpleAgent,
+    text: str,
+    intro: str,
+    task: str,
+    doc_label: str = "Document",
+    policy_context: str | None = None,
+) -> str:
+    """
+    Run a document tool's prompt (intro + document + task) over `text`.
+    A document that fits in one section gets a single call, as before. Longer
+    ones are mapped: each section is analyzed by its own worker agent, at most
+    MAP_CONCURRENCY at a time, and the partial results are reduced into one
+    report by `agent`. `policy_context` is already-retrieved policy text to
+    include in every prompt.
+    """
+    if policy_context:
+        intro += (
+            "Policy passages already retrieved for this document (use your knowledge base tool "
+            "only for anything they do not cover):\n"
+            "-----------------\n"
+            f"{policy_context}\n"
+            "-----------------\n\n"
+        )
+    sections = split_document_sections(text)
+    if len(sections) <= 1:
+        prompt = f"{intro}{doc_label}:\n```text\n{text.strip()}\n```\n\n{task}"
+        return await agent.arun(prompt)
+
+    total = len(sections)
+    limit = asyncio.Semaphore(max(1, MAP_CONCURRENCY))
+    logger.info("📑 Long document: analyzing %s sections (%s at a time)...", total, MAP_CONCURRENCY)
+
+    async def map_section(index: int, section: dict) -> str:
+        heading = section_heading(index, total, section)
+        prompt = (
+            f"{intro}"
+            f"The document is too long for one pass, so you are analyzing it one section at a time.\n\n"
+            f"{doc_label}, {heading}:\n"
+            "```text\n"
+            f"{section['text']}\n"
+            "```\n\n"
+            "Apply the task below to THIS SECTION ONLY. Your result will be merged with the "
+            "results for the other sections, so skip overall introductions and conclusions, "
+            "but keep every finding and the policy references you relied on.\n\n"
+            f"{task}"
+        )
+        async with limit:
+            result = await fork_agent(agent).arun(prompt)
+        logger.info("   ✅ %s analyzed", heading)
+        return result
+
+    partials = await asyncio.gather(*(map_section(i, s) for i, s in enumerate(sections, start=1)))
 
-def load_text_file(path: Path) -> str:
-    """Load a text-like file as best as we can (UTF-8 with errors ignored)."""
-    return path.read_text(encoding="utf-8", errors="ignore")
+    # (first section, last section, result) spans, merged until one reduce call can hold them all.
+    spans = [(i, i, partial) for i, partial in enumerate(partials, start=1)]
+
+    def render(span: tuple[int, int, str]) -> str:
+        first, last, result = span
+        heading = section_heading(first, total, sections[first - 1]) if first == last else (
+            f"Sections {first}-{last} of {total}"
+        )
+        return f"### {heading}\n{result}"
+
+    async def merge_group(group: list[tuple[int, int, str]]) -> tuple[int, int, str]:
+        if len(group) == 1:
+            return group[0]
+        results = "\n\n".join(render(span) for span in group)
+        prompt = (
+            f"{intro}"
+            f"The document was too long for one pass, so it was analyzed in {total} sections. "
+            "Below are the results for some consecutive sections, in document order:\n\n"
+            f"{results}\n\n"
+            "Merge them into one result for these sections, following the task below. It will be "
+            "combined with the results for the rest of the document, so skip overall introductions "
+            "and conclusions, but keep every finding (say which section it comes from) and every "
+            "policy reference.\n\n"
+            f"{task}"
+        )
+        async with limit:
+            merged = await fork_agent(agent).arun(prompt)
+        return group[0][0], group[-1][1], merged
+
+    model = getattr(agent.llm, "model_name", "gpt-4o")
+    while True:
+        groups = group_by_tokens([render(span) for span in spans], MAP_REDUCE_TOKENS, model)
+        if len(groups) == 1:
+            break
+        if len(groups) == len(spans):
+            # Every result fills a reduce call on its own; give each an equal share instead.
+            share = max(1, MAP_REDUCE_TOKENS // len(spans))
+            spans = [(first, last, truncate_to_tokens(result, share, model)) for first, last, result in spans]
+            break
+        logger.info("📑 Merging %s section results in %s groups...", len(spans), len(groups))
+        spans = list(await asyncio.gather(*(merge_group([spans[i] for i in group]) for group in groups)))
+
+    results = "\n\n".join(render(span) for span in spans)
+    prompt = (
+        f"{intro}"
+        f"The document was too long for one pass, so it was analyzed in {total} sections. "
+        "The per-section results are below, in document order:\n\n"
+        f"{results}\n\n"
+        "Combine them into ONE report for the whole document that follows the task below. "
+        "Merge duplicate findings, keep section-specific details (say which section they "
+        "come from), and consolidate all references into a single 'Sources' section.\n\n"
+        f"{task}"
+    )
+    return await agent.arun(prompt)
 
 
 # --------------- HIGH-LEVEL TOOL BEHAVIOR (PROMPT-BASED) ---------------
@@ -249,18 +1703,17 @@ async def tool_policy_locator(agent: SimpleAgent, query: str) -> str:
     return result
 
 
-async def tool_doc_summarizer(agent: SimpleAgent, text: str, filename: str) -> str:
+async def tool_doc_summarizer(
+    agent: SimpleAgent, text: str, filename: str, policy_context: str | None = None
+) -> str:
     """Document summarizer, highlighting USAFA policy-relevant content."""
-    truncated = shorten(text, width=8000, placeholder="\n\n...[TRUNCATED]")
-    prompt = (
+    intro = (
         "You are a DOCUMENT SUMMARIZER for USAFA-related content.\n"
         "Whenever relevant, you MUST consult your knowledge base tool so that your summary "
         "is grounded in the ingested policies rather than general knowledge.\n\n"
         f"The user has provided a document named '{filename}'.\n\n"
-        "Document (truncated if very long):\n"
-        "```text\n"
-        f"{truncated}\n"
-        "```\n\n"
+    )
+    task = (
         "Your task:\n"
         "1. Provide a concise executive summary (3–6 bullet points).\n"
         "2. Highlight any content that is clearly related to USAFA cadet standards, duties, "
@@ -269,14 +1722,14 @@ async def tool_doc_summarizer(agent: SimpleAgent, text: str, filename: str) -> s
         "4. End with a 'Sources' section listing only the policies/sections you used from your "
         "   knowledge base (if any).\n"
     )
-    result = await agent.arun(prompt)
-    return result
+    return await analyze_document(agent, text, intro, task, policy_context=policy_context)
 
 
-async def tool_rewrite_for_compliance(agent: SimpleAgent, text: str, filename: str) -> str:
+async def tool_rewrite_for_compliance(
+    agent: SimpleAgent, text: str, filename: str, policy_context: str | None = None
+) -> str:
     """Rewrite a user document to be as compliant as possible."""
-    truncated = shorten(text, width=8000, placeholder="\n\n...[TRUNCATED]")
-    prompt = (
+    intro = (
         "You are a COMPLIANCE REWRITER for USAFA cadet standards, duties, and dress/appearance policy.\n"
         "You MUST consult your knowledge base tool and rely on actual retrieved policy text, "
         "not on generic assumptions.\n\n"
@@ -284,10 +1737,8 @@ async def tool_rewrite_for_compliance(agent: SimpleAgent, text: str, filename: s
         "Your job is to rewrite it so that it is compliant with the policies you know "
         "(CS34 MFR, AFCWI 36-3501, AFCW CD 2024, EXORD 25-003, USAFA Dress & Appearance, DAFI 36-2903).\n\n"
         f"Document name: {filename}\n\n"
-        "Original document (truncated if very long):\n"
-        "```text\n"
-        f"{truncated}\n"
-        "```\n\n"
+    )
+    task = (
         "Your task:\n"
         "1. First, briefly state whether the ORIGINAL appears COMPLIANT or NON-COMPLIANT.\n"
         "2. Then provide a REWRITTEN version that is as compliant as possible while preserving the intent.\n"
@@ -296,22 +1747,20 @@ async def tool_rewrite_for_compliance(agent: SimpleAgent, text: str, filename: s
         "   - 'Rewritten Compliant Version'\n"
         "4. At the end, add 'Sources' and list only the policies/sections you relied on.\n"
     )
-    result = await agent.arun(prompt)
-    return result
+    return await analyze_document(agent, text, intro, task, doc_label="Original document", policy_context=policy_context)
 
 
-async def tool_risk_assessment(agent: SimpleAgent, text: str, filename: str) -> str:
+async def tool_risk_assessment(
+    agent: SimpleAgent, text: str, filename: str, policy_context: str | None = None
+) -> str:
     """ORM-style risk assessment generator for events/trainings."""
-    truncated = shorten(text, width=8000, placeholder="\n\n...[TRUNCATED]")
-    prompt = (
+    intro = (
         "You are a RISK ASSESSMENT generator using USAFA and Air Force-style ORM thinking.\n"
         "Ground your recommendations in retrieved policy text wherever possible.\n\n"
         "The user has provided a description of an event/training plan.\n\n"
         f"Document name: {filename}\n\n"
-        "Event description (truncated if very long):\n"
-        "```text\n"
-        f"{truncated}\n"
-        "```\n\n"
+    )
+    task = (
         "Your task:\n"
         "1. Generate an ORM-style risk assessment with:\n"
         "   - List of primary hazards.\n"
@@ -321,22 +1770,20 @@ async def tool_risk_assessment(agent: SimpleAgent, text: str, filename: str) ->
         "2. Present results in a structured bullet or table-like markdown.\n"
         "3. At the end, under 'Sources', list any relevant policy references you used.\n"
     )
-    result = await agent.arun(prompt)
-    return result
+    return await analyze_document(agent, text, intro, task, doc_label="Event description", policy_context=policy_context)
 
 
-async def tool_deviations(agent: SimpleAgent, text: str, filename: str) -> str:
+async def tool_deviations(
+    agent: SimpleAgent, text: str, filename: str, policy_context: str | None = None
+) -> str:
     """Deviation / violation detector for user documents."""
-    truncated = shorten(text, width=8000, placeholder="\n\n...[TRUNCATED]")
-    prompt = (
+    intro = (
         "You are a DEVIATION DETECTOR for USAFA cadet standards, duties, and dress/appearance policy.\n"
         "You MUST use the knowledge base tool to identify where the document conflicts with policy.\n\n"
         "The user has provided a document and wants to know where it deviates from or violates policy.\n\n"
         f"Document name: {filename}\n\n"
-        "Document (truncated if very long):\n"
-        "```text\n"
-        f"{truncated}\n"
-        "```\n\n"
+    )
+    task = (
         "Your task:\n"
         "1. Identify specific statements or requirements in the document that appear NON-COMPLIANT.\n"
         "2. For each, explain:\n"
@@ -345,8 +1792,31 @@ async def tool_deviations(agent: SimpleAgent, text: str, filename: str) -> str:
         "3. Suggest how to fix or rewrite each problematic part.\n"
         "4. End with a 'Sources' section listing the policies/sections you used.\n"
     )
-    result = await agent.arun(prompt)
-    return result
+    return await analyze_document(agent, text, intro, task, policy_context=policy_context)
+
+
+async def tool_compliance_review(
+    agent: SimpleAgent, text: str, filename: str, policy_context: str | None = None
+) -> str:
+    """COMPLIANT / NON-COMPLIANT review of a document (--check-doc and --check-dir)."""
+    intro = (
+        "You are a compliance assistant. The user has provided a document and wants to know "
+        "whether it aligns with USAFA cadet standards, duties, and dress/appearance rules as "
+        "defined in the ingested policies (CS34 MFR, AFCWI 36-3501, AFCW CD 2024, EXORD 25-003, "
+        "USAFA Dress & Appearance Standards, and DAFI 36-2903).\n\n"
+        "You should consult your knowledge base tool before deciding.\n\n"
+        f"Document name: {filename}\n\n"
+    )
+    task = (
+        "Task:\n"
+        "1. Start with one line that is exactly 'Verdict: COMPLIANT' or 'Verdict: NON-COMPLIANT'.\n"
+        "2. Explain briefly why.\n"
+        "3. Recommend precise changes if it is not fully compliant.\n"
+        "4. At the end, under 'Sources', list only the documents and sections/paragraphs you used.\n"
+    )
+    return await analyze_document(
+        agent, text, intro, task, doc_label="Document to review", policy_context=policy_context
+    )
 
 
 async def tool_show_context(agent: SimpleAgent, last_question: str | None) -> str:
@@ -399,14 +1869,15 @@ async def tool_explain_last(agent: SimpleAgent, last_question: str | None, last_
     return result
 
 
-async def tool_stylecheck(agent: SimpleAgent, text: str, filename: str) -> str:
+async def tool_stylecheck(
+    agent: SimpleAgent, text: str, filename: str, policy_context: str | None = None
+) -> str:
     """
     Style / consistency checker:
     - Looks for formatting, terminology, structure, and tone issues,
       NOT fundamental policy violations.
     """
-    truncated = shorten(text, width=8000, placeholder="\n\n...[TRUNCATED]")
-    prompt = (
+    intro = (
         "You are a STYLE AND CONSISTENCY CHECKER for USAFA documents.\n"
         "You are NOT primarily looking for hazing/abuse/safety issues (those are handled by "
         "policy compliance tools), but instead for:\n"
@@ -415,10 +1886,8 @@ async def tool_stylecheck(agent: SimpleAgent, text: str, filename: str) -> str:
         "  - Consistent tense, perspective, and tone.\n"
         "  - Clear, professional writing.\n\n"
         f"Document name: {filename}\n\n"
-        "Document to review (truncated if very long):\n"
-        "```text\n"
-        f"{truncated}\n"
-        "```\n\n"
+    )
+    task = (
         "Your task:\n"
         "1. List STYLE/FORMAT issues in bullet form. Group them into categories such as:\n"
         "   - Terminology and Rank\n"
@@ -430,23 +1899,22 @@ async def tool_stylecheck(agent: SimpleAgent, text: str, filename: str) -> str:
         "4. At the end, add a 'Sources' section listing any relevant policy/guide references "
         "   you relied on (if any). If you are using general writing guidance, say so.\n"
     )
-    return await agent.arun(prompt)
+    return await analyze_document(agent, text, intro, task, doc_label="Document to review", policy_context=policy_context)
 
 
-async def tool_keyfindings(agent: SimpleAgent, text: str, filename: str) -> str:
+async def tool_keyfindings(
+    agent: SimpleAgent, text: str, filename: str, policy_context: str | None = None
+) -> str:
     """
     Extract key findings / action items / hazards / responsibilities from a document.
     More action-oriented than a summary.
     """
-    truncated = shorten(text, width=8000, placeholder="\n\n...[TRUNCATED]")
-    prompt = (
+    intro = (
         "You are an ACTION-FOCUSED ANALYST for USAFA documents.\n"
         "The user wants to know the KEY THINGS they must pay attention to in this document.\n\n"
         f"Document name: {filename}\n\n"
-        "Document (truncated if very long):\n"
-        "```text\n"
-        f"{truncated}\n"
-        "```\n\n"
+    )
+    task = (
         "Your task:\n"
         "1. Identify and list the most important 'Key Findings', grouped as:\n"
         "   - Mandatory tasks / actions.\n"
@@ -458,23 +1926,22 @@ async def tool_keyfindings(agent: SimpleAgent, text: str, filename: str) -> str:
         "3. At the end, add a 'Sources' section listing any relevant policies or sections "
         "   (from the ingested corpus) that this document interacts with, if clear.\n"
     )
-    return await agent.arun(prompt)
+    return await analyze_document(agent, text, intro, task, policy_context=policy_context)
 
 
-async def tool_regformat(agent: SimpleAgent, text: str, filename: str) -> str:
+async def tool_regformat(
+    agent: SimpleAgent, text: str, filename: str, policy_context: str | None = None
+) -> str:
     """
     Rewrite a document into a formal Air Force/USAFA-style memorandum format.
     Focus is on structure & formatting, not fundamentally changing intent.
     """
-    truncated = shorten(text, width=8000, placeholder="\n\n...[TRUNCATED]")
-    prompt = (
+    intro = (
         "You are a FORMAL MEMORANDUM FORMATTER for USAFA documents.\n"
         "The user has provided text that should be turned into a proper Air Force or USAFA-style memo.\n\n"
         f"Original document name: {filename}\n\n"
-        "Original content (truncated if very long):\n"
-        "```text\n"
-        f"{truncated}\n"
-        "```\n\n"
+    )
+    task = (
         "Your task:\n"
         "1. Assume the content is roughly acceptable; focus on structure and formatting.\n"
         "2. Produce a rewritten version in a formal memorandum style, including typical elements such as:\n"
@@ -488,7 +1955,84 @@ async def tool_regformat(agent: SimpleAgent, text: str, filename: str) -> str:
         "4. Keep the final output in markdown so the user can copy-paste it into a document.\n"
         "5. At the end, under 'Sources', list any policy/style references you used from your knowledge base.\n"
     )
-    return await agent.arun(prompt)
+    return await analyze_document(agent, text, intro, task, doc_label="Original content", policy_context=policy_context)
+
+
+ANALYZE_ALL_TOOLS = (
+    ("Deviation Detector", tool_deviations),
+    ("Risk Assessment", tool_risk_assessment),
+    ("Style Checker", tool_stylecheck),
+    ("Key Findings", tool_keyfindings),
+)
+ANALYZE_ALL_K = 6  # policy passages retrieved once and shared by every analysis
+ANALYZE_ALL_QUERY_TOKENS = 256  # leading document text used as the retrieval query
+
+
+async def tool_analyze_all(
+    agent: SimpleAgent,
+    retriever: PolicyRetriever,
+    text: str,
+    filename: str,
+    on_result=None,
+) -> dict[str, str]:
+    """
+    Run every document analysis in ANALYZE_ALL_TOOLS at once. Policy context
+    is retrieved a single time and shared; each tool then runs on its own
+    forked agent (separate WorkingMemory) under asyncio.gather, so the total
+    wait is about that of the slowest tool. on_result(label, result) is called
+    as each one finishes.
+    """
+    query = f"{filename}\n{truncate_to_tokens(text, ANALYZE_ALL_QUERY_TOKENS, retriever.token_model)}"
+    docs = await retriever.aretrieve(query, top_k=ANALYZE_ALL_K)
+    policy_context = "\n\n".join(doc.page_content for doc in docs)
+
+    async def run(label: str, tool) -> tuple[str, str]:
+        try:
+            result = await tool(fork_agent(agent), text, filename, policy_context=policy_context)
+        except Exception as e:
+            logger.error("%s failed for %s: %s", label, filename, e, exc_info=True)
+            result = f"Error: {e}"
+        if on_result:
+            on_result(label, result)
+        return label, result
+
+    return dict(await asyncio.gather(*(run(label, tool) for label, tool in ANALYZE_ALL_TOOLS)))
+
+
+BASE_ROLE_DESCRIPTION = (
+    "You are a helpful AI assistant and an expert on USAFA cadet standards, duties, and "
+    "dress/appearance policy. Your knowledge comes from the following ingested documents:\n"
+    "  • CS34 Discipline and Reward MFR\n"
+    "  • AFCWI 36-3501 Cadet Standards and Duties\n"
+    "  • AFCW CD 2024 - What Does my Job Mean\n"
+    "  • EXORD 25-003 USAFA Dress and Appearance Standards\n"
+    "  • USAFA Dress & Appearance Standards\n"
+    "  • DAFI 36-2903, Dress and Personal Appearance of Department of the Air Force Personnel.\n\n"
+    "When answering policy, standards, duties, or dress/appearance questions:\n"
+    "1. You should call your knowledge base tool to retrieve supporting passages before answering, "
+    "   unless the question is purely about how to use the agent or its commands.\n"
+    "2. Start with a short, direct answer.\n"
+    "3. Explain your reasoning in clear, concise language grounded in the retrieved context.\n"
+    "4. At the END of every answer, add a section titled 'Sources' and list ONLY the documents "
+    "   and sections/paragraph numbers or titles you used, in bullet form, for example:\n"
+    "      • DAFI 36-2903, para 3.1.2\n"
+    "      • AFCWI 36-3501, Section 5.3 'Training Events'\n"
+    "   If you cannot see a specific section number, use the closest heading or describe the "
+    "   location (e.g., 'AFCW CD 2024, Squadron First Sergeant job description').\n"
+    "5. Always base your reasoning on the ingested documents; if something is not clearly covered, "
+    "   say so and avoid guessing.\n"
+)
+
+
+def role_description_for(role: str) -> str:
+    """Agent role description for a given user role."""
+    return (
+        f"{BASE_ROLE_DESCRIPTION}\n\n"
+        f"Current user role: {role}.\n"
+        "When retrieving and selecting policy passages, prioritize guidance that is most relevant "
+        "to this role's duties, authorities, limitations, responsibilities, and privileges. "
+        "Tailor tone and recommendations to this role."
+    )
 
 
 async def role_aware_answer(agent: SimpleAgent, question: str, role: str | None) -> str:
@@ -519,37 +2063,397 @@ async def role_aware_answer(agent: SimpleAgent, question: str, role: str | None)
     return await agent.arun(prompt)
 
 
+# --------------- BATCH COMPLIANCE CHECKING ---------------
+
+CHECK_DIR_SUFFIXES = {".txt", ".md", ".pdf"}
+# The fixed "Verdict: <X>" line tool_compliance_review asks for (markdown emphasis tolerated).
+VERDICT_RE = re.compile(
+    r"^[\s>#*_-]*verdict[*_]*\s*:[*_]*\s*[*_]*(NON[- ]?COMPLIANT|COMPLIANT)[*_.]*\s*$",
+    re.IGNORECASE | re.MULTILINE,
+)
+
+
+def load_review_document(path: Path) -> str:
+    """Text of a document under review: PDFs go through the extractor (OCR as needed)."""
+    if path.suffix.lower() == ".pdf":
+        return extract_pdf_text(path)
+    return load_text_file(path)
+
+
+def compliance_verdict(report: str) -> str:
+    """Verdict from the review's "Verdict: ..." line; UNKNOWN if it has none."""
+    m = VERDICT_RE.search(report)
+    if not m:
+        return "UNKNOWN"
+    return "COMPLIANT" if m.group(1).upper() == "COMPLIANT" else "NON-COMPLIANT"
+
+
+def report_path_for(report_dir: Path, path: Path, file_hash: str) -> Path:
+    """Per-document report, named by content hash so an edited file is reviewed again."""
+    return report_dir / f"{path.stem}.{file_hash[:12]}.md"
+
+
+async def check_directory(
+    agent: SimpleAgent,
+    doc_dir: Path,
+    concurrency: int = CHECK_CONCURRENCY,
+    report_dir: Path | None = None,
+) -> list[dict]:
+    """
+    Compliance-review every .txt/.md/.pdf file directly in doc_dir, up to
+    `concurrency` at a time, each on its own forked agent (the retriever and
+    embedder are shared). Reports go to <report_dir>/<stem>.<hash>.md and one
+    JSON line per reviewed file is appended to summary.jsonl. Files whose
+    content hash already has a report are skipped, so an interrupted sweep
+    picks up where it left off.
+    """
+    report_dir = report_dir or doc_dir / CHECK_REPORT_DIRNAME
+    report_dir.mkdir(parents=True, exist_ok=True)
+    summary_path = report_dir / CHECK_SUMMARY_NAME
+    paths = sorted(p for p in doc_dir.iterdir() if p.is_file() and p.suffix.lower() in CHECK_DIR_SUFFIXES)
+    limit = asyncio.Semaphore(max(1, concurrency))
+
+    async def check(path: Path) -> dict:
+        file_hash = await asyncio.to_thread(file_sha256, path)
+        report_path = report_path_for(report_dir, path, file_hash)
+        record = {"file": path.name, "sha256": file_hash, "report": str(report_path)}
+        if report_path.exists():
+            return {**record, "status": "skipped"}
+
+        async with limit:
+            started = time.perf_counter()
+            try:
+                text = await asyncio.to_thread(load_review_document, path)
+                report = await tool_compliance_review(fork_agent(agent), text, path.name) if text.strip() else None
+            except Exception as e:
+                logger.error("Compliance review failed for %s: %s", path, e, exc_info=True)
+                record.update(status="error", error=str(e), report=None)
+            else:
+                if report is None:
+                    record.update(status="error", error="no extractable text", report=None)
+                else:
+                    report_path.write_text(f"# Compliance review: {path.name}\n\n{report}\n", encoding="utf-8")
+                    record.update(status="reviewed", verdict=compliance_verdict(report))
+            record.update(
+                seconds=round(time.perf_counter() - started, 1),
+                checked_at=datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            )
+
+        with summary_path.open("a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+        print(f"   📄 {path.name}: {record.get('verdict', record['status'])} ({record['seconds']}s)")
+        return record
+
+    print(f"🗂️  Checking {len(paths)} document(s) in {doc_dir} ({concurrency} at a time)...")
+    records = await asyncio.gather(*(check(p) for p in paths))
+
+    counts: dict[str, int] = {}
+    for record in records:
+        key = record.get("verdict", record["status"])
+        counts[key] = counts.get(key, 0) + 1
+    print("✅ Directory check complete: " + (", ".join(f"{n} {k}" for k, n in sorted(counts.items())) or "no documents"))
+    print(f"   Reports and {CHECK_SUMMARY_NAME} in {report_dir}\n")
+    return records
+
+
+# --------------- LOCAL API DAEMON (--serve) ---------------
+
+SERVE_HOST = "127.0.0.1"  # never exposed beyond this machine
+SERVE_MAX_BODY_BYTES = 32 * 1024 * 1024
+
+# POST /tools/<name> -> document tool, mirroring the CLI commands.
+DOCUMENT_TOOLS = {
+    "summarize": tool_doc_summarizer,
+    "rewrite": tool_rewrite_for_compliance,
+    "risk": tool_risk_assessment,
+    "deviations": tool_deviations,
+    "stylecheck": tool_stylecheck,
+    "keyfindings": tool_keyfindings,
+    "regformat": tool_regformat,
+    "check": tool_compliance_review,
+}
+ROUTES = {"/health", "/ask", "/locate", "/retrieve", "/embed", "/analyze-all"}
+
+
+def load_or_create_api_token(path: Path) -> str:
+    """The daemon's shared secret: reuse the token file if present, else write a new one (0600)."""
+    from policy_client import read_api_token
+
+    token = read_api_token(path)
+    if token is None:
+        token = secrets.token_urlsafe(32)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(token + "\n")
+    return token
+
+
+class APIError(Exception):
+    """Client error raised by a route; becomes a JSON {"error"} response with `status`."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class PolicyService:
+    """
+    Warm state behind the local API: one LLM adapter, embedder, Chroma
+    collection, BM25 index and reranker, plus a factory that builds a fresh
+    agent (own retriever scope and WorkingMemory) for every request, so
+    concurrent callers never share conversation state. The collection and
+    BM25 index are reopened when the index manifest changes.
+
+    Requests must carry `token` as a bearer token, be JSON, and (over TCP)
+    name this daemon in their Host header, so web pages cannot drive it
+    through the browser (CSRF or DNS rebinding).
+    """
+
+    def __init__(self, llm, embedder, chroma_client, reranker: CrossEncoderReranker | None = None):
+        self.llm = llm
+        self.embedder = embedder
+        self.chroma_client = chroma_client
+        self.reranker = reranker
+        self.answer_cache = AnswerCache(ANSWER_CACHE_SIZE, ANSWER_CACHE_TTL_S, ANSWER_CACHE_THRESHOLD)
+        self.started = time.time()
+        self.version: str | None = None
+        self.token: str | None = None  # set by serve_policy_api
+        self.allowed_hosts: set[str] | None = None  # None on a Unix socket
+        self._refresh()
+
+    def _refresh(self) -> None:
+        version = index_version(MANIFEST_PATH)
+        if version != self.version:
+            self.collection = self.chroma_client.get_collection(COLLECTION_NAME)
+            self.bm25 = BM25Index.load(BM25_PATH)
+            self.version = version
+
+    def retriever(self, source: str | None = None) -> PolicyRetriever:
+        self._refresh()
+        source_filter = match_indexed_source(source) if source else None
+        if source and source_filter is None:
+            raise APIError(400, f"No single indexed document matches '{source}'.")
+        return PolicyRetriever(
+            self.collection,
+            self.embedder,
+            source_filter=source_filter,
+            bm25=self.bm25,
+            reranker=self.reranker,
+            token_model=getattr(self.llm, "model_name", "gpt-4o"),
+        )
+
+    def agent(self, role: str | None = None, source: str | None = None) -> SimpleAgent:
+        from fairlib import (
+            KnowledgeBaseQueryTool,
+            ReActPlanner,
+            SimpleAgent,
+            ToolExecutor,
+            ToolRegistry,
+            WorkingMemory,
+        )
+
+        tool_registry = ToolRegistry()
+        tool_registry.register_tool(KnowledgeBaseQueryTool(self.retriever(source)))
+        agent = SimpleAgent(
+            self.llm, ReActPlanner(self.llm, tool_registry), ToolExecutor(tool_registry), WorkingMemory()
+        )
+        agent.role_description = role_description_for(role or "Default user")
+        return agent
+
+    @staticmethod
+    async def document(body: dict) -> tuple[str, str]:
+        """(text, filename) from a request body holding "text" or a local "path"."""
+        if body.get("text") is not None:
+            return str(body["text"]), str(body.get("filename") or "document.txt")
+        if not body.get("path"):
+            raise APIError(400, 'Send the document as "text" or as a local "path".')
+        path = Path(body["path"])
+        if path.suffix.lower() not in CHECK_DIR_SUFFIXES:
+            raise APIError(400, f"Only {', '.join(sorted(CHECK_DIR_SUFFIXES))} documents can be read by path.")
+        if not path.is_file():
+            raise APIError(404, f"File not found: {path}")
+        # pypdf/OCR would otherwise block the event loop for every other client.
+        text = await asyncio.to_thread(load_review_document, path)
+        return text, str(body.get("filename") or path.name)
+
+    async def ask(self, body: dict) -> dict:
+        question = str(body.get("question") or "").strip()
+        if not question:
+            raise APIError(400, '"question" is required.')
+        role, source = body.get("role"), body.get("source")
+        agent = self.agent(role, source)  # validates source before anything is cached
+        question_vec = await asyncio.to_thread(self.embedder.embed_query, normalize_question(question))
+        cache_scope = f"role={normalize_question(role or 'Default user')}|source={source or ''}"
+        hit = self.answer_cache.lookup(question_vec, cache_scope, self.version)
+        if hit:
+            return {"answer": hit["answer"], "cached": hit["similarity"]}
+        answer = await role_aware_answer(agent, question, role)
+        if answer and not answer.startswith("Error"):
+            self.answer_cache.put(question_vec, cache_scope, self.version, question, answer)
+        return {"answer": answer, "cached": None}
+
+    async def dispatch(self, method: str, path: str, body: dict) -> dict:
+        if method == "GET" and path == "/health":
+            return {
+                "status": "ok",
+                "index_version": self.version,
+                "chunks": self.collection.count(),
+                "uptime_s": round(time.time() - self.started, 1),
+            }
+        if method != "POST":
+            known = path in ROUTES or path.startswith("/tools/")
+            raise APIError(405 if known else 404, f"No route for {method} {path}")
+        if path == "/ask":
+            return await self.ask(body)
+        if path == "/locate":
+            query = str(body.get("query") or "").strip()
+            if not query:
+                raise APIError(400, '"query" is required.')
+            return {"answer": await tool_policy_locator(self.agent(source=body.get("source")), query)}
+        if path == "/retrieve":
+            retriever = self.retriever(body.get("source"))
+            hits = await asyncio.to_thread(retriever.query, str(body.get("query") or ""), int(body.get("k", 5)))
+            return {"hits": hits}
+        if path == "/embed":
+            return {"vector": await asyncio.to_thread(self.embedder.embed_query, str(body.get("text") or ""))}
+        if path == "/analyze-all":
+            text, filename = await self.document(body)
+            agent = self.agent(body.get("role"))
+            return {"results": await tool_analyze_all(agent, self.retriever(), text, filename)}
+        if path.startswith("/tools/"):
+            tool = DOCUMENT_TOOLS.get(path[len("/tools/"):])
+            if tool is None:
+                raise APIError(404, f"Unknown tool; choose from {', '.join(DOCUMENT_TOOLS)}.")
+            text, filename = await self.document(body)
+            return {"result": await tool(self.agent(body.get("role")), text, filename)}
+        raise APIError(404, f"No route for {method} {path}")
+
+    def check_headers(self, method: str, headers: dict[str, str]) -> None:
+        """Reject requests a browser could forge: wrong Host, non-JSON body or missing token."""
+        if self.allowed_hosts is not None and headers.get("host", "").lower() not in self.allowed_hosts:
+            raise APIError(403, "Unexpected Host header; the daemon only answers local clients.")
+        if method == "POST" and headers.get("content-type", "").split(";")[0].strip().lower() != "application/json":
+            raise APIError(415, "Content-Type must be application/json.")
+        supplied = headers.get("authorization", "").removeprefix("Bearer ").strip()
+        if not self.token or not hmac.compare_digest(supplied.encode("utf-8"), self.token.encode("utf-8")):
+            raise APIError(401, "Missing or wrong API token (clients read it from POLICY_API_TOKEN_FILE).")
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Serve one HTTP/1.1 request with a JSON body, then close the connection."""
+        status, payload = 200, {}
+        try:
+            request_line = await reader.readline()
+            if not request_line:
+                return
+            method, target, _ = request_line.decode("latin-1").split(" ", 2)
+            headers: dict[str, str] = {}
+            while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            self.check_headers(method.upper(), headers)
+            length = int(headers.get("content-length") or 0)
+            if length > SERVE_MAX_BODY_BYTES:
+                raise APIError(413, "Request body too large.")
+            raw = await reader.readexactly(length) if length else b""
+            body = json.loads(raw) if raw else {}
+            if not isinstance(body, dict):
+                raise APIError(400, "Request body must be a JSON object.")
+            started = time.perf_counter()
+            payload = await self.dispatch(method.upper(), target.split("?", 1)[0], body)
+            logger.info("%s %s (%.2fs)", method, target, time.perf_counter() - started)
+        except APIError as e:
+            status, payload = e.status, {"error": str(e)}
+        except (ValueError, asyncio.IncompleteReadError) as e:
+            status, payload = 400, {"error": f"Malformed request: {e}"}
+        except Exception as e:
+            logger.error("Request failed: %s", e, exc_info=True)
+            status, payload = 500, {"error": str(e)}
+        data = json.dumps(payload, default=float).encode("utf-8")
+        writer.write(
+            f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(data)}\r\n"
+            "Connection: close\r\n\r\n".encode("latin-1") + data
+        )
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+
+async def serve_policy_api(service: PolicyService, port: int = SERVE_PORT, socket_path: str | None = None) -> None:
+    """Serve the local API on 127.0.0.1:port, or on a Unix socket, until interrupted."""
+    from policy_client import POLICY_API_TOKEN_FILE
+
+    service.token = load_or_create_api_token(POLICY_API_TOKEN_FILE)
+    if socket_path:
+        Path(socket_path).unlink(missing_ok=True)
+        server = await asyncio.start_unix_server(service.handle_connection, path=socket_path)
+        where = f"unix://{socket_path}"
+    else:
+        service.allowed_hosts = {f"{SERVE_HOST}:{port}", f"localhost:{port}"}
+        server = await asyncio.start_server(service.handle_connection, SERVE_HOST, port)
+        where = f"http://{SERVE_HOST}:{port}"
+    print(f"🛰️  Policy assistant serving on {where} (Ctrl+C to stop)")
+    print(f"   Clients authenticate with the token in {POLICY_API_TOKEN_FILE}")
+    print("   Routes: GET /health; POST /ask, /locate, /retrieve, /embed, /analyze-all, "
+          f"/tools/<{'|'.join(DOCUMENT_TOOLS)}>\n")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        if socket_path:
+            Path(socket_path).unlink(missing_ok=True)
+
+
 # ----------------- MAIN RAG SETUP -----------------
-async def main(check_doc: str | None = None, build_index_only: bool = False):
+async def main(
+    check_doc: str | None = None,
+    build_index_only: bool = False,
+    workers: int | None = None,
+    embed_batch_size: int = EMBED_BATCH_SIZE,
+    embed_processes: int = 1,
+    check_dir: str | None = None,
+    concurrency: int = CHECK_CONCURRENCY,
+    serve: bool = False,
+    port: int = SERVE_PORT,
+    socket_path: str | None = None,
+    profile_startup: bool = False,
+    fake_llm: bool = False,
+):
 
     """Main function to set up and run the RAG agent demonstration."""
 
     logger.info("Initializing RAG components...")
 
-    if not CHROMADB_LOADED:
-        logger.critical("ChromaDB is required for this demo but is not installed. Exiting.")
+    if not CHROMADB_AVAILABLE:
+        logger.critical("ChromaDB is required for this demo but is not installed (pip install chromadb). Exiting.")
         return
 
+    # The embedder (torch + MiniLM) loads in the background while the index is
+    # checked; nothing waits for it unless documents need embedding.
+    embedder = BackgroundEmbedder(EMBED_MODEL_NAME)
+
     try:
-        llm = OpenAIAdapter(
-            api_key=settings.api_keys.openai_api_key,
-            model_name=settings.models.get("openai_gpt4", {"model_name": "gpt-4o"}).model_name,
-        )
-        embedder = SentenceTransformerEmbedder()
+        with startup_phase("import chromadb"):
+            import chromadb
+        if fake_llm:
+            # Offline, scripted stand-in (see policy_fake_llm.py) for load tests and benchmarks.
+            llm = FakeLLM()
+            logger.info("Using the offline fake LLM; answers are synthetic.")
+        else:
+            with startup_phase("LLM adapter (openai)"):
+                from fairlib import OpenAIAdapter
 
-        PERSIST_DIR = "policy_index"  # on-disk Chroma DB for policies
+                llm = OpenAIAdapter(
+                    api_key=settings.api_keys.openai_api_key,
+                    model_name=settings.models.get("openai_gpt4", {"model_name": "gpt-4o"}).model_name,
+                )
 
         # ✅ New-style Chroma client (no Settings object)
-        chroma_client = chromadb.PersistentClient(path=PERSIST_DIR)
-
-        vector_store = ChromaDBVectorStore(
-            client=chroma_client,
-            collection_name="usafa_policy_rag",
-            embedder=embedder,
-        )
-
-        long_term_memory = LongTermMemory(vector_store)
-        retriever = SimpleRetriever(vector_store)
+        with startup_phase("open Chroma client"):
+            chroma_client = chromadb.PersistentClient(path=PERSIST_DIR)
 
     except Exception as e:
         logger.critical(f"Failed to initialize core components: {e}", exc_info=True)
@@ -572,131 +2476,101 @@ async def main(check_doc: str | None = None, build_index_only: bool = False):
                 DAFI_LOCAL_PATH,
             )
 
-    # --------- Ingest all policy documents ---------
-
-    files_dir = str(Path(".").resolve())
-    logger.info("Using files directory: %s", files_dir)
-    doc_proc = DocumentProcessor({"files_directory": files_dir})
-
-    all_chunks: list[str] = []
-    ingested_files: list[str] = []
-
-    for path in POLICY_DOC_PATHS:
-        if not path.exists():
-            logger.warning("Policy document '%s' not found. Skipping.", path)
-            continue
-
-        try:
-            logger.info("Processing policy document: %s", path)
-            text = ""
-
-            if path.name == "CS34_Discipline_and_Reward_MFR.md":
-                # Manual read to ensure full content
-                logger.info("Using manual text reader for CS34 MFR.")
-                text = path.read_text(encoding="utf-8", errors="ignore")
-            else:
-                # Try DocumentProcessor first
-                docs = doc_proc.process_file(str(path))
-                if docs:
-                    doc_obj = docs[0]
-                    text = getattr(doc_obj, "page_content", "") or ""
-
-                # If that failed and it's a PDF, fall back to pypdf/OCR
-                if (not text.strip()) and path.suffix.lower() == ".pdf":
-                    logger.info("Falling back to PDF extractor for %s", path)
-                    text = extract_pdf_text(path)
-
-            if not text.strip():
-                logger.warning("No text extracted from %s; skipping.", path)
-                continue
-
-            # Smaller chunks for CS34; moderately sized chunks for big PDFs
-            if path.name == "CS34_Discipline_and_Reward_MFR.md":
-                chunk_size = 1200
-                chunk_overlap = 200
-            else:
-                chunk_size = 2500  # slightly smaller than before for better granularity
-                chunk_overlap = 200
-
-            raw_chunks = split_text(text, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
-
-            # Add a structured header with source + chunk index to every chunk
-            chunks = []
-            for idx, c in enumerate(raw_chunks):
-                header = f"[SOURCE: {path.name} | CHUNK {idx+1}]\n\n"
-                chunks.append(header + c)
-
-            all_chunks.extend(chunks)
-            ingested_files.append(path.name)
-            logger.info("  → %s split into %d chunks.", path.name, len(chunks))
-
-        except Exception as e:
-            logger.error("Error processing %s: %s", path, e, exc_info=True)
+    # --------- Ingest all policy documents (incremental) ---------
 
-    if not all_chunks:
+    with startup_phase("check/sync policy index"):
+        indexed_chunks = await sync_policy_index(
+            chroma_client,
+            embedder,
+            workers=workers,
+            embed_batch_size=embed_batch_size,
+            embed_processes=embed_processes,
+        )
+    if not indexed_chunks:
         logger.error("No documents were successfully ingested; aborting.")
         return
-
-    logger.info(
-        "Ingesting %d chunks from %d documents into vector store.",
-        len(all_chunks),
-        len(ingested_files),
+    logger.info("✅ Policy index up to date: %d chunks in Long-Term Memory.", indexed_chunks)
+
+    # Built after syncing: a stale index may have been recreated above.
+    with startup_phase("load BM25 index"):
+        bm25 = BM25Index.load(BM25_PATH)
+    retriever = PolicyRetriever(
+        chroma_client.get_collection(COLLECTION_NAME),
+        embedder,
+        bm25=bm25,
+        reranker=CrossEncoderReranker() if CROSS_ENCODER_AVAILABLE else None,
+        token_model=getattr(llm, "model_name", "gpt-4o"),
     )
-    long_term_memory.vector_store.add_documents(all_chunks)
-    logger.info("✅ All documents successfully ingested into Long-Term Memory.")
 
     # If we're only building the index (for reuse by Streamlit/App Runner), stop here.
     if build_index_only:
         logger.info("Build-index-only flag set; skipping agent construction and CLI loop.")
+        if profile_startup:
+            print_startup_profile()
+        return
+
+    # Daemon mode: keep everything warm and build agents per request.
+    if serve:
+        await asyncio.to_thread(embedder.get)  # first request should not pay for the model load
+        if profile_startup:
+            print_startup_profile()
+        service = PolicyService(llm, embedder, chroma_client, reranker=retriever.reranker)
+        await serve_policy_api(service, port=port, socket_path=socket_path)
         return
 
     # --------- Build the Agent ---------
 
+    # Hits from the current request, kept alongside cached answers.
+    retrieved_hits: list[dict] = []
+
+    def on_retrieve(query: str, hits: list[dict]) -> None:
+        print_retrieval_progress(query, hits)
+        retrieved_hits.extend(hits)
+
+    with startup_phase("import fairlib agent classes"):
+        from fairlib import (
+            KnowledgeBaseQueryTool,
+            ReActPlanner,
+            SimpleAgent,
+            ToolExecutor,
+            ToolRegistry,
+            WorkingMemory,
+        )
+
+    retriever.on_retrieve = on_retrieve
     knowledge_tool = KnowledgeBaseQueryTool(retriever)
     tool_registry = ToolRegistry()
     tool_registry.register_tool(knowledge_tool)
 
-    planner = ReActPlanner(llm, tool_registry)
+    # Planner calls stream through this wrapper so answers print as they arrive.
+    streaming_llm = StreamingLLM(llm)
+    planner = ReActPlanner(streaming_llm, tool_registry)
     executor = ToolExecutor(tool_registry)
     working_memory = WorkingMemory()
 
-    rag_agent = SimpleAgent(llm, planner, executor, working_memory)
-
-    base_role_description = (
-        "You are a helpful AI assistant and an expert on USAFA cadet standards, duties, and "
-        "dress/appearance policy. Your knowledge comes from the following ingested documents:\n"
-        "  • CS34 Discipline and Reward MFR\n"
-        "  • AFCWI 36-3501 Cadet Standards and Duties\n"
-        "  • AFCW CD 2024 - What Does my Job Mean\n"
-        "  • EXORD 25-003 USAFA Dress and Appearance Standards\n"
-        "  • USAFA Dress & Appearance Standards\n"
-        "  • DAFI 36-2903, Dress and Personal Appearance of Department of the Air Force Personnel.\n\n"
-        "When answering policy, standards, duties, or dress/appearance questions:\n"
-        "1. You should call your knowledge base tool to retrieve supporting passages before answering, "
-        "   unless the question is purely about how to use the agent or its commands.\n"
-        "2. Start with a short, direct answer.\n"
-        "3. Explain your reasoning in clear, concise language grounded in the retrieved context.\n"
-        "4. At the END of every answer, add a section titled 'Sources' and list ONLY the documents "
-        "   and sections/paragraph numbers or titles you used, in bullet form, for example:\n"
-        "      • DAFI 36-2903, para 3.1.2\n"
-        "      • AFCWI 36-3501, Section 5.3 'Training Events'\n"
-        "   If you cannot see a specific section number, use the closest heading or describe the "
-        "   location (e.g., 'AFCW CD 2024, Squadron First Sergeant job description').\n"
-        "5. Always base your reasoning on the ingested documents; if something is not clearly covered, "
-        "   say so and avoid guessing.\n"
-    )
+    rag_agent = SimpleAgent(streaming_llm, planner, executor, working_memory)
+
+    answer_cache = AnswerCache(ANSWER_CACHE_SIZE, ANSWER_CACHE_TTL_S, ANSWER_CACHE_THRESHOLD)
 
     current_role = "Default user"
-    rag_agent.role_description = (
-        f"{base_role_description}\n\n"
-        f"Current user role: {current_role}.\n"
-        "When retrieving and selecting policy passages, prioritize guidance that is most relevant "
-        "to this role's duties, authorities, limitations, responsibilities, and privileges."
-    )
+    rag_agent.role_description = role_description_for(current_role)
 
     logger.info("✅ RAG Agent created.")
+    if profile_startup:
+        print_startup_profile()
     logger.info("\n--- Starting Interaction with RAG Agent ---\n")
 
+    # --------- Optional: batch compliance review of a directory ---------
+
+    if check_dir:
+        dir_path = Path(check_dir)
+        if not dir_path.is_dir():
+            print(f"❌ Could not find directory to check: {dir_path}")
+            return
+        retriever.on_retrieve = None  # per-search progress lines would interleave across documents
+        await check_directory(rag_agent, dir_path, concurrency=concurrency)
+        return
+
     # --------- Optional: one-shot compliance review via CLI arg ---------
 
     if check_doc:
@@ -706,30 +2580,9 @@ async def main(check_doc: str | None = None, build_index_only: bool = False):
             return
 
         raw_text = doc_path.read_text(encoding="utf-8", errors="ignore")
-        truncated = shorten(raw_text, width=8000, placeholder="\n\n...[TRUNCATED]")
-
-        compliance_prompt = (
-            "You are a compliance assistant. The user has provided a document and wants to know "
-            "whether it aligns with USAFA cadet standards, duties, and dress/appearance rules as "
-            "defined in the ingested policies (CS34 MFR, AFCWI 36-3501, AFCW CD 2024, EXORD 25-003, "
-            "USAFA Dress & Appearance Standards, and DAFI 36-2903).\n\n"
-            "You should consult your knowledge base tool before deciding.\n\n"
-            f"Document name: {doc_path.name}\n\n"
-            "Document to review (truncated if very long):\n"
-            "```text\n"
-            f"{truncated}\n"
-            "```\n\n"
-            "Task:\n"
-            "1. State clearly whether the document is COMPLIANT or NON-COMPLIANT.\n"
-            "2. Explain briefly why.\n"
-            "3. Recommend precise changes if it is not fully compliant.\n"
-            "4. At the end, under 'Sources', list only the documents and sections/paragraphs you used.\n"
+        await stream_reply(
+            streaming_llm, "Compliance Review", tool_compliance_review(rag_agent, raw_text, doc_path.name)
         )
-
-        print("\n🤖 Compliance Review: thinking...\n")
-        result = await rag_agent.arun(compliance_prompt)
-        print("\n🤖 Compliance Review:\n")
-        print(result)
         return
 
     # --------- Interactive Loop with Commands & Session State ---------
@@ -743,6 +2596,7 @@ async def main(check_doc: str | None = None, build_index_only: bool = False):
     print("💬 Ask questions about USAFA cadet standards, duties, and dress/appearance.\n")
     print("Commands:")
     print("  /role <description>                      → set your role (e.g. 'C4C', 'SQ/CC')")
+    print("  /scope <document|all>                    → limit retrieval to one policy document")
     print("  /locate <question>                       → list relevant documents/sections")
     print("  /summarize <path-to-file>               → summarize a document")
     print("  /rewrite <path-to-file>                 → rewrite a document for compliance")
@@ -754,6 +2608,7 @@ async def main(check_doc: str | None = None, build_index_only: bool = False):
     print("  /stylecheck [path]                      → style & consistency check (or uses loaded doc)")
     print("  /keyfindings [path]                     → extract key tasks, hazards, responsibilities")
     print("  /regformat [path]                       → rewrite into formal memo/regulation format")
+    print("  /analyze-all [path]                     → deviations, risk, style & key findings at once")
     print("  (or just type a normal question)\n")
 
     while True:
@@ -770,25 +2625,36 @@ async def main(check_doc: str | None = None, build_index_only: bool = False):
                     print("⚠️ Usage: /role <description of your role>")
                     continue
                 current_role = new_role
-                rag_agent.role_description = (
-                    f"{base_role_description}\n\n"
-                    f"Current user role: {current_role}.\n"
-                    "When retrieving and selecting policy passages, prioritize guidance that is most "
-                    "relevant to this role's duties, authorities, limitations, responsibilities, and "
-                    "privileges. Tailor tone and recommendations to this role."
-                )
+                rag_agent.role_description = role_description_for(current_role)
                 print(f"✅ Role updated. Current role: {current_role}\n")
                 continue
 
+            # ---- /scope ----
+            if user_input.startswith("/scope"):
+                name = user_input[len("/scope"):].strip()
+                if not name:
+                    current = retriever.source_filter or "all documents"
+                    print(f"⚠️ Usage: /scope <document name|all>  (current: {current})")
+                    continue
+                if name.lower() == "all":
+                    retriever.source_filter = None
+                    print("✅ Retrieval scope cleared; searching all documents.\n")
+                    continue
+                source = match_indexed_source(name)
+                if source is None:
+                    print(f"⚠️ No single indexed document matches '{name}'.")
+                    continue
+                retriever.source_filter = source
+                print(f"✅ Retrieval limited to: {source}\n")
+                continue
+
             # ---- /locate ----
             if user_input.startswith("/locate "):
                 query = user_input[len("/locate "):].strip()
                 if not query:
                     print("⚠️ Usage: /locate <question about policy>")
                     continue
-                print("🤖 Agent (Policy Locator): thinking...\n")
-                response = await tool_policy_locator(rag_agent, query)
-                print(f"🤖 Agent (Policy Locator):\n{response}\n")
+                response = await stream_reply(streaming_llm, "Agent (Policy Locator)", tool_policy_locator(rag_agent, query))
                 last_question = query
                 last_answer = response
                 continue
@@ -801,9 +2667,7 @@ async def main(check_doc: str | None = None, build_index_only: bool = False):
                     print(f"⚠️ File not found: {path}")
                     continue
                 text = load_text_file(path)
-                print("🤖 Agent (Summarizer): thinking...\n")
-                response = await tool_doc_summarizer(rag_agent, text, path.name)
-                print(f"🤖 Agent (Summarizer):\n{response}\n")
+                response = await stream_reply(streaming_llm, "Agent (Summarizer)", tool_doc_summarizer(rag_agent, text, path.name))
                 last_question = f"Summarize document {path.name}"
                 last_answer = response
                 continue
@@ -816,9 +2680,7 @@ async def main(check_doc: str | None = None, build_index_only: bool = False):
                     print(f"⚠️ File not found: {path}")
                     continue
                 text = load_text_file(path)
-                print("🤖 Agent (Compliance Rewriter): thinking...\n")
-                response = await tool_rewrite_for_compliance(rag_agent, text, path.name)
-                print(f"🤖 Agent (Compliance Rewriter):\n{response}\n")
+                response = await stream_reply(streaming_llm, "Agent (Compliance Rewriter)", tool_rewrite_for_compliance(rag_agent, text, path.name))
                 last_question = f"Rewrite document {path.name} for compliance"
                 last_answer = response
                 continue
@@ -831,9 +2693,7 @@ async def main(check_doc: str | None = None, build_index_only: bool = False):
                     print(f"⚠️ File not found: {path}")
                     continue
                 text = load_text_file(path)
-                print("🤖 Agent (Risk Assessment): thinking...\n")
-                response = await tool_risk_assessment(rag_agent, text, path.name)
-                print(f"🤖 Agent (Risk Assessment):\n{response}\n")
+                response = await stream_reply(streaming_llm, "Agent (Risk Assessment)", tool_risk_assessment(rag_agent, text, path.name))
                 last_question = f"Risk assessment for {path.name}"
                 last_answer = response
                 continue
@@ -846,9 +2706,7 @@ async def main(check_doc: str | None = None, build_index_only: bool = False):
                     print(f"⚠️ File not found: {path}")
                     continue
                 text = load_text_file(path)
-                print("🤖 Agent (Deviation Detector): thinking...\n")
-                response = await tool_deviations(rag_agent, text, path.name)
-                print(f"🤖 Agent (Deviation Detector):\n{response}\n")
+                response = await stream_reply(streaming_llm, "Agent (Deviation Detector)", tool_deviations(rag_agent, text, path.name))
                 last_question = f"Find deviations in {path.name}"
                 last_answer = response
                 continue
@@ -875,18 +2733,14 @@ async def main(check_doc: str | None = None, build_index_only: bool = False):
                         print(f"⚠️ File not found: {path}")
                         continue
                     text = load_text_file(path)
-                    print("🤖 Agent (Style Checker): thinking...\n")
-                    response = await tool_stylecheck(rag_agent, text, path.name)
-                    print(f"🤖 Agent (Style Checker):\n{response}\n")
+                    response = await stream_reply(streaming_llm, "Agent (Style Checker)", tool_stylecheck(rag_agent, text, path.name))
                     last_question = f"Style check for {path.name}"
                     last_answer = response
                 else:
                     if loaded_doc_text is None or loaded_doc_name is None:
                         print("⚠️ Usage: /stylecheck <path-to-file> OR load a document with /load-doc first.")
                         continue
-                    print("🤖 Agent (Style Checker): thinking...\n")
-                    response = await tool_stylecheck(rag_agent, loaded_doc_text, loaded_doc_name)
-                    print(f"🤖 Agent (Style Checker):\n{response}\n")
+                    response = await stream_reply(streaming_llm, "Agent (Style Checker)", tool_stylecheck(rag_agent, loaded_doc_text, loaded_doc_name))
                     last_question = f"Style check for {loaded_doc_name}"
                     last_answer = response
                 continue
@@ -901,18 +2755,14 @@ async def main(check_doc: str | None = None, build_index_only: bool = False):
                         print(f"⚠️ File not found: {path}")
                         continue
                     text = load_text_file(path)
-                    print("🤖 Agent (Key Findings): thinking...\n")
-                    response = await tool_keyfindings(rag_agent, text, path.name)
-                    print(f"🤖 Agent (Key Findings):\n{response}\n")
+                    response = await stream_reply(streaming_llm, "Agent (Key Findings)", tool_keyfindings(rag_agent, text, path.name))
                     last_question = f"Key findings for {path.name}"
                     last_answer = response
                 else:
                     if loaded_doc_text is None or loaded_doc_name is None:
                         print("⚠️ Usage: /keyfindings <path-to-file> OR load a document with /load-doc first.")
                         continue
-                    print("🤖 Agent (Key Findings): thinking...\n")
-                    response = await tool_keyfindings(rag_agent, loaded_doc_text, loaded_doc_name)
-                    print(f"🤖 Agent (Key Findings):\n{response}\n")
+                    response = await stream_reply(streaming_llm, "Agent (Key Findings)", tool_keyfindings(rag_agent, loaded_doc_text, loaded_doc_name))
                     last_question = f"Key findings for {loaded_doc_name}"
                     last_answer = response
                 continue
@@ -927,42 +2777,75 @@ async def main(check_doc: str | None = None, build_index_only: bool = False):
                         print(f"⚠️ File not found: {path}")
                         continue
                     text = load_text_file(path)
-                    print("🤖 Agent (Regulation Format Rewriter): thinking...\n")
-                    response = await tool_regformat(rag_agent, text, path.name)
-                    print(f"🤖 Agent (Regulation Format Rewriter):\n{response}\n")
+                    response = await stream_reply(streaming_llm, "Agent (Regulation Format Rewriter)", tool_regformat(rag_agent, text, path.name))
                     last_question = f"Regformat for {path.name}"
                     last_answer = response
                 else:
                     if loaded_doc_text is None or loaded_doc_name is None:
                         print("⚠️ Usage: /regformat <path-to-file> OR load a document with /load-doc first.")
                         continue
-                    print("🤖 Agent (Regulation Format Rewriter): thinking...\n")
-                    response = await tool_regformat(rag_agent, loaded_doc_text, loaded_doc_name)
-                    print(f"🤖 Agent (Regulation Format Rewriter):\n{response}\n")
+                    response = await stream_reply(streaming_llm, "Agent (Regulation Format Rewriter)", tool_regformat(rag_agent, loaded_doc_text, loaded_doc_name))
                     last_question = f"Regformat for {loaded_doc_name}"
                     last_answer = response
                 continue
 
+            # ---- /analyze-all ----
+            if user_input.startswith("/analyze-all"):
+                parts = user_input.split(maxsplit=1)
+                if len(parts) == 2:
+                    path = Path(parts[1].strip())
+                    if not path.exists():
+                        print(f"⚠️ File not found: {path}")
+                        continue
+                    doc_text, doc_name = load_text_file(path), path.name
+                else:
+                    if loaded_doc_text is None or loaded_doc_name is None:
+                        print("⚠️ Usage: /analyze-all <path-to-file> OR load a document with /load-doc first.")
+                        continue
+                    doc_text, doc_name = loaded_doc_text, loaded_doc_name
+
+                def print_result(label: str, result: str) -> None:
+                    print(f"\n🤖 Agent ({label}):\n{result}\n")
+
+                labels = ", ".join(label for label, _ in ANALYZE_ALL_TOOLS)
+                print(f"🤖 Agent: running {labels} concurrently...\n")
+                results = await tool_analyze_all(rag_agent, retriever, doc_text, doc_name, on_result=print_result)
+                last_question = f"Analyze all for {doc_name}"
+                last_answer = "\n\n".join(f"## {label}\n{result}" for label, result in results.items())
+                continue
+
             # ---- /show-context ----
             if user_input == "/show-context":
-                print("🤖 Agent (Audit Trail): thinking...\n")
-                response = await tool_show_context(rag_agent, last_question)
-                print(f"🤖 Agent (Audit Trail):\n{response}\n")
+                response = await stream_reply(streaming_llm, "Agent (Audit Trail)", tool_show_context(rag_agent, last_question))
                 last_answer = response
                 continue
 
             # ---- /why ----
             if user_input == "/why":
-                print("🤖 Agent (Explanation): thinking...\n")
-                response = await tool_explain_last(rag_agent, last_question, last_answer)
-                print(f"🤖 Agent (Explanation):\n{response}\n")
+                response = await stream_reply(streaming_llm, "Agent (Explanation)", tool_explain_last(rag_agent, last_question, last_answer))
                 last_answer = response
                 continue
 
-            # ---- Normal Q&A (now role-aware) ----
-            print("🤖 Agent: thinking...\n")
-            agent_response = await role_aware_answer(rag_agent, user_input, current_role)
-            print(f"🤖 Agent:\n{agent_response}\n")
+            # ---- Normal Q&A (now role-aware, near-duplicates served from cache) ----
+            question_vec = await asyncio.to_thread(embedder.embed_query, normalize_question(user_input))
+            cache_scope = f"role={normalize_question(current_role)}|source={retriever.source_filter or ''}"
+            version = index_version(MANIFEST_PATH)
+            hit = answer_cache.lookup(question_vec, cache_scope, version)
+            if hit:
+                agent_response = hit["answer"]
+                print(
+                    f"🤖 Agent (cached: similar to \"{shorten(hit['question'], width=60)}\", "
+                    f"similarity {hit['similarity']:.2f}):\n{agent_response}\n"
+                )
+            else:
+                retrieved_hits.clear()
+                agent_response = await stream_reply(
+                    streaming_llm, "Agent", role_aware_answer(rag_agent, user_input, current_role)
+                )
+                if agent_response and not agent_response.startswith("Error"):
+                    answer_cache.put(
+                        question_vec, cache_scope, version, user_input, agent_response, list(retrieved_hits)
+                    )
             last_question = user_input
             last_answer = agent_response
 
@@ -974,22 +2857,10 @@ async def main(check_doc: str | None = None, build_index_only: bool = False):
 
 
 if __name__ == "__main__":
-    parser = argparse.ArgumentParser(
-        description="USAFA Policy RAG Assistant"
-    )
-    parser.add_argument(
-        "--check-doc",
-        dest="check_doc",
-        type=str,
-        help="Path to a document to check for compliance against USAFA standards.",
-    )
-    parser.add_argument(
-        "--build-index-only",
-        dest="build_index_only",
-        action="store_true",
-        help="Ingest policies into the vector store and exit (no CLI interaction).",
-    )
-    args = parser.parse_args()
+    args = CLI_ARGS
+
+    if args.clear_ocr_cache:
+        clear_ocr_cache()
 
     # Ensure a dummy CS34 MFR exists so that the script always has at least one doc.
     if not Path("CS34_Discipline_and_Reward_MFR.md").exists():
@@ -1007,5 +2878,15 @@ if __name__ == "__main__":
         main(
             check_doc=args.check_doc,
             build_index_only=args.build_index_only,
+            workers=args.workers,
+            embed_batch_size=args.embed_batch_size,
+            embed_processes=args.embed_processes,
+            check_dir=args.check_dir,
+            concurrency=args.concurrency,
+            serve=args.serve,
+            port=args.port,
+            socket_path=args.socket_path,
+            profile_startup=args.profile_startup,
+            fake_llm=args.fake_llm or LLM_BACKEND == "fake",
         )
     )
@@ -0,0 +1,420 @@
+# policy_bench.py
+"""
+Stage-by-stage benchmark of the policy RAG pipeline on the real corpus
+(final_project.POLICY_DOC_PATHS), with the LLM replaced by the offline stub
+in policy_fake_llm.py so no key or network is needed.
+
+Stages: extraction (the parallel stage ingestion runs), chunking throughput, embedding chunks/sec,
+index build (Chroma upsert + BM25) into a throwaway directory, query-encode
+latency, Chroma and hybrid top-k latency at several k, context assembly
+(retrieve, rerank, pack) size and time, and a full agent answer with the LLM
+share of its latency split out. Latencies are reported as p50/p95/p99.
+
+    python3 policy_bench.py                          # JSON on stdout
+    python3 policy_bench.py --output bench.json --save-baseline
+    python3 policy_bench.py --baseline bench_baseline.json --tolerance 0.25
+
+Run it from the project root (the corpus paths are relative). The live index
+is never touched. Extraction reuses the OCR cache, so OCR'd pages are timed
+warm after the first run. With a baseline, latencies more than --tolerance
+slower (or throughputs that much lower) are reported as regressions and the
+exit status is 1.
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+import final_project as fp
+from policy_fake_llm import FakeLLM
+from policy_search import BM25Index, CrossEncoderReranker, count_tokens, hybrid_query, pack_context
+
+logger = logging.getLogger("policy_bench")
+
+BENCH_BASELINE_PATH = Path("bench_baseline.json")
+BENCH_TOLERANCE = float(os.environ.get("BENCH_TOLERANCE", "0.25"))  # allowed slowdown vs baseline
+BENCH_MIN_DELTA_S = 0.002  # latency changes smaller than this are noise, never regressions
+BENCH_K_VALUES = (1, 5, 8, 12, 20)
+BENCH_TOKEN_MODEL = "gpt-4o"
+BENCH_COLLECTION = "policy_bench"
+
+# Representative questions, mixing prose and identifier-style lookups.
+BENCH_QUERIES = [
+    "Can a C4C wear civilian clothes off base on the weekend?",
+    "What are the grooming standards for male cadet hair?",
+    "When are cadets allowed to wear the PT uniform in the dining facility?",
+    "What disciplinary paperwork can an element leader issue for tardiness?",
+    "AFCWI 36-3501 para 4.7",
+    "Form 10 demerits for a missed formation",
+    "Are earrings authorized with the service dress uniform?",
+    "What are the duties of the cadet squadron commander?",
+    "EXORD 25-003 tattoo policy",
+    "Who approves a pass outside the local area?",
+]
+
+
+def summarize(values: list[float], unit: str = "s") -> dict:
+    """n, mean, min/max and p50/p95/p99 of a sample, tagged with its unit."""
+    if not values:
+        return {"unit": unit, "n": 0}
+    arr = np.asarray(values, dtype=float)
+    p50, p95, p99 = np.percentile(arr, [50, 95, 99])
+    return {
+        "unit": unit,
+        "n": len(values),
+        "mean": float(arr.mean()),
+        "min": float(arr.min()),
+        "max": float(arr.max()),
+        "p50": float(p50),
+        "p95": float(p95),
+        "p99": float(p99),
+    }
+
+
+def timed(fn, *args, **kwargs):
+    """(result, seconds) for one call."""
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+
+# --------------- STAGES ---------------
+
+def bench_extraction(paths: list[Path], repeat: int, workers: int | None) -> tuple[dict, dict[str, str]]:
+    """
+    fp.extract_policy_documents over the whole corpus, as sync_policy_index runs
+    it (process pool, PDF page windows). Documents overlap, so only the round
+    is timed; per-file wall times are in its log lines.
+    """
+    texts, totals = {}, []
+    for _ in range(repeat):
+        texts, seconds = timed(asyncio.run, fp.extract_policy_documents(paths, workers=workers))
+        totals.append(seconds)
+    return {
+        "workers": workers or os.cpu_count(),
+        "documents": {name: {"chars": len(text)} for name, text in texts.items()},
+        "total_seconds": summarize(totals),
+    }, texts
+
+
+def bench_chunking(paths: list[Path], texts: dict[str, str], repeat: int) -> tuple[dict, list]:
+    """chunk_by_sections over every document with its configured settings."""
+    samples, chunked = [], []
+    for _ in range(repeat):
+        chunked = []
+        started = time.perf_counter()
+        for path in paths:
+            text = texts.get(path.name, "")
+            if text.strip():
+                params = fp.chunking_params_for(path)
+                chunked.append((path, fp.chunk_by_sections(text, max_tokens=params["max_tokens"])))
+        samples.append(time.perf_counter() - started)
+    chunks = sum(len(section_chunks) for _, section_chunks in chunked)
+    chars = sum(len(texts.get(path.name, "")) for path, _ in chunked)
+    p50 = summarize(samples)["p50"]
+    return {
+        "chunks": chunks,
+        "chars": chars,
+        "seconds": summarize(samples),
+        "chunks_per_s": chunks / p50 if p50 else None,
+        "chars_per_s": chars / p50 if p50 else None,
+    }, chunked
+
+
+def bench_embedding(embedder, texts: list[str], batch_size: int, repeat: int) -> tuple[dict, list]:
+    """Batched chunk encoding, bypassing the embedding cache."""
+    samples, vectors = [], []
+    for _ in range(repeat):
+        vectors, seconds = timed(fp.embed_texts, embedder, texts, batch_size)
+        samples.append(seconds)
+    p50 = summarize(samples)["p50"]
+    return {
+        "chunks": len(texts),
+        "batch_size": batch_size,
+        "seconds": summarize(samples),
+        "chunks_per_s": len(texts) / p50 if p50 else None,
+    }, vectors
+
+
+def bench_index_build(chroma_client, chunked: list, vectors: list, repeat: int) -> tuple[dict, object, BM25Index]:
+    """Fresh collection + bulk upsert of precomputed vectors, then the BM25 build."""
+    ids, documents, metadatas = [], [], []
+    for path, section_chunks in chunked:
+        ids += fp.chunk_ids_for(path.name, fp.file_sha256(path), len(section_chunks))
+        documents += [c["text"] for c in section_chunks]
+        metadatas += [fp.chunk_metadata(path.name, idx, c) for idx, c in enumerate(section_chunks)]
+
+    upserts, bm25_builds, totals = [], [], []
+    collection, bm25 = None, None
+    for _ in range(repeat):
+        try:
+            chroma_client.delete_collection(name=BENCH_COLLECTION)
+        except Exception:
+            pass  # first round: nothing to delete
+        started = time.perf_counter()
+        collection = chroma_client.get_or_create_collection(name=BENCH_COLLECTION)
+        fp.bulk_upsert(collection, ids, documents, vectors, metadatas, fp.upsert_batch_size(chroma_client))
+        upserted = time.perf_counter()
+        bm25 = BM25Index.build(ids, documents, metadatas)
+        finished = time.perf_counter()
+        upserts.append(upserted - started)
+        bm25_builds.append(finished - upserted)
+        totals.append(finished - started)
+    return {
+        "chunks": len(ids),
+        "seconds": summarize(totals),
+        "upsert_seconds": summarize(upserts),
+        "bm25_seconds": summarize(bm25_builds),
+    }, collection, bm25
+
+
+def bench_query_encode(embedder, queries: list[str], repeat: int) -> tuple[dict, dict[str, list[float]]]:
+    samples, vectors = [], {}
+    for _ in range(repeat):
+        for query in queries:
+            vectors[query], seconds = timed(embedder.embed_query, query)
+            samples.append(seconds)
+    return {"seconds": summarize(samples)}, vectors
+
+
+def bench_topk(collection, bm25: BM25Index, vectors: dict[str, list[float]], k_values, repeat: int) -> tuple[dict, dict]:
+    """Raw Chroma query latency and hybrid (vector + BM25, RRF) latency at each k."""
+    chroma, hybrid = {}, {}
+    for k in k_values:
+        raw, fused = [], []
+        for _ in range(repeat):
+            for query, vector in vectors.items():
+                raw.append(timed(collection.query, query_embeddings=[vector], n_results=k)[1])
+                fused.append(timed(hybrid_query, collection, query, vector, k, bm25=bm25)[1])
+        chroma[f"k={k}"] = summarize(raw)
+        hybrid[f"k={k}"] = summarize(fused)
+    return chroma, hybrid
+
+
+def bench_context_assembly(retriever, queries: list[str], top_k: int, repeat: int) -> dict:
+    """Retrieve (+ rerank) then pack_context, recording how big the packed context gets."""
+    retrieve_s, pack_s, candidate_tokens, context_tokens, passages = [], [], [], [], []
+    for _ in range(repeat):
+        for query in queries:
+            hits, seconds = timed(retriever.query, query, top_k)
+            retrieve_s.append(seconds)
+            (packed, stats), seconds = timed(
+                pack_context,
+                query,
+                hits,
+                retriever.token_budget,
+                retriever.token_model,
+                label=lambda hit: fp.format_chunk_label(hit["metadata"]) + "\n",
+            )
+            pack_s.append(seconds)
+            candidate_tokens.append(sum(count_tokens(hit["text"], retriever.token_model) for hit in hits))
+            context_tokens.append(stats["context_tokens"])
+            passages.append(len(packed))
+    return {
+        "top_k": top_k,
+        "token_budget": retriever.token_budget,
+        "reranker": retriever.reranker is not None,
+        "retrieve_seconds": summarize(retrieve_s),
+        "pack_seconds": summarize(pack_s),
+        "candidate_tokens": summarize(candidate_tokens, "tokens"),
+        "context_tokens": summarize(context_tokens, "tokens"),
+        "passages": summarize(passages, "passages"),
+    }
+
+
+async def bench_agent(retriever, llm: FakeLLM, queries: list[str], repeat: int) -> dict:
+    """Full ReAct answers against the stub LLM; pipeline time = wall time - simulated LLM time."""
+    from fairlib import KnowledgeBaseQueryTool, ReActPlanner, SimpleAgent, ToolExecutor, ToolRegistry, WorkingMemory
+
+    tool_registry = ToolRegistry()
+    tool_registry.register_tool(KnowledgeBaseQueryTool(retriever))
+    wall, model, pipeline, calls = [], [], [], []
+    for _ in range(repeat):
+        for query in queries:
+            agent = SimpleAgent(llm, ReActPlanner(llm, tool_registry), ToolExecutor(tool_registry), WorkingMemory())
+            agent.role_description = fp.BASE_ROLE_DESCRIPTION
+            llm.reset_stats()
+            started = time.perf_counter()
+            with redirect_stdout(io.StringIO()):  # SimpleAgent prints every step
+                await agent.arun(query)
+            seconds = time.perf_counter() - started
+            wall.append(seconds)
+            model.append(llm.stats["seconds"])
+            pipeline.append(seconds - llm.stats["seconds"])
+            calls.append(llm.stats["calls"])
+    return {
+        "seconds": summarize(wall),
+        "llm_seconds": summarize(model),
+        "pipeline_seconds": summarize(pipeline),
+        "llm_calls": summarize(calls, "calls"),
+    }
+
+
+def run_benchmarks(args) -> dict:
+    paths = [path for path in fp.POLICY_DOC_PATHS if path.exists()]
+    queries = BENCH_QUERIES[: args.queries]
+    stages: dict = {}
+    skipped: dict = {}
+
+    logger.info("Extracting %d document(s) x%d...", len(paths), args.repeat)
+    stages["extraction"], texts = bench_extraction(paths, args.repeat, args.workers)
+    logger.info("Chunking...")
+    stages["chunking"], chunked = bench_chunking(paths, texts, args.repeat)
+
+    try:
+        embedder = fp.BackgroundEmbedder(fp.EMBED_MODEL_NAME).get()
+    except RuntimeError as e:
+        embedder = None
+        for stage in ("embedding", "query_encode", "index_build", "chroma_topk", "hybrid_topk",
+                      "context_assembly", "agent_answer"):
+            skipped[stage] = str(e)
+    if embedder is None:
+        return {"stages": stages, "skipped": skipped}
+
+    logger.info("Embedding %d chunks x%d...", stages["chunking"]["chunks"], args.repeat)
+    texts_to_embed = [c["text"] for _, section_chunks in chunked for c in section_chunks]
+    stages["embedding"], vectors = bench_embedding(embedder, texts_to_embed, args.embed_batch_size, args.repeat)
+    logger.info("Encoding %d queries x%d...", len(queries), args.query_repeat)
+    stages["query_encode"], query_vectors = bench_query_encode(embedder, queries, args.query_repeat)
+
+    if not fp.CHROMADB_AVAILABLE:
+        for stage in ("index_build", "chroma_topk", "hybrid_topk", "context_assembly", "agent_answer"):
+            skipped[stage] = "chromadb is not installed"
+        return {"stages": stages, "skipped": skipped}
+
+    import chromadb
+
+    with tempfile.TemporaryDirectory(prefix="policy_bench_") as tmp:
+        chroma_client = chromadb.PersistentClient(path=tmp)
+        logger.info("Building a throwaway index x%d...", args.repeat)
+        stages["index_build"], collection, bm25 = bench_index_build(chroma_client, chunked, vectors, args.repeat)
+        logger.info("Timing top-k at k=%s...", ",".join(map(str, BENCH_K_VALUES)))
+        stages["chroma_topk"], stages["hybrid_topk"] = bench_topk(
+            collection, bm25, query_vectors, BENCH_K_VALUES, args.query_repeat
+        )
+
+        retriever = fp.PolicyRetriever(
+            collection,
+            embedder,
+            bm25=bm25,
+            reranker=CrossEncoderReranker() if fp.CROSS_ENCODER_AVAILABLE else None,
+            token_model=BENCH_TOKEN_MODEL,
+        )
+        logger.info("Assembling contexts...")
+        stages["context_assembly"] = bench_context_assembly(retriever, queries, args.top_k, args.query_repeat)
+
+        logger.info("Answering with the offline LLM stub...")
+        llm = FakeLLM(latency=args.llm_latency, prefill_tps=0, decode_tps=args.llm_decode_tps)
+        stages["agent_answer"] = asyncio.run(bench_agent(retriever, llm, queries, args.query_repeat))
+        stages["agent_answer"]["llm_latency"] = args.llm_latency
+
+    return {"stages": stages, "skipped": skipped}
+
+
+# --------------- BASELINE COMPARISON ---------------
+
+def iter_metrics(node: dict, path: str = ""):
+    """Yield (dotted path, value, direction) for every comparable metric."""
+    for key, value in node.items():
+        here = f"{path}.{key}" if path else key
+        if isinstance(value, dict) and "unit" in value:
+            if value.get("unit") == "s" and value.get("n"):
+                for stat in ("p50", "p95"):
+                    yield f"{here}.{stat}", value[stat], "lower"
+        elif isinstance(value, dict):
+            yield from iter_metrics(value, here)
+        elif key.endswith("_per_s") and isinstance(value, (int, float)):
+            yield here, value, "higher"
+
+
+def compare_to_baseline(current: dict, baseline: dict, tolerance: float) -> dict:
+    """Per-metric ratios against the baseline, and the ones outside tolerance."""
+    base = {name: value for name, value, _ in iter_metrics(baseline.get("stages", {}))}
+    metrics, regressions = {}, []
+    for name, value, direction in iter_metrics(current.get("stages", {})):
+        old = base.get(name)
+        if not old:
+            continue
+        ratio = value / old
+        metrics[name] = {"baseline": old, "current": value, "ratio": ratio}
+        if direction == "lower":
+            regressed = ratio > 1 + tolerance and value - old > BENCH_MIN_DELTA_S
+        else:
+            regressed = ratio < 1 / (1 + tolerance)
+        if regressed:
+            regressions.append(name)
+    return {"tolerance": tolerance, "metrics": metrics, "regressions": regressions}
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark each stage of the USAFA Policy RAG pipeline")
+    parser.add_argument("--repeat", type=int, default=3, metavar="N",
+                        help="Rounds of extraction, chunking, embedding and index build (default: 3).")
+    parser.add_argument("--workers", type=fp.positive_int, default=None, metavar="N",
+                        help="Extraction worker processes (default: one per CPU).")
+    parser.add_argument("--query-repeat", type=int, default=5, metavar="N",
+                        help="Rounds over the query set for the query-time stages (default: 5).")
+    parser.add_argument("--queries", type=int, default=len(BENCH_QUERIES), metavar="N",
+                        help=f"Use the first N benchmark queries (default: {len(BENCH_QUERIES)}).")
+    parser.add_argument("--top-k", type=int, default=5, metavar="K",
+                        help="Hits retrieved per query for context assembly (default: 5).")
+    parser.add_argument("--embed-batch-size", type=int, default=fp.EMBED_BATCH_SIZE, metavar="N",
+                        help=f"Chunks per embedding forward pass (default: {fp.EMBED_BATCH_SIZE}).")
+    parser.add_argument("--llm-latency", default="fixed:0", metavar="DIST",
+                        help="Stub time-to-first-token distribution, e.g. lognormal:0.6,0.35 (default: fixed:0).")
+    parser.add_argument("--llm-decode-tps", type=float, default=0, metavar="TPS",
+                        help="Stub output tokens/sec; 0 means instant (default: 0).")
+    parser.add_argument("--output", type=Path, default=None, metavar="PATH",
+                        help="Also write the JSON results here.")
+    parser.add_argument("--baseline", type=Path, default=BENCH_BASELINE_PATH, metavar="PATH",
+                        help=f"Baseline results to compare against, if present (default: {BENCH_BASELINE_PATH}).")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="Overwrite the baseline with this run's results.")
+    parser.add_argument("--tolerance", type=float, default=BENCH_TOLERANCE, metavar="FRAC",
+                        help=f"Allowed slowdown before a metric counts as a regression (default: {BENCH_TOLERANCE}).")
+    args = parser.parse_args(argv)
+
+    results = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "embed_model": fp.EMBED_MODEL_NAME,
+            "repeat": args.repeat,
+            "query_repeat": args.query_repeat,
+        },
+        **run_benchmarks(args),
+    }
+
+    if args.baseline.exists() and not args.save_baseline:
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+        results["comparison"] = compare_to_baseline(results, baseline, args.tolerance)
+        for name in results["comparison"]["regressions"]:
+            metric = results["comparison"]["metrics"][name]
+            logger.warning("Regression: %s %.4g → %.4g (x%.2f)", name, metric["baseline"], metric["current"], metric["ratio"])
+
+    text = json.dumps(results, indent=2)
+    print(text)
+    if args.output:
+        args.output.write_text(text + "\n", encoding="utf-8")
+    if args.save_baseline:
+        args.baseline.write_text(text + "\n", encoding="utf-8")
+        logger.info("Baseline saved to %s", args.baseline)
+    return 1 if results.get("comparison", {}).get("regressions") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,282 @@
+# policy_cache.py
+"""
+Caches shared by the CLI (final_project.py) and the Streamlit app.
+
+EmbeddingCache persists chunk/query embeddings on disk so byte-identical text
+is never re-encoded, no matter which process asks for it. QueryEmbeddingLRU is
+the in-memory front for hot queries. AnswerCache serves repeated (near-duplicate)
+questions without another retrieval + LLM round trip.
+"""
+
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import closing
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+
+
+def text_sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def normalize_question(question: str) -> str:
+    """Case/whitespace-insensitive form of a question, used before embedding it for lookups."""
+    return " ".join(question.lower().split())
+
+
+def index_version(manifest_path: Path | str) -> str:
+    """Short content hash of the index manifest; changes whenever ingestion changes the index."""
+    try:
+        return hashlib.sha256(Path(manifest_path).read_bytes()).hexdigest()[:16]
+    except OSError:
+        return "none"
+
+
+class EmbeddingCache:
+    """
+    On-disk embedding cache keyed by (model_name, sha256(text)).
+
+    Vectors are appended as raw float32 rows to `<root>/<model>/vectors.f32` and
+    read back through a memory map; `index.sqlite3` maps each text hash to its
+    row. Appends run inside an IMMEDIATE transaction, so the CLI and Streamlit
+    can share one cache without clobbering each other's rows.
+    """
+
+    def __init__(self, root: Path | str, model_name: str):
+        self.model_name = model_name
+        self.dir = Path(root) / model_name.replace("/", "__")
+        self.vectors_path = self.dir / "vectors.f32"
+        self.index_path = self.dir / "index.sqlite3"
+        self._lock = threading.Lock()
+        self._mmap: np.ndarray | None = None
+        self.hits = 0
+        self.misses = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        self.dir.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.index_path, timeout=30, isolation_level=None)
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " text_sha256 TEXT PRIMARY KEY,"
+            " row INTEGER NOT NULL)"
+        )
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        return conn
+
+    def _dim(self, conn: sqlite3.Connection) -> int | None:
+        row = conn.execute("SELECT value FROM meta WHERE key = 'dim'").fetchone()
+        return int(row[0]) if row else None
+
+    def _rows(self, dim: int, needed_row: int) -> np.ndarray:
+        """Memory map of the vectors file, re-opened when other writers have grown it."""
+        if self._mmap is None or self._mmap.shape[0] <= needed_row:
+            count = self.vectors_path.stat().st_size // (dim * 4)
+            self._mmap = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(count, dim))
+        return self._mmap
+
+    @staticmethod
+    def _lookup(conn: sqlite3.Connection, hashes: list[str]) -> dict[str, int]:
+        """Row of each of `hashes` that is cached (only those hashes are read)."""
+        found: dict[str, int] = {}
+        unique = list(dict.fromkeys(hashes))
+        for start in range(0, len(unique), 500):  # stay under SQLite's variable limit
+            batch = unique[start:start + 500]
+            found.update(conn.execute(
+                f"SELECT text_sha256, row FROM embeddings"
+                f" WHERE text_sha256 IN ({','.join('?' * len(batch))})",
+                batch,
+            ).fetchall())
+        return found
+
+    def get_many(self, texts: list[str]) -> list[list[float] | None]:
+        """Cached vector for each text, or None where it has not been embedded yet."""
+        if not texts or not self.index_path.exists():
+            return [None] * len(texts)
+        hashes = [text_sha256(t) for t in texts]
+        with self._lock, closing(self._connect()) as conn:
+            dim = self._dim(conn)
+            if dim is None:
+                return [None] * len(texts)
+            found = self._lookup(conn, hashes)
+            if not found:
+                return [None] * len(texts)
+            rows = self._rows(dim, max(found.values()))
+            return [rows[found[h]].tolist() if h in found else None for h in hashes]
+
+    def put_many(self, texts: list[str], vectors: list[list[float]]) -> None:
+        """Append vectors for texts not already cached."""
+        if not texts:
+            return
+        matrix = np.asarray(vectors, dtype=np.float32)
+        with self._lock, closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                dim = self._dim(conn)
+                if dim is None:
+                    dim = matrix.shape[1]
+                    conn.execute("INSERT INTO meta VALUES ('dim', ?)", (str(dim),))
+                elif dim != matrix.shape[1]:
+                    raise ValueError(f"Embedding dim {matrix.shape[1]} does not match cache dim {dim}")
+
+                hashes = [text_sha256(t) for t in texts]
+                existing = set(self._lookup(conn, hashes))
+                new_rows: list[int] = []
+                new_hashes: list[str] = []
+                for i, h in enumerate(hashes):
+                    if h not in existing:
+                        existing.add(h)
+                        new_rows.append(i)
+                        new_hashes.append(h)
+                if new_rows:
+                    size = self.vectors_path.stat().st_size if self.vectors_path.exists() else 0
+                    first_row = size // (dim * 4)
+                    with self.vectors_path.open("ab") as f:
+                        f.truncate(first_row * dim * 4)  # drop any torn row from a crashed writer
+                        f.write(matrix[new_rows].tobytes())
+                    conn.executemany(
+                        "INSERT INTO embeddings VALUES (?, ?)",
+                        [(h, first_row + offset) for offset, h in enumerate(new_hashes)],
+                    )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def embed(self, texts: list[str], encode: Callable[[list[str]], list[list[float]]]) -> list[list[float]]:
+        """Vectors for texts, calling `encode` only on the ones not cached yet."""
+        vectors = self.get_many(texts)
+        missing = [i for i, v in enumerate(vectors) if v is None]
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+        if missing:
+            # Encode each distinct text once even if it repeats within the batch.
+            unique = list(dict.fromkeys(texts[i] for i in missing))
+            encoded = encode(unique)
+            self.put_many(unique, encoded)
+            by_text = dict(zip(unique, encoded))
+            for i in missing:
+                vectors[i] = list(by_text[texts[i]])
+        return vectors
+
+    def clear(self) -> None:
+        """Delete this model's cached vectors."""
+        with self._lock:
+            self._mmap = None
+            for path in (self.vectors_path, self.index_path):
+                if path.exists():
+                    path.unlink()
+
+
+class QueryEmbeddingLRU:
+    """Thread-safe, size-bounded LRU of query text -> embedding (one per process)."""
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._items: OrderedDict[str, list[float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, query: str) -> list[float] | None:
+        with self._lock:
+            vector = self._items.get(query)
+            if vector is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(query)
+            self.hits += 1
+            return vector
+
+    def put(self, query: str, vector: list[float]) -> None:
+        with self._lock:
+            self._items[query] = vector
+            self._items.move_to_end(query)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+class AnswerCache:
+    """
+    Semantic answer cache. Entries are keyed by the L2-normalized question
+    embedding, a scope string (role, document filter, ...) and the index
+    version; a lookup hits when a same-scope entry's cosine similarity is at
+    least `threshold`. A new index version drops every entry, and entries
+    expire after `ttl_seconds` or by LRU once `maxsize` is reached.
+    """
+
+    def __init__(self, maxsize: int = 256, ttl_seconds: float = 24 * 3600, threshold: float = 0.95):
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self.threshold = threshold
+        self.index_version: str | None = None
+        self._entries: OrderedDict[int, dict] = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _unit(vector) -> np.ndarray:
+        v = np.asarray(vector, dtype=np.float32)
+        norm = float(np.linalg.norm(v))
+        return v / norm if norm else v
+
+    def _sync_version(self, version: str) -> None:
+        if version != self.index_version:
+            self._entries.clear()
+            self.index_version = version
+
+    def _expire(self, now: float) -> None:
+        for entry_id in [i for i, e in self._entries.items() if now - e["created"] > self.ttl_seconds]:
+            del self._entries[entry_id]
+
+    def lookup(self, vector, scope: str, version: str) -> dict | None:
+        """Best cached entry for this scope/version, as a dict with "similarity" added, or None."""
+        query = self._unit(vector)
+        with self._lock:
+            self._sync_version(version)
+            self._expire(time.time())
+            best_id, best_sim = None, self.threshold
+            for entry_id, entry in self._entries.items():
+                if entry["scope"] != scope:
+                    continue
+                sim = float(np.dot(entry["vector"], query))
+                if sim >= best_sim:
+                    best_id, best_sim = entry_id, sim
+            if best_id is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best_id)
+            self.hits += 1
+            entry = self._entries[best_id]
+            return {**{k: v for k, v in entry.items() if k != "vector"}, "similarity": best_sim}
+
+    def put(self, vector, scope: str, version: str, question: str, answer: str, context=None) -> None:
+        with self._lock:
+            self._sync_version(version)
+            self._entries[self._next_id] = {
+                "vector": self._unit(vector),
+                "scope": scope,
+                "question": question,
+                "answer": answer,
+                "context": context or [],
+                "created": time.time(),
+            }
+            self._next_id += 1
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,175 @@
+# policy_client.py
+"""
+Thin client for the policy assistant daemon (`python3 final_project.py --serve`).
+
+Uses only the standard library, so scripts and the Streamlit app can call a
+warm daemon without importing fairlib, chromadb or sentence-transformers.
+
+    python3 policy_client.py ask "Can a C4C wear civilian clothes off base?"
+    python3 policy_client.py deviations event_plan.md
+    python3 policy_client.py analyze-all event_plan.md
+"""
+
+import argparse
+import http.client
+import json
+import os
+import socket
+import sys
+from pathlib import Path
+from urllib.parse import urlsplit
+
+# http://127.0.0.1:<port> for the TCP daemon, or unix:///path/to/socket.
+POLICY_API_URL = os.environ.get(
+    "POLICY_API_URL", f"http://127.0.0.1:{os.environ.get('POLICY_API_PORT', '8765')}"
+)
+POLICY_API_TIMEOUT_S = float(os.environ.get("POLICY_API_TIMEOUT_S", "600"))  # agent runs can be long
+# Written by the daemon at startup (mode 0600); every request must carry its token,
+# so only local processes that can read this file can call the daemon.
+POLICY_API_TOKEN_FILE = Path(
+    os.environ.get("POLICY_API_TOKEN_FILE", str(Path.home() / ".policy_api_token"))
+).expanduser()
+
+DOCUMENT_TOOLS = ("summarize", "rewrite", "risk", "deviations", "stylecheck", "keyfindings", "regformat", "check")
+
+
+def read_api_token(path: Path = POLICY_API_TOKEN_FILE) -> str | None:
+    try:
+        return path.read_text(encoding="utf-8").strip() or None
+    except OSError:
+        return None
+
+
+class PolicyAPIError(Exception):
+    """The daemon answered with an error, or could not be reached."""
+
+    def __init__(self, message: str, status: int | None = None):
+        super().__init__(message)
+        self.status = status
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTPConnection over a Unix domain socket."""
+
+    def __init__(self, socket_path: str, timeout: float):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self) -> None:
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+class PolicyClient:
+    """Calls the daemon's JSON routes; every method returns the decoded response dict."""
+
+    def __init__(self, url: str = POLICY_API_URL, timeout: float = POLICY_API_TIMEOUT_S):
+        self.url = url
+        self.timeout = timeout
+
+    def _connection(self) -> http.client.HTTPConnection:
+        parts = urlsplit(self.url)
+        if parts.scheme == "unix":
+            return UnixHTTPConnection(parts.path, self.timeout)
+        return http.client.HTTPConnection(parts.hostname or "127.0.0.1", parts.port or 80, timeout=self.timeout)
+
+    def request(self, method: str, path: str, payload: dict | None = None) -> dict:
+        body = json.dumps(payload).encode("utf-8") if payload is not None else None
+        headers = {"Content-Type": "application/json"}
+        token = read_api_token()  # re-read each call, so a restarted daemon's token is picked up
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        conn = self._connection()
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            data = json.loads(response.read() or b"{}")
+        except (OSError, http.client.HTTPException, ValueError) as e:
+            raise PolicyAPIError(f"Policy daemon at {self.url} is unavailable: {e}") from e
+        finally:
+            conn.close()
+        if response.status != 200:
+            raise PolicyAPIError(data.get("error", f"HTTP {response.status}"), response.status)
+        return data
+
+    def health(self) -> dict:
+        return self.request("GET", "/health")
+
+    def ask(self, question: str, role: str | None = None, source: str | None = None) -> dict:
+        return self.request("POST", "/ask", {"question": question, "role": role, "source": source})
+
+    def locate(self, query: str, source: str | None = None) -> dict:
+        return self.request("POST", "/locate", {"query": query, "source": source})
+
+    def retrieve(self, query: str, k: int = 5, source: str | None = None) -> list[dict]:
+        """Reranked hybrid hits: {"id", "text", "metadata", "distance", "score", ...}."""
+        return self.request("POST", "/retrieve", {"query": query, "k": k, "source": source})["hits"]
+
+    def embed(self, text: str) -> list[float]:
+        return self.request("POST", "/embed", {"text": text})["vector"]
+
+    def tool(self, name: str, path: str | None = None, text: str | None = None,
+             filename: str | None = None, role: str | None = None) -> dict:
+        """Run a document tool on a local file path (read by the daemon) or on raw text."""
+        return self.request("POST", f"/tools/{name}", document_payload(path, text, filename, role))
+
+    def analyze_all(self, path: str | None = None, text: str | None = None,
+                    filename: str | None = None, role: str | None = None) -> dict:
+        return self.request("POST", "/analyze-all", document_payload(path, text, filename, role))
+
+
+def document_payload(path: str | None, text: str | None, filename: str | None, role: str | None) -> dict:
+    if path is not None:
+        return {"path": str(Path(path).resolve()), "filename": filename, "role": role}
+    return {"text": text, "filename": filename, "role": role}
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Client for the USAFA Policy RAG daemon")
+    parser.add_argument("--url", default=POLICY_API_URL, help=f"Daemon URL (default: {POLICY_API_URL}).")
+    parser.add_argument("--json", dest="as_json", action="store_true", help="Print the raw JSON response.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    sub.add_parser("health", help="Check that the daemon is up.")
+    ask = sub.add_parser("ask", help="Ask a policy question.")
+    ask.add_argument("question")
+    ask.add_argument("--role", default=None)
+    ask.add_argument("--source", default=None, help="Limit retrieval to one policy document.")
+    locate = sub.add_parser("locate", help="List relevant documents/sections.")
+    locate.add_argument("query")
+    locate.add_argument("--source", default=None)
+    for name in DOCUMENT_TOOLS + ("analyze-all",):
+        tool = sub.add_parser(name, help=f"Run the {name} document tool on a file.")
+        tool.add_argument("path")
+        tool.add_argument("--role", default=None)
+
+    args = parser.parse_args(argv)
+    client = PolicyClient(args.url)
+    try:
+        if args.command == "health":
+            response = client.health()
+        elif args.command == "ask":
+            response = client.ask(args.question, args.role, args.source)
+        elif args.command == "locate":
+            response = client.locate(args.query, args.source)
+        elif args.command == "analyze-all":
+            response = client.analyze_all(args.path, role=args.role)
+        else:
+            response = client.tool(args.command, args.path, role=args.role)
+    except PolicyAPIError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+
+    if args.as_json or args.command == "health":
+        print(json.dumps(response, indent=2))
+    elif "results" in response:
+        for label, result in response["results"].items():
+            print(f"## {label}\n{result}\n")
+    else:
+        print(response.get("answer") or response.get("result"))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,275 @@
+# policy_eval.py
+"""
+Retrieval quality and latency evaluation over a labeled set of policy
+questions (policy_eval_questions.jsonl).
+
+Each question names the document and paragraph that answers it, plus a short
+verbatim evidence phrase from that paragraph. A retrieved chunk is relevant
+when it comes from the expected document and contains the phrase, so labels
+stay valid under any chunker. For each retriever configuration (chunker
+settings x hybrid on/off x reranker on/off x k) the runner reports recall@k,
+MRR, retrieval latency (query encode + search + rerank) and the tokens the k
+hits would cost in a prompt.
+
+    python3 policy_eval.py                              # full grid, table on stdout
+    python3 policy_eval.py --chunkers ingest,chars-2500 --k 8,12 --rerank off
+    python3 policy_eval.py --json --output eval.json
+
+Run it from the project root. Each chunker gets its own index in a temporary
+directory, so the live index is never touched. Chunk embeddings are cached in
+EVAL_CACHE_DIR (or --cache-dir), kept apart from the production embedding cache
+so eval-only chunk variants never grow it; repeated runs only re-encode new chunks.
+"""
+
+import argparse
+import json
+import logging
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import final_project as fp
+from policy_bench import summarize
+from policy_cache import EmbeddingCache
+from policy_search import BM25Index, CrossEncoderReranker, count_tokens, hybrid_query
+
+logger = logging.getLogger("policy_eval")
+
+EVAL_SET_PATH = Path("policy_eval_questions.jsonl")
+EVAL_K_VALUES = (4, 6, 8, 12)
+EVAL_TOKEN_MODEL = "gpt-4o"
+# Separate from fp.EMBED_CACHE_DIR: the production cache is append-only and shared
+# by the CLI and Streamlit, and ingestion never uses these chunk variants.
+EVAL_CACHE_DIR = Path(tempfile.gettempdir()) / "policy_eval_embedding_cache"
+
+# "ingest" is what final_project ingests today (chunking_params_for, per document);
+# chars-* is the original fixed-size character splitter with 200 chars of overlap.
+EVAL_CHUNKERS = {
+    "ingest": None,
+    "sections-300": {"chunker": "sections", "max_tokens": 300},
+    "sections-512": {"chunker": "sections", "max_tokens": 512},
+    "sections-800": {"chunker": "sections", "max_tokens": 800},
+    "chars-1200": {"chunker": "chars", "chunk_size": 1200, "chunk_overlap": 200},
+    "chars-2500": {"chunker": "chars", "chunk_size": 2500, "chunk_overlap": 200},
+}
+
+
+def normalize_text(text: str) -> str:
+    """Case- and whitespace-insensitive form used to match evidence phrases."""
+    return " ".join(text.lower().split())
+
+
+def load_eval_set(path: Path = EVAL_SET_PATH) -> list[dict]:
+    """Questions as {"id", "question", "expected": [{"source", "paragraph", "evidence"}]}."""
+    questions = []
+    for line_no, line in enumerate(path.read_text(encoding="utf-8").splitlines(), start=1):
+        if not line.strip():
+            continue
+        item = json.loads(line)
+        if not item.get("question") or not item.get("expected"):
+            raise ValueError(f"{path}:{line_no}: each entry needs a question and expected answers")
+        for expected in item["expected"]:
+            if not expected.get("source") or not expected.get("evidence"):
+                raise ValueError(f"{path}:{line_no}: expected answers need a source and evidence")
+        questions.append(item)
+    return questions
+
+
+def is_relevant(hit: dict, expected: list[dict]) -> bool:
+    text = normalize_text(hit["text"])
+    source = hit["metadata"].get("source")
+    return any(source == e["source"] and normalize_text(e["evidence"]) in text for e in expected)
+
+
+def first_relevant_rank(hits: list[dict], expected: list[dict]) -> int | None:
+    """1-based rank of the first relevant hit, or None."""
+    for rank, hit in enumerate(hits, start=1):
+        if is_relevant(hit, expected):
+            return rank
+    return None
+
+
+# --------------- INDEXES PER CHUNKER ---------------
+
+def extract_corpus(paths: list[Path]) -> dict[str, str]:
+    files_dir = str(Path(".").resolve())
+    texts = {}
+    for path in paths:
+        if path.suffix.lower() == ".pdf":
+            texts[path.name] = fp.extract_pdf_text(path)
+        else:
+            texts[path.name] = fp.extract_policy_text(str(path), files_dir)
+    return texts
+
+
+def chunk_document(path: Path, text: str, spec: dict | None) -> list[dict]:
+    """Chunks for one document under a chunker spec (None = the ingestion settings)."""
+    spec = spec or fp.chunking_params_for(path)
+    if spec["chunker"] == "sections":
+        return fp.chunk_by_sections(text, max_tokens=spec["max_tokens"])
+    return [
+        {"text": piece, "section_path": "", "page_start": None, "page_end": None}
+        for piece in fp.split_text(text, spec["chunk_size"], spec["chunk_overlap"])
+    ]
+
+
+def build_eval_index(chroma_client, name: str, spec: dict | None, paths: list[Path],
+                     texts: dict[str, str], embedder, cache_dir: Path = EVAL_CACHE_DIR) -> tuple[object, BM25Index]:
+    """Chroma collection + BM25 index over the corpus chunked with `spec`."""
+    ids, documents, metadatas = [], [], []
+    for path in paths:
+        text = texts.get(path.name, "")
+        if not text.strip():
+            continue
+        chunks = chunk_document(path, text, spec)
+        ids += fp.chunk_ids_for(path.name, fp.file_sha256(path), len(chunks))
+        documents += [c["text"] for c in chunks]
+        metadatas += [fp.chunk_metadata(path.name, idx, c) for idx, c in enumerate(chunks)]
+
+    cache = EmbeddingCache(cache_dir, fp.EMBED_MODEL_NAME)
+    vectors = cache.embed(documents, lambda missing: fp.embed_texts(embedder, missing))
+    collection = chroma_client.get_or_create_collection(name=f"eval_{name.replace('-', '_')}")
+    fp.bulk_upsert(collection, ids, documents, vectors, metadatas, fp.upsert_batch_size(chroma_client))
+    logger.info("Indexed %s: %d chunks (%d embedded, %d cached).", name, len(ids), cache.misses, cache.hits)
+    return collection, BM25Index.build(ids, documents, metadatas)
+
+
+# --------------- EVALUATION ---------------
+
+def evaluate_config(questions: list[dict], collection, bm25: BM25Index | None,
+                    reranker: CrossEncoderReranker | None, embedder, k: int) -> dict:
+    """recall@k, MRR@k, latency and hit-token cost for one retriever configuration."""
+    ranks, latencies, tokens, misses = [], [], [], []
+    for item in questions:
+        query = item["question"]
+        started = time.perf_counter()
+        hits = hybrid_query(
+            collection,
+            query,
+            embedder.embed_query(query),
+            max(k, fp.RERANK_POOL) if reranker else k,
+            bm25=bm25,
+        )
+        if reranker:
+            hits = reranker.rerank(query, hits, k)
+        latencies.append(time.perf_counter() - started)
+
+        rank = first_relevant_rank(hits[:k], item["expected"])
+        ranks.append(rank)
+        tokens.append(sum(count_tokens(hit["text"], EVAL_TOKEN_MODEL) for hit in hits[:k]))
+        if rank is None:
+            misses.append(item["id"])
+
+    found = [r for r in ranks if r is not None]
+    recall = len(found) / len(questions)
+    mean_tokens = sum(tokens) / len(tokens)
+    return {
+        "questions": len(questions),
+        "recall@k": recall,
+        "mrr": sum(1 / r for r in found) / len(questions),
+        "latency_seconds": summarize(latencies),
+        "hit_tokens": summarize(tokens, "tokens"),
+        "recall_per_1k_tokens": recall / (mean_tokens / 1000) if mean_tokens else None,
+        "misses": misses,
+    }
+
+
+def format_table(results: list[dict]) -> str:
+    header = f"{'configuration':<44} {'chunks':>6} {'recall':>7} {'MRR':>6} {'p50 ms':>7} {'p95 ms':>7} {'tokens':>7}"
+    lines = [header, "-" * len(header)]
+    for r in sorted(results, key=lambda r: (-r["recall@k"], -r["mrr"], r["latency_seconds"]["p50"])):
+        lines.append(
+            f"{r['name']:<44} {r['chunks']:>6} {r['recall@k']:>7.3f} {r['mrr']:>6.3f} "
+            f"{r['latency_seconds']['p50'] * 1000:>7.1f} {r['latency_seconds']['p95'] * 1000:>7.1f} "
+            f"{r['hit_tokens']['mean']:>7.0f}"
+        )
+    return "\n".join(lines)
+
+
+def parse_switch(value: str) -> list[bool]:
+    return {"on": [True], "off": [False], "both": [True, False]}[value]
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Evaluate retrieval quality and latency on labeled policy questions")
+    parser.add_argument("--questions", type=Path, default=EVAL_SET_PATH, metavar="PATH",
+                        help=f"Labeled question set (default: {EVAL_SET_PATH}).")
+    parser.add_argument("--chunkers", default=",".join(EVAL_CHUNKERS), metavar="NAMES",
+                        help=f"Comma-separated chunker settings to compare (default: {','.join(EVAL_CHUNKERS)}).")
+    parser.add_argument("--k", default=",".join(map(str, EVAL_K_VALUES)), metavar="K,...",
+                        help=f"Hits per query to score (default: {','.join(map(str, EVAL_K_VALUES))}).")
+    parser.add_argument("--hybrid", choices=("on", "off", "both"), default="both",
+                        help="Fuse BM25 with vector search (default: both).")
+    parser.add_argument("--rerank", choices=("on", "off", "both"), default="both",
+                        help="Cross-encoder reranking, when sentence-transformers is installed (default: both).")
+    parser.add_argument("--cache-dir", type=Path, default=EVAL_CACHE_DIR, metavar="DIR",
+                        help=f"Embedding cache for the eval's chunk variants (default: {EVAL_CACHE_DIR}).")
+    parser.add_argument("--json", dest="as_json", action="store_true", help="Print JSON instead of a table.")
+    parser.add_argument("--output", type=Path, default=None, metavar="PATH", help="Also write the JSON results here.")
+    args = parser.parse_args(argv)
+
+    unknown = [name for name in args.chunkers.split(",") if name not in EVAL_CHUNKERS]
+    if unknown:
+        parser.error(f"unknown chunker(s) {', '.join(unknown)}; choose from {', '.join(EVAL_CHUNKERS)}")
+    if not fp.CHROMADB_AVAILABLE:
+        print("❌ chromadb is required for the evaluation (pip install chromadb).", file=sys.stderr)
+        return 1
+    try:
+        embedder = fp.BackgroundEmbedder(fp.EMBED_MODEL_NAME).get()
+    except RuntimeError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+
+    rerank_modes = parse_switch(args.rerank)
+    if True in rerank_modes and not fp.CROSS_ENCODER_AVAILABLE:
+        logger.warning("sentence-transformers is not installed; evaluating without the reranker.")
+        rerank_modes = [False]
+    reranker = CrossEncoderReranker() if True in rerank_modes else None
+    k_values = [int(k) for k in args.k.split(",")]
+
+    paths = [path for path in fp.POLICY_DOC_PATHS if path.exists()]
+    present = {path.name for path in paths}
+    questions = [q for q in load_eval_set(args.questions) if any(e["source"] in present for e in q["expected"])]
+    if not questions:
+        print("❌ No questions in the eval set refer to a policy document that is present.", file=sys.stderr)
+        return 1
+    logger.info("Evaluating %d question(s) over %d document(s).", len(questions), len(paths))
+    texts = extract_corpus(paths)
+
+    import chromadb
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="policy_eval_") as tmp:
+        chroma_client = chromadb.PersistentClient(path=tmp)
+        for chunker in args.chunkers.split(","):
+            collection, bm25 = build_eval_index(
+                chroma_client, chunker, EVAL_CHUNKERS[chunker], paths, texts, embedder, args.cache_dir
+            )
+            for hybrid in parse_switch(args.hybrid):
+                for rerank in rerank_modes:
+                    for k in k_values:
+                        name = f"{chunker} hybrid={'on' if hybrid else 'off'} rerank={'on' if rerank else 'off'} k={k}"
+                        metrics = evaluate_config(
+                            questions, collection, bm25 if hybrid else None, reranker if rerank else None, embedder, k
+                        )
+                        results.append({
+                            "name": name,
+                            "chunker": chunker,
+                            "hybrid": hybrid,
+                            "rerank": rerank,
+                            "k": k,
+                            "chunks": collection.count(),
+                            **metrics,
+                        })
+                        logger.info("%s: recall %.3f, MRR %.3f", name, metrics["recall@k"], metrics["mrr"])
+
+    report = {"questions": len(questions), "embed_model": fp.EMBED_MODEL_NAME, "configurations": results}
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+    print(json.dumps(report, indent=2) if args.as_json else format_table(results))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
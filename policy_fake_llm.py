@@ -0,0 +1,303 @@
+# policy_fake_llm.py
+"""
+Deterministic offline stand-in for the chat model, for load tests and
+benchmarks on machines with no OpenAI key or network.
+
+FakeLLM answers like the real model would at the interface level: prompts
+carrying ReActPlanner's JSON format instructions get scripted ReAct actions
+(a knowledge-base search, then final_answer), and plain chat prompts get a
+plain answer assembled from the prompt's own text. Replies are a pure function
+of the messages and FAKE_LLM_SEED. Timing is simulated from a configurable
+time-to-first-token distribution plus prefill and decode token rates, and
+FakeLLM.stats records how much of a run was spent "in the model".
+
+    FakeLLM()                       # fairlib AbstractChatModel, usable wherever OpenAIAdapter is
+    FakeChatClient()                # AsyncOpenAI-shaped client for streamlit_app
+
+Select it with POLICY_LLM=fake (both apps) or `final_project.py --fake-llm`.
+Distributions are written "fixed:S", "uniform:LO,HI", "normal:MEAN,SD" or
+"lognormal:MEDIAN,SIGMA" (seconds, or tokens for FAKE_LLM_ANSWER_TOKENS).
+"""
+
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+import threading
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from typing import AsyncIterator, Callable
+
+from fairlib import Message
+from fairlib.core.interfaces.llm import AbstractChatModel
+
+from policy_search import count_tokens, truncate_to_tokens
+
+try:  # capability/description records arrived after fairlib 0.2; plain dicts before
+    from fairlib.core.interfaces.llm import ModelCapabilities, ModelDescription
+except ImportError:
+    ModelCapabilities = ModelDescription = None
+
+# "openai" (default) or "fake"; read by final_project.py and streamlit_app.py.
+LLM_BACKEND = os.environ.get("POLICY_LLM", "openai").strip().lower()
+
+FAKE_LLM_MODEL = os.environ.get("FAKE_LLM_MODEL", "gpt-4o")  # only used for token counting
+FAKE_LLM_LATENCY = os.environ.get("FAKE_LLM_LATENCY", "lognormal:0.6,0.35")   # time to first token
+FAKE_LLM_PREFILL_TPS = float(os.environ.get("FAKE_LLM_PREFILL_TPS", "4000"))  # prompt tokens/sec
+FAKE_LLM_DECODE_TPS = float(os.environ.get("FAKE_LLM_DECODE_TPS", "60"))      # output tokens/sec
+FAKE_LLM_ANSWER_TOKENS = os.environ.get("FAKE_LLM_ANSWER_TOKENS", "uniform:120,300")
+FAKE_LLM_SEED = int(os.environ.get("FAKE_LLM_SEED", "0"))
+# Optional JSON list of ReAct steps, e.g. [{"tool_name": "course_knowledge_query",
+# "tool_input": "{question}"}]; the model answers once every step has been observed.
+FAKE_LLM_SCRIPT = os.environ.get("FAKE_LLM_SCRIPT")
+
+KNOWLEDGE_TOOL_NAME = "course_knowledge_query"  # fairlib KnowledgeBaseQueryTool.name
+DEFAULT_SCRIPT = [{"tool_name": KNOWLEDGE_TOOL_NAME, "tool_input": "{question}"}]
+REACT_MARKER = "tool_name"  # present in ReActPlanner's format instructions (every fairlib version)
+OBSERVATION_PREFIX = "Observation:"
+QUESTION_CHARS = 200  # scripted tool queries use the start of the request
+
+
+def parse_distribution(spec: str) -> Callable[[random.Random], float]:
+    """Sampler for a "kind:a,b" spec (see module docstring); a bare number means fixed."""
+    kind, _, params = spec.strip().partition(":")
+    if not params:
+        kind, params = "fixed", kind
+    try:
+        args = [float(p) for p in params.split(",")]
+    except ValueError:
+        raise ValueError(f"Bad distribution parameters in {spec!r}") from None
+    expected = {"fixed": 1, "uniform": 2, "normal": 2, "lognormal": 2}
+    if kind not in expected or len(args) != expected[kind]:
+        raise ValueError(f"Unknown distribution {spec!r}; use fixed:S, uniform:LO,HI, normal:MEAN,SD or lognormal:MEDIAN,SIGMA")
+    if kind == "fixed":
+        return lambda rng: max(0.0, args[0])
+    if kind == "uniform":
+        return lambda rng: max(0.0, rng.uniform(args[0], args[1]))
+    if kind == "normal":
+        return lambda rng: max(0.0, rng.gauss(args[0], args[1]))
+    return lambda rng: args[0] * math.exp(args[1] * rng.gauss(0.0, 1.0))
+
+
+def load_script(path: str | None) -> list[dict]:
+    if not path:
+        return DEFAULT_SCRIPT
+    steps = json.loads(Path(path).read_text(encoding="utf-8"))
+    if not isinstance(steps, list) or not all(isinstance(s, dict) and s.get("tool_name") for s in steps):
+        raise ValueError(f"{path}: expected a JSON list of {{\"tool_name\", \"tool_input\"}} steps")
+    return steps
+
+
+def _role_content(message) -> tuple[str, str]:
+    """(role, content) of a fairlib Message or an OpenAI-style dict."""
+    if isinstance(message, dict):
+        return message.get("role", ""), message.get("content") or ""
+    return getattr(message, "role", ""), getattr(message, "content", "") or ""
+
+
+class FakeLLM(AbstractChatModel):
+    """
+    Scripted, latency-simulating chat model implementing fairlib's
+    AbstractChatModel (invoke / ainvoke / stream / astream, each returning
+    fairlib Messages), so planners and agents accept it like OpenAIAdapter.
+    """
+
+    def __init__(
+        self,
+        latency: str = FAKE_LLM_LATENCY,
+        prefill_tps: float = FAKE_LLM_PREFILL_TPS,
+        decode_tps: float = FAKE_LLM_DECODE_TPS,
+        answer_tokens: str = FAKE_LLM_ANSWER_TOKENS,
+        script: list[dict] | None = None,
+        seed: int = FAKE_LLM_SEED,
+        model_name: str = FAKE_LLM_MODEL,
+    ):
+        self.model_name = model_name
+        self.latency = parse_distribution(latency)
+        self.answer_tokens = parse_distribution(answer_tokens)
+        self.prefill_tps = prefill_tps
+        self.decode_tps = decode_tps
+        self.script = script if script is not None else load_script(FAKE_LLM_SCRIPT)
+        self.seed = seed
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "seconds": 0.0}
+
+    # ---- reply generation (pure function of the messages) ----
+
+    def _rng(self, messages: list) -> random.Random:
+        digest = hashlib.sha256(f"{self.seed}".encode("utf-8"))
+        for message in messages:
+            role, content = _role_content(message)
+            digest.update(f"\x00{role}\x00{content}".encode("utf-8"))
+        return random.Random(digest.hexdigest())
+
+    def _answer_text(self, rng: random.Random, source_text: str) -> str:
+        """Roughly answer_tokens tokens of text drawn, in order, from the prompt's words."""
+        words = source_text.split() or ["policy"]
+        target = max(1, int(self.answer_tokens(rng)))
+        start = rng.randrange(len(words))
+        text = " ".join(words[(start + i) % len(words)] for i in range(2 * target))
+        return "Offline stub answer: " + truncate_to_tokens(text, target, self.model_name)
+
+    def reply(self, messages: list) -> str:
+        """The deterministic reply content for `messages`."""
+        rng = self._rng(messages)
+        turns = [_role_content(m) for m in messages]
+        if not any(REACT_MARKER in content for role, content in turns if role == "system"):
+            return self._answer_text(rng, turns[-1][1] if turns else "")
+
+        # ReAct: count observations since the latest user request to pick the script step.
+        last_user = max((i for i, (role, _) in enumerate(turns) if role == "user"), default=-1)
+        question = turns[last_user][1] if last_user >= 0 else ""
+        observations = [c for role, c in turns[last_user + 1:] if c.startswith(OBSERVATION_PREFIX)]
+        step = len(observations)
+        if step < len(self.script):
+            scripted = self.script[step]
+            tool_input = str(scripted.get("tool_input", "{question}")).replace(
+                "{question}", " ".join(question.split())[:QUESTION_CHARS]
+            )
+            action = {"tool_name": scripted["tool_name"], "tool_input": tool_input}
+            thought = scripted.get("thought", f"Step {step + 1}: call {scripted['tool_name']}.")
+        else:
+            evidence = " ".join(o[len(OBSERVATION_PREFIX):] for o in observations) or question
+            action = {"tool_name": "final_answer", "tool_input": self._answer_text(rng, evidence)}
+            thought = "I have the policy context I need to answer."
+        return json.dumps({"thought": thought, "action": action})
+
+    # ---- simulated timing ----
+
+    def _timing(self, messages: list, content: str) -> tuple[float, float, int, int]:
+        """(time to first token, decode seconds, prompt tokens, completion tokens)."""
+        prompt_tokens = sum(count_tokens(_role_content(m)[1], self.model_name) for m in messages)
+        completion_tokens = count_tokens(content, self.model_name)
+        rng = self._rng(messages)
+        rng.random()  # decorrelate from the reply's draws
+        first_token = self.latency(rng) + (prompt_tokens / self.prefill_tps if self.prefill_tps > 0 else 0.0)
+        decode = completion_tokens / self.decode_tps if self.decode_tps > 0 else 0.0
+        return first_token, decode, prompt_tokens, completion_tokens
+
+    def _record(self, seconds: float, prompt_tokens: int, completion_tokens: int) -> None:
+        with self._lock:
+            self.stats["calls"] += 1
+            self.stats["prompt_tokens"] += prompt_tokens
+            self.stats["completion_tokens"] += completion_tokens
+            self.stats["seconds"] += seconds
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self.stats = {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "seconds": 0.0}
+
+    @staticmethod
+    def _message(content: str) -> Message:
+        return Message(role="assistant", content=content)
+
+    def _pieces(self, content: str) -> list[str]:
+        """Word-sized deltas (each keeps its trailing space) for streaming."""
+        return [p for p in content.replace(" ", " \x00").split("\x00") if p]
+
+    # ---- adapter interface ----
+
+    async def acomplete(self, messages: list) -> str:
+        content = self.reply(messages)
+        first_token, decode, prompt_tokens, completion_tokens = self._timing(messages, content)
+        await asyncio.sleep(first_token + decode)
+        self._record(first_token + decode, prompt_tokens, completion_tokens)
+        return content
+
+    async def astream_text(self, messages: list) -> AsyncIterator[str]:
+        """Reply content in word-sized deltas, paced at the decode rate."""
+        content = self.reply(messages)
+        first_token, decode, prompt_tokens, completion_tokens = self._timing(messages, content)
+        pieces = self._pieces(content)
+        await asyncio.sleep(first_token)
+        for piece in pieces:
+            yield piece
+            await asyncio.sleep(decode / len(pieces))
+        self._record(first_token + decode, prompt_tokens, completion_tokens)
+
+    def invoke(self, messages: list, **kwargs):
+        content = self.reply(messages)
+        first_token, decode, prompt_tokens, completion_tokens = self._timing(messages, content)
+        time.sleep(first_token + decode)
+        self._record(first_token + decode, prompt_tokens, completion_tokens)
+        return self._message(content)
+
+    async def ainvoke(self, messages: list, **kwargs):
+        return self._message(await self.acomplete(messages))
+
+    def stream(self, messages: list, **kwargs):
+        content = self.reply(messages)
+        first_token, decode, prompt_tokens, completion_tokens = self._timing(messages, content)
+        pieces = self._pieces(content)
+        time.sleep(first_token)
+        for piece in pieces:
+            yield self._message(piece)
+            time.sleep(decode / len(pieces))
+        self._record(first_token + decode, prompt_tokens, completion_tokens)
+
+    async def astream(self, messages: list, **kwargs):
+        async for piece in self.astream_text(messages):
+            yield self._message(piece)
+
+    def get_model_capabilities(self):
+        capabilities = {
+            "streaming": True,
+            "tool_calling": False,
+            "vision": False,
+            "max_context_window": 128000,
+            "generation_options": frozenset(),
+        }
+        return ModelCapabilities(**capabilities) if ModelCapabilities else capabilities
+
+    def describe_config(self):
+        description = {
+            "adapter": type(self).__name__,
+            "model_name": self.model_name,
+            "provider": "fake",
+            "adapter_kwargs": {"seed": self.seed, "prefill_tps": self.prefill_tps, "decode_tps": self.decode_tps},
+        }
+        return ModelDescription(**description) if ModelDescription else description
+
+
+class FakeChatClient:
+    """
+    AsyncOpenAI look-alike backed by FakeLLM: `await client.chat.completions.create(
+    model=..., messages=[...], stream=False|True)` returns a completion, or an
+    async iterator of delta chunks, shaped like the openai SDK's.
+    """
+
+    def __init__(self, llm: FakeLLM | None = None):
+        self.llm = llm or FakeLLM()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    async def _create(self, model: str, messages: list, stream: bool = False, **kwargs):
+        if stream:
+            return FakeChunkStream(self._chunks(messages))
+        content = await self.llm.acomplete(messages)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+    async def _chunks(self, messages: list):
+        async for piece in self.llm.astream_text(messages):
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=piece))])
+
+
+class FakeChunkStream:
+    """Async iterator of chunks that can be closed like the SDK's AsyncStream."""
+
+    def __init__(self, chunks):
+        self._chunks = chunks
+
+    def __aiter__(self):
+        return self._chunks
+
+    async def close(self) -> None:
+        await self._chunks.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.close()
@@ -0,0 +1,412 @@
+# policy_search.py
+"""
+Retrieval helpers shared by the CLI (final_project.py) and the Streamlit app.
+
+BM25Index is a small lexical inverted index over the policy chunks, persisted
+next to the Chroma collection. hybrid_query fuses it with vector search via
+reciprocal-rank fusion, so identifier queries ("AFCWI 36-3501 para 4.7",
+"Form 10") still land on the right paragraph. CrossEncoderReranker re-scores
+that candidate pool so only the best few chunks reach the prompt, and
+pack_context fits what is left into a token budget.
+"""
+
+import json
+import math
+import re
+import threading
+from collections import Counter, OrderedDict, defaultdict
+from functools import lru_cache
+from importlib.util import find_spec
+from pathlib import Path
+from typing import Any
+
+# Optional dependencies are only checked for here and imported on first use,
+# so importing this module never pulls in torch.
+# Optional: cross-encoder reranking (same model as demos/demo_faiss_rag_from_readme.py)
+CROSS_ENCODER_AVAILABLE = find_spec("sentence_transformers") is not None
+# Optional: exact token counts for OpenAI models
+TIKTOKEN_AVAILABLE = find_spec("tiktoken") is not None
+
+# Words plus dotted/hyphenated identifiers (4.7.1, 36-3501, 25-003) kept whole.
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:[.\-/][a-z0-9]+)*")
+BM25_VERSION = 1
+RRF_K = 60  # standard reciprocal-rank-fusion damping constant
+RERANKER_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Lowercased terms. Hyphen/slash identifiers also contribute their parts
+    (36-3501 → 36, 3501); dotted paragraph numbers stay whole, since their
+    parts (4, 7) would match nearly every chunk.
+    """
+    terms: list[str] = []
+    for token in TOKEN_RE.findall(text.lower()):
+        terms.append(token)
+        if "-" in token or "/" in token:
+            terms.extend(part for part in re.split(r"[\-/]", token) if part)
+    return terms
+
+
+def bm25_document_text(text: str, metadata: dict) -> str:
+    """What gets indexed for a chunk: its source and section path as well as its text."""
+    return " ".join(filter(None, [metadata.get("source", ""), metadata.get("section", ""), text]))
+
+
+class BM25Index:
+    """Okapi BM25 over chunk IDs, with an optional per-source filter at query time."""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.ids: list[str] = []
+        self.sources: list[str] = []
+        self.doc_lens: list[int] = []
+        self.postings: dict[str, list[tuple[int, int]]] = {}
+
+    @classmethod
+    def build(cls, ids: list[str], texts: list[str], metadatas: list[dict]) -> "BM25Index":
+        index = cls()
+        postings: dict[str, list[tuple[int, int]]] = defaultdict(list)
+        for doc_idx, (chunk_id, text, meta) in enumerate(zip(ids, texts, metadatas)):
+            meta = meta or {}
+            terms = tokenize(bm25_document_text(text, meta))
+            index.ids.append(chunk_id)
+            index.sources.append(meta.get("source", ""))
+            index.doc_lens.append(len(terms))
+            for term, tf in Counter(terms).items():
+                postings[term].append((doc_idx, tf))
+        index.postings = dict(postings)
+        return index
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def search(self, query: str, top_k: int = 20, source: str | None = None) -> list[tuple[str, float]]:
+        """Top-k (chunk_id, score) pairs, best first."""
+        if not self.ids:
+            return []
+        n_docs = len(self.ids)
+        avg_len = sum(self.doc_lens) / n_docs or 1.0
+        scores: dict[int, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_idx, tf in postings:
+                if source and self.sources[doc_idx] != source:
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lens[doc_idx] / avg_len)
+                scores[doc_idx] += idf * tf * (self.k1 + 1) / (tf + norm)
+        best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+        return [(self.ids[doc_idx], score) for doc_idx, score in best]
+
+    def save(self, path: Path | str) -> None:
+        """Atomically write the index as JSON."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        payload = {
+            "version": BM25_VERSION,
+            "k1": self.k1,
+            "b": self.b,
+            "ids": self.ids,
+            "sources": self.sources,
+            "doc_lens": self.doc_lens,
+            "postings": self.postings,
+        }
+        tmp_path = path.with_suffix(path.suffix + ".tmp")
+        tmp_path.write_text(json.dumps(payload), encoding="utf-8")
+        tmp_path.replace(path)
+
+    @classmethod
+    def load(cls, path: Path | str) -> "BM25Index | None":
+        """The saved index, or None if it is missing, unreadable or from another version."""
+        try:
+            payload = json.loads(Path(path).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        if payload.get("version") != BM25_VERSION:
+            return None
+        index = cls(payload["k1"], payload["b"])
+        index.ids = payload["ids"]
+        index.sources = payload["sources"]
+        index.doc_lens = payload["doc_lens"]
+        index.postings = {term: [tuple(p) for p in plist] for term, plist in payload["postings"].items()}
+        return index
+
+
+def rrf_fuse(rankings: list[list[str]], k: int = RRF_K) -> list[tuple[str, float]]:
+    """Reciprocal-rank fusion of several best-first ID lists."""
+    scores: dict[str, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, item_id in enumerate(ranking):
+            scores[item_id] += 1.0 / (k + rank + 1)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+def hybrid_query(
+    collection,
+    query: str,
+    query_vec: list[float],
+    top_k: int,
+    bm25: BM25Index | None = None,
+    source: str | None = None,
+    candidates: int | None = None,
+) -> list[dict[str, Any]]:
+    """
+    Vector + BM25 retrieval over a Chroma collection, fused with RRF.
+    Returns up to top_k {"id", "text", "metadata", "distance", "score"} dicts,
+    best first; without a BM25 index this is plain vector search.
+    """
+    if top_k <= 0:
+        return []
+    pool = max(candidates or top_k * 4, top_k)
+    query_kwargs: dict[str, Any] = {"query_embeddings": [query_vec], "n_results": pool}
+    if source:
+        query_kwargs["where"] = {"source": source}
+    res = collection.query(**query_kwargs)
+
+    ids = (res.get("ids") or [[]])[0]
+    docs = (res.get("documents") or [[]])[0]
+    metas = (res.get("metadatas") or [[]])[0]
+    distances = (res.get("distances") or [[]])[0]
+    hits: dict[str, dict[str, Any]] = {
+        chunk_id: {
+            "id": chunk_id,
+            "text": docs[i] if i < len(docs) else "",
+            "metadata": (metas[i] if i < len(metas) else None) or {},
+            "distance": distances[i] if i < len(distances) else None,
+        }
+        for i, chunk_id in enumerate(ids)
+    }
+
+    if bm25 is None or not len(bm25):
+        return [{**hits[chunk_id], "score": None} for chunk_id in ids[:top_k]]
+
+    lexical = [chunk_id for chunk_id, _ in bm25.search(query, top_k=pool, source=source)]
+    fused = rrf_fuse([ids, lexical])[:top_k]
+
+    # Fetch text for chunks only the lexical side found.
+    missing = [chunk_id for chunk_id, _ in fused if chunk_id not in hits]
+    if missing:
+        extra = collection.get(ids=missing, include=["documents", "metadatas"])
+        for i, chunk_id in enumerate(extra.get("ids") or []):
+            hits[chunk_id] = {
+                "id": chunk_id,
+                "text": (extra.get("documents") or [])[i],
+                "metadata": ((extra.get("metadatas") or [])[i]) or {},
+                "distance": None,
+            }
+    return [{**hits[chunk_id], "score": score} for chunk_id, score in fused if chunk_id in hits]
+
+
+class CrossEncoderReranker:
+    """
+    Re-scores (query, chunk) pairs with a cross-encoder on CPU, in batches.
+    Scores are memoized per (query, chunk id) in a bounded LRU, so repeated or
+    overlapping queries only score chunks they have not seen. The model is
+    loaded on first use.
+    """
+
+    def __init__(self, model_name: str = RERANKER_MODEL, batch_size: int = 32, cache_size: int = 4096):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self._model = None
+        self._scores: OrderedDict[tuple[str, str], float] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def model(self):
+        with self._lock:
+            if self._model is None:
+                if not CROSS_ENCODER_AVAILABLE:
+                    raise ImportError("sentence-transformers is required for reranking")
+                from sentence_transformers import CrossEncoder
+
+                self._model = CrossEncoder(self.model_name)
+            return self._model
+
+    def score(self, query: str, hits: list[dict[str, Any]]) -> list[float]:
+        """Relevance score for each hit's text (cached by hit id)."""
+        with self._lock:
+            cached = [self._scores.get((query, hit["id"])) for hit in hits]
+        todo = [i for i, value in enumerate(cached) if value is None]
+        if todo:
+            fresh = self.model.predict(
+                [(query, hits[i]["text"]) for i in todo],
+                batch_size=self.batch_size,
+                show_progress_bar=False,
+            )
+            with self._lock:
+                for i, value in zip(todo, fresh):
+                    cached[i] = float(value)
+                    self._scores[(query, hits[i]["id"])] = float(value)
+                while len(self._scores) > self.cache_size:
+                    self._scores.popitem(last=False)
+        return cached
+
+    def rerank(self, query: str, hits: list[dict[str, Any]], top_k: int) -> list[dict[str, Any]]:
+        """The top_k hits by cross-encoder score, each with "rerank_score" added."""
+        if not hits:
+            return []
+        scores = self.score(query, hits)
+        order = sorted(range(len(hits)), key=lambda i: scores[i], reverse=True)[:top_k]
+        return [{**hits[i], "rerank_score": scores[i]} for i in order]
+
+
+# --------------- TOKEN-BUDGETED CONTEXT PACKING ---------------
+
+SENTENCE_SPLIT_RE = re.compile(r"(?<=[.!?;:])\s+(?=[A-Z0-9(“\"])|\n+")
+MIN_PACKED_TOKENS = 24
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i in is it my of on or should "
+    "that the their there this to was what when where which who why will with you your".split()
+)
+
+
+@lru_cache(maxsize=8)
+def _encoding_for(model: str):
+    if not TIKTOKEN_AVAILABLE:
+        return None
+    import tiktoken
+
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        try:
+            return tiktoken.get_encoding("o200k_base")  # current OpenAI chat models
+        except Exception:
+            return None
+    except Exception:
+        return None  # e.g. BPE files not downloadable offline
+
+
+def count_tokens(text: str, model: str) -> int:
+    """Tokens `text` costs for `model` (tiktoken when available, else ~4 chars/token)."""
+    encoding = _encoding_for(model)
+    if encoding is None:
+        return max(1, len(text) // 4) if text else 0
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text: str, max_tokens: int, model: str) -> str:
+    """Cut `text` to at most max_tokens for `model`, keeping its whitespace intact."""
+    encoding = _encoding_for(model)
+    if encoding is None:
+        return text[: max_tokens * 4]
+    tokens = encoding.encode(text, disallowed_special=())
+    return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens])
+
+
+def _sentence_pieces(text: str) -> list[tuple[str, str]]:
+    """(sentence, raw text up to the next sentence) pairs; concatenating the raw parts gives `text` back."""
+    parts = re.split(f"({SENTENCE_SPLIT_RE.pattern})", text)
+    pieces: list[tuple[str, str]] = []
+    lead = ""
+    for i in range(0, len(parts), 2):
+        segment, separator = parts[i], parts[i + 1] if i + 1 < len(parts) else ""
+        if segment.strip():
+            pieces.append((segment.strip(), lead + segment + separator))
+            lead = ""
+        elif pieces:
+            pieces[-1] = (pieces[-1][0], pieces[-1][1] + segment + separator)
+        else:
+            lead += segment + separator
+    return pieces
+
+
+def _join_pieces(pieces: list[tuple[str, str]], keep) -> str:
+    """Text of the kept sentences, each followed by its original separator (line breaks, list layout)."""
+    return "".join(pieces[i][1] for i in sorted(keep)).strip()
+
+
+def _shingles(text: str, size: int = 8) -> set[tuple[str, ...]]:
+    words = text.lower().split()
+    return {tuple(words[i:i + size]) for i in range(max(1, len(words) - size + 1))}
+
+
+def pack_context(
+    query: str,
+    chunks: list[dict[str, Any]],
+    budget_tokens: int,
+    model: str,
+    label=lambda chunk: "",
+    max_chunk_tokens: int | None = None,
+) -> tuple[list[dict[str, Any]], dict[str, int]]:
+    """
+    Fill a token budget with retrieved chunks, most relevant (first) first.
+    - Chunks mostly covered by ones already packed (overlapping windows,
+      repeated passages) are dropped, and repeated sentences are removed.
+    - A chunk that does not fit (or exceeds max_chunk_tokens) is trimmed to its
+      most query-relevant sentences, kept in original order.
+    `label(chunk)` is the provenance prefix each chunk is rendered with; its
+    tokens count against the budget. Returns (packed chunks with "text" and
+    "tokens" updated, stats).
+    """
+    query_terms = {t for t in tokenize(query) if t not in STOPWORDS}
+    seen_shingles: set[tuple[str, ...]] = set()
+    seen_sentences: set[str] = set()
+    packed: list[dict[str, Any]] = []
+    stats = {"chunks_in": len(chunks), "chunks_used": 0, "duplicates_dropped": 0,
+             "sentences_trimmed": 0, "context_tokens": 0}
+    remaining = budget_tokens
+
+    for chunk in chunks:
+        if remaining <= 0:
+            break
+        shingles = _shingles(chunk["text"])
+        if shingles and len(shingles & seen_shingles) / len(shingles) >= 0.6:
+            stats["duplicates_dropped"] += 1
+            continue
+
+        pieces = _sentence_pieces(chunk["text"])
+        fresh = [i for i, (sentence, _) in enumerate(pieces) if sentence.lower() not in seen_sentences]
+        stats["sentences_trimmed"] += len(pieces) - len(fresh)
+        if not fresh:
+            stats["duplicates_dropped"] += 1
+            continue
+        sentences = [pieces[i][0] for i in fresh]
+
+        overhead = count_tokens(label(chunk), model) + 1
+        cap = remaining - overhead
+        if max_chunk_tokens:
+            cap = min(cap, max_chunk_tokens)
+        if cap < MIN_PACKED_TOKENS:
+            break  # not enough room left for a useful excerpt
+
+        # Untouched chunks keep their text verbatim; trimmed ones keep their layout.
+        text = chunk["text"].strip() if len(fresh) == len(pieces) else _join_pieces(pieces, fresh)
+        tokens = count_tokens(text, model)
+        if tokens > cap:
+            # Keep the sentences sharing the most query terms, in document order.
+            costs = [count_tokens(sentence, model) for sentence in sentences]
+            def relevance(i: int) -> tuple[float, int]:
+                terms = set(tokenize(sentences[i]))
+                return (len(terms & query_terms) / (1 + math.log1p(costs[i])), -i)
+            keep, used = set(), 0
+            for i in sorted(range(len(sentences)), key=relevance, reverse=True):
+                if used + costs[i] <= cap:
+                    keep.add(i)
+                    used += costs[i]
+            text = _join_pieces(pieces, [fresh[i] for i in keep])
+            tokens = count_tokens(text, model)
+            while tokens > cap and keep:
+                # Joined text can cost slightly more than its parts; shed the weakest.
+                keep.discard(min(keep, key=relevance))
+                text = _join_pieces(pieces, [fresh[i] for i in keep])
+                tokens = count_tokens(text, model)
+            if not keep:
+                continue
+            stats["sentences_trimmed"] += len(sentences) - len(keep)
+            sentences = [sentences[i] for i in sorted(keep)]
+
+        seen_shingles |= _shingles(text)  # only what was kept, so trimmed-away text is not "seen"
+        seen_sentences.update(s.lower() for s in sentences)
+        packed.append({**chunk, "text": text, "tokens": tokens + overhead})
+        remaining -= tokens + overhead
+
+    stats["chunks_used"] = len(packed)
+    stats["context_tokens"] = budget_tokens - remaining
+    return packed, stats
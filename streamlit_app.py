@@ -1,13 +1,38 @@
 # streamlit_app.py
 
+import asyncio
+import json
 import os
+import queue
+import random
+import threading
+import time
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator
 
 import streamlit as st
 import chromadb
 from sentence_transformers import SentenceTransformer
-from openai import OpenAI
+import httpx
+from openai import APIConnectionError, APIStatusError, APITimeoutError, AsyncOpenAI
+
+from policy_cache import (
+    AnswerCache,
+    QueryEmbeddingLRU,
+    index_version,
+    normalize_question,
+)
+from policy_client import PolicyAPIError, PolicyClient
+from policy_fake_llm import LLM_BACKEND, FakeChatClient
+from policy_search import (
+    CROSS_ENCODER_AVAILABLE,
+    BM25Index,
+    CrossEncoderReranker,
+    count_tokens,
+    hybrid_query,
+    pack_context,
+    truncate_to_tokens,
+)
 
 # ─────────────────────────────
 # Config
@@ -16,11 +41,36 @@ from openai import OpenAI
 PROJECT_ROOT = Path(__file__).parent.resolve()
 PERSIST_DIR = PROJECT_ROOT / "policy_index"          # must match final_project.py
 COLLECTION_NAME = "usafa_policy_rag"                 # must match final_project.py
+MANIFEST_PATH = PROJECT_ROOT / "policy_index_manifest.json"  # written by final_project.py
+BM25_PATH = PERSIST_DIR / "bm25_index.json"          # written by final_project.py
 
 EMBED_MODEL_NAME = "all-MiniLM-L6-v2"                # same as SentenceTransformerEmbedder
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "1024"))  # query embeddings kept in memory
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "256"))      # cached answers (LRU)
+ANSWER_CACHE_TTL_S = float(os.getenv("ANSWER_CACHE_TTL_S", "86400"))
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))  # cosine similarity
 CHAT_MODEL = "gpt-4.1-mini"                          # bump to gpt-4.1 / gpt-4o if you want
-
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+ANSWER_K = 6                                         # reranked candidates offered to the packer; the token budget trims them
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1200"))  # policy context per prompt
+MAX_CHUNK_TOKENS = int(os.getenv("MAX_CHUNK_TOKENS", "400"))          # longer chunks are trimmed
+DOC_TOKEN_BUDGET = int(os.getenv("DOC_TOKEN_BUDGET", "6000"))          # uploaded document per prompt
+RERANK_POOL = int(os.getenv("RERANK_POOL", "20"))    # hybrid candidates scored by the cross-encoder
+# Optional warm daemon (`python3 final_project.py --serve`) for query embedding +
+# retrieval; the local model is then only loaded if the daemon is unreachable.
+POLICY_API_URL = os.getenv("POLICY_API_URL")
+
+# LLM transport: one pooled async client per process, shared by all sessions.
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))   # in-flight chat requests
+LLM_TIMEOUT_S = float(os.getenv("LLM_TIMEOUT_S", "60"))            # read/write/pool timeout
+LLM_CONNECT_TIMEOUT_S = float(os.getenv("LLM_CONNECT_TIMEOUT_S", "10"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))           # on 429 / 5xx / network errors
+LLM_BACKOFF_BASE_S = float(os.getenv("LLM_BACKOFF_BASE_S", "0.5"))
+LLM_BACKOFF_MAX_S = float(os.getenv("LLM_BACKOFF_MAX_S", "20"))
+
+# Fixed retrieval query behind every document analysis; its top-k is computed once.
+ANALYSIS_QUERY = "overall cadet standards, duties, and dress & appearance"
+ANALYSIS_K = 6
+ANALYZE_ALL_MODES = ["Compliance Review", "Key Findings", "Style Check"]  # run together by "All Analyses"
 
 
 # ─────────────────────────────
@@ -28,7 +78,7 @@ client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 # ─────────────────────────────
 
 def ensure_openai_key() -> None:
-    if not os.getenv("OPENAI_API_KEY"):
+    if LLM_BACKEND != "fake" and not os.getenv("OPENAI_API_KEY"):
         st.error(
             "OPENAI_API_KEY not set.\n\n"
             "Export it in your shell or load it from a `.env` file."
@@ -36,8 +86,81 @@ def ensure_openai_key() -> None:
         st.stop()
 
 
+class ModelLoader:
+    """
+    Loads the SentenceTransformer on a background thread; get() blocks until
+    ready. A failed load is retried on the next get() instead of being cached.
+    """
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+        self.model: SentenceTransformer | None = None
+        self.error: Exception | None = None
+        self.load_seconds: float | None = None
+        self._lock = threading.Lock()
+        self._start()
+
+    def _start(self) -> None:
+        self._ready = threading.Event()
+        threading.Thread(target=self._load, args=(self._ready,), name="embed-model-loader", daemon=True).start()
+
+    def _load(self, ready: threading.Event) -> None:
+        started = time.perf_counter()
+        try:
+            self.model = SentenceTransformer(self.model_name)
+        except Exception as e:
+            self.error = e
+        finally:
+            self.load_seconds = time.perf_counter() - started
+            ready.set()
+
+    @property
+    def warm(self) -> bool:
+        return self._ready.is_set() and self.model is not None
+
+    def get(self) -> SentenceTransformer:
+        ready = self._ready
+        ready.wait()
+        if self.model is None:
+            with self._lock:
+                if self._ready is ready:  # first caller to see this failure starts a fresh attempt
+                    self._start()
+            raise RuntimeError(f"Could not load embedding model {self.model_name}: {self.error}")
+        return self.model
+
+
+# st.cache_resource makes each of these a process-wide singleton shared by all
+# sessions (creation is locked, so concurrent first visits build it only once).
+
+@st.cache_resource
+def get_model_loader() -> ModelLoader:
+    return ModelLoader(EMBED_MODEL_NAME)
+
+
+@st.cache_resource
+def get_chroma_client():
+    return chromadb.PersistentClient(path=str(PERSIST_DIR))
+
+
+@st.cache_resource
+def get_policy_collection(stamp: float):
+    """Collection handle for the current index build (`stamp`); re-ingestion recreates the collection."""
+    return get_chroma_client().get_collection(COLLECTION_NAME)
+
+
+@st.cache_resource
+def get_policy_client() -> PolicyClient | None:
+    return PolicyClient(POLICY_API_URL) if POLICY_API_URL else None
+
+
+# Start loading the model as soon as the server first executes this script,
+# before any page rendering; later reruns just get the cached loader back.
+if not POLICY_API_URL:
+    get_model_loader()
+
+
 def init_backends():
-    """Initialize Chroma + SentenceTransformer once and keep in session_state."""
+    """Check the index exists and open the shared Chroma collection (model loads in the background)."""
     # Ensure index directory exists
     if not PERSIST_DIR.exists():
         st.error(
@@ -50,61 +173,249 @@ def init_backends():
         )
         st.stop()
 
-    # Chroma client
-    if "chroma_client" not in st.session_state:
-        st.session_state.chroma_client = chromadb.PersistentClient(
-            path=str(PERSIST_DIR)
+    collections = {c.name for c in get_chroma_client().list_collections()}
+    if COLLECTION_NAME not in collections:
+        st.error(
+            f"Chroma collection '{COLLECTION_NAME}' not found in index.\n\n"
+            "Make sure your CLI used the same collection_name."
         )
+        st.stop()
+    get_policy_collection(index_stamp())
 
-    # Collection
-    if "policy_collection" not in st.session_state:
-        client_chroma = st.session_state.chroma_client
-        collections = {c.name for c in client_chroma.list_collections()}
-        if COLLECTION_NAME not in collections:
-            st.error(
-                f"Chroma collection '{COLLECTION_NAME}' not found in index.\n\n"
-                "Make sure your CLI used the same collection_name."
-            )
-            st.stop()
-        st.session_state.policy_collection = client_chroma.get_collection(
-            COLLECTION_NAME
-        )
 
-    # Embed model
-    if "embed_model" not in st.session_state:
-        st.session_state.embed_model = SentenceTransformer(EMBED_MODEL_NAME)
+def get_collection_and_model():
+    return get_policy_collection(index_stamp()), get_model_loader().get()
 
 
-def get_collection_and_model():
-    return st.session_state.policy_collection, st.session_state.embed_model
+@st.cache_resource
+def get_query_cache() -> QueryEmbeddingLRU:
+    """Query-embedding LRU shared by every session in this Streamlit process."""
+    return QueryEmbeddingLRU(QUERY_CACHE_SIZE)
+
+
+@st.cache_resource
+def get_answer_cache() -> AnswerCache:
+    """Semantic answer cache shared by every session (cleared when the index changes)."""
+    return AnswerCache(ANSWER_CACHE_SIZE, ANSWER_CACHE_TTL_S, ANSWER_CACHE_THRESHOLD)
+
+
+@st.cache_resource
+def get_reranker() -> CrossEncoderReranker | None:
+    """Shared cross-encoder (with its per-(query, chunk) score cache), if installed."""
+    return CrossEncoderReranker() if CROSS_ENCODER_AVAILABLE else None
+
+
+@st.cache_resource
+def get_bm25_index(stamp: float) -> BM25Index | None:
+    """Lexical index for the current index build (`stamp`); None falls back to vector-only."""
+    return BM25Index.load(BM25_PATH)
+
+
+def index_stamp() -> float:
+    """Changes whenever the CLI rewrites the index manifest (used to key cached results)."""
+    try:
+        return MANIFEST_PATH.stat().st_mtime
+    except OSError:
+        return 0.0
 
 
 # ─────────────────────────────
-# Core RAG helpers
+# LLM client (async, pooled, rate-limited)
 # ─────────────────────────────
 
-def retrieve_context(question: str, k: int = 8) -> List[Dict[str, Any]]:
-    """Use prebuilt Chroma index + SentenceTransformer to get top-k chunks."""
-    collection, embed_model = get_collection_and_model()
-    query_vec = embed_model.encode([question])[0].tolist()
+class LLMRuntime:
+    """
+    Runs an AsyncOpenAI client on a dedicated event-loop thread. Script threads
+    submit coroutines to it, and a shared semaphore caps in-flight requests. A
+    burst of users then queues on the limiter instead of each pinning a thread
+    and a fresh connection.
+    """
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, name="llm-event-loop", daemon=True).start()
+        if LLM_BACKEND == "fake":
+            # Offline, scripted stand-in (POLICY_LLM=fake) with the same call shape.
+            self.client = FakeChatClient()
+        else:
+            self.client = AsyncOpenAI(
+                api_key=os.getenv("OPENAI_API_KEY"),
+                max_retries=0,  # retried below with jittered backoff
+                http_client=httpx.AsyncClient(
+                    limits=httpx.Limits(
+                        max_connections=LLM_MAX_CONCURRENCY,
+                        max_keepalive_connections=LLM_MAX_CONCURRENCY,
+                    ),
+                    timeout=httpx.Timeout(LLM_TIMEOUT_S, connect=LLM_CONNECT_TIMEOUT_S),
+                ),
+            )
+        self.limiter = self.run(self._make_semaphore())
+
+    @staticmethod
+    async def _make_semaphore() -> asyncio.Semaphore:
+        return asyncio.Semaphore(LLM_MAX_CONCURRENCY)  # bound to the runtime's loop
+
+    def run(self, coro):
+        """Run a coroutine on the runtime loop and block the calling script thread for it."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+
+@st.cache_resource
+def get_llm_runtime() -> LLMRuntime:
+    return LLMRuntime()
+
+
+def is_retryable(exc: Exception) -> bool:
+    if isinstance(exc, (APIConnectionError, APITimeoutError)):
+        return True
+    return isinstance(exc, APIStatusError) and (exc.status_code == 429 or exc.status_code >= 500)
+
+
+def backoff_delay(attempt: int, exc: Exception) -> float:
+    """Full-jitter exponential backoff, never shorter than a server Retry-After."""
+    delay = random.uniform(0, min(LLM_BACKOFF_MAX_S, LLM_BACKOFF_BASE_S * 2 ** attempt))
+    response = getattr(exc, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    try:
+        return max(delay, min(float(retry_after), LLM_BACKOFF_MAX_S)) if retry_after else delay
+    except ValueError:
+        return delay
+
+
+async def _chat_completion(runtime: LLMRuntime, messages: List[Dict[str, str]]) -> str:
+    async with runtime.limiter:
+        for attempt in range(LLM_MAX_RETRIES + 1):
+            try:
+                resp = await runtime.client.chat.completions.create(model=CHAT_MODEL, messages=messages)
+                return resp.choices[0].message.content
+            except Exception as e:
+                if attempt == LLM_MAX_RETRIES or not is_retryable(e):
+                    raise
+                await asyncio.sleep(backoff_delay(attempt, e))
+
+
+async def _stream_completion(runtime: LLMRuntime, messages: List[Dict[str, str]], out: queue.Queue) -> None:
+    """Push deltas onto `out`, then None (or the exception) to mark the end."""
+    try:
+        async with runtime.limiter:
+            for attempt in range(LLM_MAX_RETRIES + 1):
+                started = False
+                try:
+                    stream = await runtime.client.chat.completions.create(
+                        model=CHAT_MODEL, messages=messages, stream=True
+                    )
+                    async with stream:  # closes the HTTP stream on cancel or error too
+                        async for chunk in stream:
+                            if chunk.choices and chunk.choices[0].delta.content:
+                                started = True
+                                out.put(chunk.choices[0].delta.content)
+                    break
+                except Exception as e:
+                    # Once tokens are on screen a retry would duplicate them.
+                    if started or attempt == LLM_MAX_RETRIES or not is_retryable(e):
+                        raise
+                    await asyncio.sleep(backoff_delay(attempt, e))
+        out.put(None)
+    except Exception as e:
+        out.put(e)
 
-    res = collection.query(
-        query_embeddings=[query_vec],
-        n_results=k,
-    )
 
-    docs = res.get("documents", [[]])[0]
-    metas = res.get("metadatas", [[]])[0]
-    ids = res.get("ids", [[]])[0]
+# ─────────────────────────────
+# Core RAG helpers
+# ─────────────────────────────
+
+def indexed_sources() -> List[str]:
+    """Document names recorded in the ingestion manifest (for scoping queries)."""
+    try:
+        manifest = json.loads(MANIFEST_PATH.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return []
+    return sorted(manifest.get("documents", {}))
+
+
+def format_chunk_label(chunk: Dict[str, Any]) -> str:
+    """Compact source/section/pages label for a retrieved chunk."""
+    parts = [chunk["source"]]
+    if chunk.get("section"):
+        parts.append(chunk["section"])
+    if chunk.get("pages"):
+        parts.append(f"p. {chunk['pages']}")
+    return " | ".join(parts)
+
+
+def daemon_call(call):
+    """call(client) against the policy daemon, or None when none is configured or it is unreachable."""
+    client = get_policy_client()
+    if client is None:
+        return None
+    try:
+        return call(client)
+    except PolicyAPIError as e:
+        if e.status is not None:
+            raise
+        st.toast(f"Policy daemon unavailable, using local models: {e}")
+        return None
+
+
+def embed_query(question: str) -> List[float]:
+    """
+    Query embedding via the in-memory LRU, then the daemon (if configured), then
+    the model. Ad-hoc questions stay out of the on-disk embedding cache, which
+    holds ingested chunks only and has no eviction.
+    """
+    lru = get_query_cache()
+    vector = lru.get(question)
+    if vector is None:
+        vector = daemon_call(lambda client: client.embed(question))
+        if vector is None:
+            _, embed_model = get_collection_and_model()
+            vector = embed_model.encode([question])[0].tolist()
+        lru.put(question, vector)
+    return vector
+
+
+def retrieve_context(
+    question: str,
+    k: int = ANSWER_K,
+    source: str | None = None,
+    question_vec: List[float] | None = None,
+) -> List[Dict[str, Any]]:
+    """
+    Hybrid retrieval: Chroma vector search fused with the BM25 index (RRF), so
+    paragraph/form-number queries match exactly, then a cross-encoder picks the
+    best k of a wider candidate pool. If `source` is given, the search is
+    scoped to that document. Pass `question_vec` when the question is already
+    embedded. Served by the policy daemon when one is configured.
+    """
+    hits = daemon_call(lambda client: client.retrieve(question, k, source))
+    if hits is None:
+        collection, _ = get_collection_and_model()
+        reranker = get_reranker()
+        hits = hybrid_query(
+            collection,
+            question,
+            question_vec if question_vec is not None else embed_query(question),
+            max(k, RERANK_POOL) if reranker else k,
+            bm25=get_bm25_index(index_stamp()),
+            source=source,
+        )
+        if reranker:
+            hits = reranker.rerank(question, hits, k)
 
     out: List[Dict[str, Any]] = []
-    for i, text in enumerate(docs):
-        meta = metas[i] if metas and i < len(metas) else {}
+    for hit in hits:
+        meta = hit["metadata"]
+        pages = meta.get("page_start")
+        if pages is not None and meta.get("page_end") not in (None, pages):
+            pages = f"{pages}-{meta['page_end']}"
         out.append(
             {
-                "id": ids[i] if ids and i < len(ids) else f"chunk_{i}",
-                "source": (meta or {}).get("source", "unknown"),
-                "text": text,
+                "id": hit["id"],
+                "source": meta.get("source", "unknown"),
+                "section": meta.get("section", ""),
+                "pages": pages,
+                "chunk_index": meta.get("chunk_index"),
+                "text": hit["text"],
             }
         )
     return out
@@ -124,23 +435,152 @@ def build_system_prompt(role_desc: str = "") -> str:
     return base
 
 
+def chat_messages(system_prompt: str, user_prompt: str) -> List[Dict[str, str]]:
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt},
+    ]
+
+
 def run_chat(system_prompt: str, user_prompt: str) -> str:
-    resp = client.chat.completions.create(
-        model=CHAT_MODEL,
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt},
-        ],
+    runtime = get_llm_runtime()
+    return runtime.run(_chat_completion(runtime, chat_messages(system_prompt, user_prompt)))
+
+
+def stream_chat(system_prompt: str, user_prompt: str) -> Iterator[str]:
+    """Like run_chat, but yields content deltas as the model produces them."""
+    runtime = get_llm_runtime()
+    out: queue.Queue = queue.Queue()
+    future = asyncio.run_coroutine_threadsafe(
+        _stream_completion(runtime, chat_messages(system_prompt, user_prompt), out),
+        runtime.loop,
     )
-    return resp.choices[0].message.content
+    try:
+        while (item := out.get()) is not None:
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        # A rerun or Stop abandons the generator; free the limiter slot and connection.
+        future.cancel()
+
+
+async def _gather_completions(
+    runtime: LLMRuntime, jobs: Dict[str, List[Dict[str, str]]], out: queue.Queue
+) -> None:
+    """Run every job concurrently, pushing (name, answer or exception) as each finishes, then None."""
+
+    async def run_one(name: str, messages: List[Dict[str, str]]) -> None:
+        try:
+            out.put((name, await _chat_completion(runtime, messages)))
+        except Exception as e:
+            out.put((name, e))
+
+    await asyncio.gather(*(run_one(name, messages) for name, messages in jobs.items()))
+    out.put(None)
+
+
+def run_chats_as_completed(jobs: Dict[str, tuple]) -> Iterator[tuple]:
+    """
+    Run several (system_prompt, user_prompt) chats at once on the LLM runtime,
+    yielding (name, answer) in completion order; a failed chat yields its exception.
+    """
+    runtime = get_llm_runtime()
+    out: queue.Queue = queue.Queue()
+    future = asyncio.run_coroutine_threadsafe(
+        _gather_completions(
+            runtime, {name: chat_messages(*prompts) for name, prompts in jobs.items()}, out
+        ),
+        runtime.loop,
+    )
+    try:
+        while (item := out.get()) is not None:
+            yield item
+    finally:
+        future.cancel()  # stops chats still running if the caller stops iterating
+
+
+def retrieval_summary(ctx_chunks: List[Dict[str, Any]]) -> str:
+    """One-line progress label for a retrieval step."""
+    sources = sorted({c["source"] for c in ctx_chunks})
+    return f"Retrieved {len(ctx_chunks)} passage(s) from {', '.join(sources) or 'no documents'}"
+
+
+def cache_when_done(deltas: Iterator[str], on_done) -> Iterator[str]:
+    """Pass a delta stream through, calling on_done(full_text) once it completes."""
+    parts: List[str] = []
+    for delta in deltas:
+        parts.append(delta)
+        yield delta
+    on_done("".join(parts))
+
+
+def build_context_block(query: str, ctx_chunks: List[Dict[str, Any]]):
+    """Pack retrieved chunks into CONTEXT_TOKEN_BUDGET; returns (block, packed chunks, stats)."""
+    packed, stats = pack_context(
+        query,
+        ctx_chunks,
+        CONTEXT_TOKEN_BUDGET,
+        CHAT_MODEL,
+        label=lambda c: f"[{format_chunk_label(c)}] ",
+        max_chunk_tokens=MAX_CHUNK_TOKENS,
+    )
+    block = "\n\n".join(f"[{format_chunk_label(c)}] {c['text']}" for c in packed)
+    return block, packed, stats
+
+
+def prompt_usage(system_prompt: str, user_prompt: str, stats: Dict[str, int], **extra: int) -> Dict[str, int]:
+    """Per-request token accounting shown under each answer."""
+    return {
+        "prompt_tokens": count_tokens(system_prompt, CHAT_MODEL) + count_tokens(user_prompt, CHAT_MODEL),
+        "context_tokens": stats["context_tokens"],
+        "chunks_used": stats["chunks_used"],
+        "chunks_in": stats["chunks_in"],
+        **extra,
+    }
+
+
+def usage_caption(usage: Dict[str, int] | None) -> str:
+    if not usage:
+        return ""
+    text = (
+        f"Prompt ≈ {usage['prompt_tokens']:,} tokens · policy context {usage['context_tokens']:,} tokens "
+        f"from {usage['chunks_used']}/{usage['chunks_in']} chunks"
+    )
+    if "document_tokens" in usage:
+        text += f" · document {usage['document_tokens']:,} tokens"
+    return text
+
+
+def show_answer(answer) -> str:
+    """Render a plain or streamed answer; returns the full text."""
+    if isinstance(answer, str):
+        st.markdown(answer)
+        return answer
+    return st.write_stream(answer)
 
 
 # ─────────────────────────────
 # High-level behaviors
 # ─────────────────────────────
 
-def answer_with_policies(question: str, role: str = "") -> Dict[str, Any]:
-    ctx_chunks = retrieve_context(question, k=8)
+def answer_with_policies(
+    question: str, role: str = "", source: str | None = None, stream: bool = False
+) -> Dict[str, Any]:
+    """
+    With stream=True, "answer" is an iterator of text deltas (see show_answer).
+    Near-duplicates of earlier questions (same role, scope and index version)
+    are answered from the semantic cache; "cached" then holds the similarity.
+    """
+    answer_cache = get_answer_cache()
+    version = index_version(MANIFEST_PATH)
+    cache_scope = f"role={normalize_question(role)}|source={source or ''}"
+    question_vec = embed_query(normalize_question(question))
+    hit = answer_cache.lookup(question_vec, cache_scope, version)
+    if hit:
+        return {"answer": hit["answer"], "context": hit["context"], "cached": hit["similarity"]}
+
+    ctx_chunks = retrieve_context(question, source=source, question_vec=question_vec)
     if not ctx_chunks:
         return {
             "answer": (
@@ -150,9 +590,7 @@ def answer_with_policies(question: str, role: str = "") -> Dict[str, Any]:
             "context": [],
         }
 
-    context_block = "\n\n".join(
-        [f"[{c['source']}] {c['text']}" for c in ctx_chunks]
-    )
+    context_block, ctx_chunks, pack_stats = build_context_block(question, ctx_chunks)
 
     system_prompt = build_system_prompt(role)
     user_prompt = (
@@ -165,27 +603,35 @@ def answer_with_policies(question: str, role: str = "") -> Dict[str, Any]:
         "Cite documents like [Source: AFCWI 36-3501] or [Source: DAFI 36-2903]."
     )
 
-    answer = run_chat(system_prompt, user_prompt)
-    return {"answer": answer, "context": ctx_chunks}
+    def remember(text: str) -> None:
+        answer_cache.put(question_vec, cache_scope, version, question, text, ctx_chunks)
 
+    if stream:
+        answer = cache_when_done(stream_chat(system_prompt, user_prompt), remember)
+    else:
+        answer = run_chat(system_prompt, user_prompt)
+        remember(answer)
+    return {
+        "answer": answer,
+        "context": ctx_chunks,
+        "usage": prompt_usage(system_prompt, user_prompt, pack_stats),
+    }
 
-def analyze_uploaded_doc(text: str, mode: str) -> Dict[str, Any]:
-    ctx_chunks = retrieve_context(
-        "overall cadet standards, duties, and dress & appearance", k=12
-    )
-    context_block = "\n\n".join(
-        [f"[{c['source']}] {c['text']}" for c in ctx_chunks]
-    )
 
-    base_sys = build_system_prompt()
-    truncated = text[:8000]
+@st.cache_data(show_spinner=False)
+def analysis_context(stamp: float) -> List[Dict[str, Any]]:
+    """Top-k chunks for ANALYSIS_QUERY, computed once per index build (`stamp`)."""
+    return retrieve_context(ANALYSIS_QUERY, k=ANALYSIS_K)
+
 
+def analysis_prompt(mode: str, document: str, context_block: str) -> str:
+    """User prompt for one document analysis mode."""
     if mode == "Compliance Review":
-        user = (
+        return (
             "You are reviewing a proposed event/training/document for compliance with USAFA policy.\n\n"
             "User document:\n"
             "```text\n"
-            f"{truncated}\n"
+            f"{document}\n"
             "```\n\n"
             "Policy context:\n"
             "-----------------\n"
@@ -196,12 +642,12 @@ def analyze_uploaded_doc(text: str, mode: str) -> Dict[str, Any]:
             "2. Cite specific policy sources from the context.\n"
             "3. Suggest concrete fixes.\n"
         )
-    elif mode == "Key Findings":
-        user = (
+    if mode == "Key Findings":
+        return (
             "Extract key actionable findings from the user's document.\n\n"
             "Document:\n"
             "```text\n"
-            f"{truncated}\n"
+            f"{document}\n"
             "```\n\n"
             "Policy context (for understanding roles/expectations):\n"
             "-----------------\n"
@@ -214,12 +660,12 @@ def analyze_uploaded_doc(text: str, mode: str) -> Dict[str, Any]:
             "- Hazards / safety concerns\n"
             "- Required approvals/authorities\n"
         )
-    elif mode == "Style Check":
-        user = (
+    if mode == "Style Check":
+        return (
             "You are a style and consistency checker for USAFA documents.\n\n"
             "Document:\n"
             "```text\n"
-            f"{truncated}\n"
+            f"{document}\n"
             "```\n\n"
             "Policy context (for terminology and examples):\n"
             "-----------------\n"
@@ -230,12 +676,12 @@ def analyze_uploaded_doc(text: str, mode: str) -> Dict[str, Any]:
             "2. Group into categories: Terminology & Rank, Uniform Naming & Caps, Structure, Clarity & Tone.\n"
             "3. Suggest specific improvements.\n"
         )
-    elif mode == "Regulation Format":
-        user = (
+    if mode == "Regulation Format":
+        return (
             "Rewrite the user's content into a formal USAFA/Air Force-style memorandum.\n\n"
             "Original content:\n"
             "```text\n"
-            f"{truncated}\n"
+            f"{document}\n"
             "```\n\n"
             "Use policy context only for terminology; do NOT invent new policy.\n"
             "Policy context:\n"
@@ -248,11 +694,42 @@ def analyze_uploaded_doc(text: str, mode: str) -> Dict[str, Any]:
             "- Structured body paragraphs\n"
             "- Signature block placeholder\n"
         )
-    else:
-        user = f"Document:\n```text\n{truncated}\n```\n\nGive a short summary."
+    return f"Document:\n```text\n{document}\n```\n\nGive a short summary."
+
+
+def analyze_uploaded_doc(text: str, mode: str, stream: bool = False) -> Dict[str, Any]:
+    ctx_chunks = analysis_context(index_stamp())
+    context_block, ctx_chunks, pack_stats = build_context_block(ANALYSIS_QUERY, ctx_chunks)
+
+    base_sys = build_system_prompt()
+    truncated = truncate_to_tokens(text, DOC_TOKEN_BUDGET, CHAT_MODEL)
+    user = analysis_prompt(mode, truncated, context_block)
+
+    answer = stream_chat(base_sys, user) if stream else run_chat(base_sys, user)
+    usage = prompt_usage(
+        base_sys, user, pack_stats, document_tokens=count_tokens(truncated, CHAT_MODEL)
+    )
+    return {"answer": answer, "context": ctx_chunks, "usage": usage}
+
 
-    answer = run_chat(base_sys, user)
-    return {"answer": answer, "context": ctx_chunks}
+def analyze_all_modes(text: str) -> Dict[str, Any]:
+    """
+    Every mode in ANALYZE_ALL_MODES over one shared policy context, run
+    concurrently. "results" yields (mode, answer or exception) as each
+    finishes; "usage" maps each mode to its token accounting.
+    """
+    ctx_chunks = analysis_context(index_stamp())
+    context_block, ctx_chunks, pack_stats = build_context_block(ANALYSIS_QUERY, ctx_chunks)
+
+    base_sys = build_system_prompt()
+    truncated = truncate_to_tokens(text, DOC_TOKEN_BUDGET, CHAT_MODEL)
+    document_tokens = count_tokens(truncated, CHAT_MODEL)
+    jobs = {mode: (base_sys, analysis_prompt(mode, truncated, context_block)) for mode in ANALYZE_ALL_MODES}
+    usage = {
+        mode: prompt_usage(*prompts, pack_stats, document_tokens=document_tokens)
+        for mode, prompts in jobs.items()
+    }
+    return {"results": run_chats_as_completed(jobs), "context": ctx_chunks, "usage": usage}
 
 
 # ─────────────────────────────
@@ -277,12 +754,22 @@ def main():
             "- Answers questions over standards / duties / dress & appearance\n"
             "- Can review or reformat your documents\n"
         )
-        collection, _ = get_collection_and_model()
+        loader = get_model_loader() if not POLICY_API_URL else None
+        if loader is None:
+            st.caption(f"🟢 Retrieval served by policy daemon at `{POLICY_API_URL}`")
+        elif loader.warm:
+            st.caption(f"🟢 Backends warm (model loaded in {loader.load_seconds:.1f}s)")
+        elif loader.error is not None:
+            st.caption(f"🔴 Embedding model failed to load: {loader.error}")
+        else:
+            st.caption("🟡 Backends cold: embedding model still loading…")
         try:
-            count = collection.count()
+            count = get_policy_collection(index_stamp()).count()
             st.caption(f"Indexed chunks: **{count}**")
         except Exception:
             st.caption("Indexed chunks: (unknown)")
+        if LLM_BACKEND == "fake":
+            st.caption("🧪 Offline fake LLM (POLICY_LLM=fake): answers are synthetic.")
 
         st.markdown("---")
         st.caption(
@@ -292,6 +779,11 @@ def main():
 
     st.title("USAFA Policy Assistant")
 
+    # Warm the fixed analysis retrieval so document reviews skip encode + query
+    # (waits for the model on a cold start; instant afterwards).
+    with st.spinner("Warming up policy retrieval…"):
+        analysis_context(index_stamp())
+
     tabs = st.tabs(["💬 Ask the Agent", "📄 Analyze a Document"])
 
     # ── Tab 1: Q&A ──
@@ -311,21 +803,37 @@ def main():
                 placeholder="e.g., C4C, SQ/CC, First Sergeant",
             )
 
+        sources = indexed_sources()
+        scope = st.selectbox(
+            "Limit to document",
+            ["All documents"] + sources,
+            help="Scopes retrieval to a single policy document.",
+        )
+        source_filter = None if scope == "All documents" else scope
+
         show_context = st.checkbox("Show retrieved context", value=False)
 
         if st.button("Ask", type="primary"):
             if not question.strip():
                 st.warning("Please enter a question.")
             else:
-                with st.spinner("Thinking with policy context…"):
-                    result = answer_with_policies(question.strip(), role.strip())
+                with st.status("Searching policy context…") as status:
+                    result = answer_with_policies(
+                        question.strip(), role.strip(), source_filter, stream=True
+                    )
+                    label = retrieval_summary(result["context"])
+                    if result.get("cached"):
+                        label = f"Answered from cache (similarity {result['cached']:.2f}) · {label}"
+                    status.update(label=label, state="complete")
                 st.markdown("### Answer")
-                st.markdown(result["answer"])
+                show_answer(result["answer"])
+                if result.get("usage"):
+                    st.caption(usage_caption(result["usage"]))
 
                 if show_context:
                     with st.expander("View retrieved context"):
                         for c in result["context"]:
-                            st.markdown(f"**Source:** `{c['source']}`")
+                            st.markdown(f"**Source:** `{format_chunk_label(c)}`")
                             st.write(c["text"])
                             st.markdown("---")
 
@@ -347,7 +855,9 @@ def main():
                     "Key Findings",
                     "Style Check",
                     "Regulation Format",
+                    "All Analyses",
                 ],
+                help="All Analyses runs " + ", ".join(ANALYZE_ALL_MODES) + " at the same time.",
             )
 
         show_context_doc = st.checkbox(
@@ -363,16 +873,32 @@ def main():
                 if not raw.strip():
                     st.warning("Uploaded document is empty.")
                 else:
-                    with st.spinner(f"Running {mode}…"):
-                        result = analyze_uploaded_doc(raw, mode)
-
-                    st.markdown(f"### {mode} Result")
-                    st.markdown(result["answer"])
+                    if mode == "All Analyses":
+                        with st.status(f"Running {', '.join(ANALYZE_ALL_MODES)}…") as status:
+                            result = analyze_all_modes(raw)
+                            status.update(label=retrieval_summary(result["context"]), state="complete")
+
+                        # Rendered in completion order, each as soon as it is ready.
+                        for done_mode, answer in result["results"]:
+                            st.markdown(f"### {done_mode} Result")
+                            if isinstance(answer, Exception):
+                                st.error(f"{done_mode} failed: {answer}")
+                                continue
+                            show_answer(answer)
+                            st.caption(usage_caption(result["usage"][done_mode]))
+                    else:
+                        with st.status(f"Running {mode}…") as status:
+                            result = analyze_uploaded_doc(raw, mode, stream=True)
+                            status.update(label=retrieval_summary(result["context"]), state="complete")
+
+                        st.markdown(f"### {mode} Result")
+                        show_answer(result["answer"])
+                        st.caption(usage_caption(result["usage"]))
 
                     if show_context_doc:
                         with st.expander("View retrieved context"):
                             for c in result["context"]:
-                                st.markdown(f"**Source:** `{c['source']}`")
+                                st.markdown(f"**Source:** `{format_chunk_label(c)}`")
                                 st.write(c["text"])
                                 st.markdown("---")
 
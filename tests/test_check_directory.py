@@ -0,0 +1,97 @@
+import asyncio
+import json
+from pathlib import Path
+
+import pytest
+
+import final_project
+from final_project import CHECK_REPORT_DIRNAME, CHECK_SUMMARY_NAME, check_directory, compliance_verdict, report_path_for
+
+
+@pytest.fixture
+def reviews(monkeypatch):
+    """Compliance review stub: verdict from the document's first word; 'crash' raises. Records reviewed names."""
+    reviewed: list[str] = []
+
+    async def tool_compliance_review(agent, text, name):
+        reviewed.append(name)
+        if text.startswith("crash"):
+            raise RuntimeError("model unavailable")
+        verdict = "NON-COMPLIANT" if text.startswith("late") else "COMPLIANT"
+        return f"Findings for {name}.\n\n**Verdict:** {verdict}"
+
+    monkeypatch.setattr(final_project, "tool_compliance_review", tool_compliance_review)
+    monkeypatch.setattr(final_project, "fork_agent", lambda agent: agent)
+    return reviewed
+
+
+def run(doc_dir: Path) -> list[dict]:
+    return asyncio.run(check_directory(agent=None, doc_dir=doc_dir, concurrency=2))
+
+
+def summary_lines(doc_dir: Path) -> list[dict]:
+    path = doc_dir / CHECK_REPORT_DIRNAME / CHECK_SUMMARY_NAME
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+
+@pytest.mark.parametrize(
+    "report, verdict",
+    [
+        ("...\nVerdict: COMPLIANT", "COMPLIANT"),
+        ("...\n**Verdict:** Non-Compliant.", "NON-COMPLIANT"),
+        ("...\n> _Verdict_: NONCOMPLIANT", "NON-COMPLIANT"),
+        ("The verdict: compliant overall, mostly.", "UNKNOWN"),
+        ("No verdict line at all.", "UNKNOWN"),
+    ],
+)
+def test_compliance_verdict(report, verdict):
+    assert compliance_verdict(report) == verdict
+
+
+def test_report_path_is_named_by_stem_and_content_hash(tmp_path):
+    path = report_path_for(tmp_path, Path("docs/Event Plan.v2.pdf"), "0123456789abcdef" * 4)
+    assert path == tmp_path / "Event Plan.v2.0123456789ab.md"
+
+
+def test_reviews_each_document_once_and_skips_on_rerun(tmp_path, reviews):
+    (tmp_path / "mfr.md").write_text("late formation report", encoding="utf-8")
+    (tmp_path / "plan.txt").write_text("event plan", encoding="utf-8")
+    (tmp_path / "notes.docx").write_text("not a review format", encoding="utf-8")
+
+    first = {r["file"]: r for r in run(tmp_path)}
+    assert sorted(reviews) == ["mfr.md", "plan.txt"]
+    assert first["mfr.md"]["verdict"] == "NON-COMPLIANT"
+    assert first["plan.txt"]["verdict"] == "COMPLIANT"
+    report = Path(first["plan.txt"]["report"])
+    assert report.name == f"plan.{first['plan.txt']['sha256'][:12]}.md"
+    assert report.read_text(encoding="utf-8").startswith("# Compliance review: plan.txt")
+
+    second = run(tmp_path)
+    assert sorted(reviews) == ["mfr.md", "plan.txt"]
+    assert {r["status"] for r in second} == {"skipped"}
+    assert len(summary_lines(tmp_path)) == 2  # skips are not logged again
+
+
+def test_edited_document_is_reviewed_again(tmp_path, reviews):
+    doc = tmp_path / "plan.txt"
+    doc.write_text("event plan", encoding="utf-8")
+    run(tmp_path)
+    doc.write_text("late event plan", encoding="utf-8")
+    (record,) = run(tmp_path)
+    assert reviews == ["plan.txt", "plan.txt"]
+    assert record["status"] == "reviewed" and record["verdict"] == "NON-COMPLIANT"
+    assert len(list((tmp_path / CHECK_REPORT_DIRNAME).glob("plan.*.md"))) == 2
+
+
+def test_failures_are_recorded_and_retried(tmp_path, reviews):
+    (tmp_path / "blank.txt").write_text("   ", encoding="utf-8")
+    (tmp_path / "crash.md").write_text("crash please", encoding="utf-8")
+    records = {r["file"]: r for r in run(tmp_path)}
+    assert records["blank.txt"]["status"] == "error"
+    assert records["blank.txt"]["error"] == "no extractable text"
+    assert records["crash.md"]["error"] == "model unavailable"
+    assert not list((tmp_path / CHECK_REPORT_DIRNAME).glob("*.md"))
+
+    run(tmp_path)
+    assert reviews == ["crash.md", "crash.md"]  # blank files never reach the model
+    assert [line["status"] for line in summary_lines(tmp_path)] == ["error"] * 4
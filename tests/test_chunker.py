@@ -0,0 +1,94 @@
+import pytest
+
+from final_project import MIN_CHUNK_TOKENS, approx_tokens, chunk_by_sections, detect_heading, section_range
+
+
+@pytest.mark.parametrize(
+    "line, expected",
+    [
+        ("Chapter 2 – PROFESSIONAL STANDARDS", (0, "Chapter 2 PROFESSIONAL STANDARDS")),
+        ("## Uniform Wear", (1, "Uniform Wear")),
+        ("2.1. Customs and Courtesies. All CS34 cadets are expected", (2, "2.1 Customs and Courtesies")),
+        ("3.5.1.C4Cs will sign out", (3, "3.5.1 C4Cs will sign out")),
+        ("IV. Other Notable Changes ", (1, "IV. Other Notable Changes")),
+        ("B. Headgear", (2, "B. Headgear")),
+        ("SUBJECT: Discipline and Reward Policy", (1, "SUBJECT")),
+    ],
+)
+def test_detect_heading(line, expected):
+    assert detect_heading(line) == expected
+
+
+@pytest.mark.parametrize(
+    "line",
+    [
+        "2.1. Customs and Courtesies\t5",  # table of contents
+        "Chapter 7 – OPERATIONS\t14",
+        "4.3 Chain of Command........ 12",
+        "I. am a sentence that happens to start with a letter. It goes on.",
+        "Cadets will report to the CQ.",
+        "",
+    ],
+)
+def test_non_headings(line):
+    assert detect_heading(line) is None
+
+
+def test_mfr_blocks_only_count_in_the_preamble():
+    assert detect_heading("REFERENCES: AFCWI 36-3501", in_preamble=True) == (1, "REFERENCES")
+    assert detect_heading("REFERENCES: AFCWI 36-3501", in_preamble=False) is None
+
+
+def test_section_range():
+    chapter = "Chapter 1 PURPOSE AND GUIDANCE"
+    assert section_range(chapter, "") == chapter
+    assert section_range(chapter, chapter) == chapter
+    assert section_range(chapter, f"{chapter} > 1.1 Intent") == f"{chapter} – 1.1 Intent"
+    assert section_range(f"{chapter} > 1.1 Intent", f"{chapter} > 1.2 Scope") == f"{chapter} > 1.1 Intent – 1.2 Scope"
+    assert section_range("", f"{chapter} > 1.1 Intent") == f"{chapter} > 1.1 Intent"
+
+
+def paragraph(label: str, words: int = 60) -> str:
+    return f"{label} " + " ".join(["standard"] * words) + "."
+
+
+HANDBOOK = "\n".join(
+    [
+        "Table of Contents",
+        "Chapter 1 – PURPOSE\t1",
+        "1.1. Intent\t1",
+        "References\t9",
+        "Chapter 1 – PURPOSE",
+        paragraph("1.1. Intent. These instructions", 20),
+        paragraph("1.2. Scope. They apply", 20),
+        "Chapter 2 – STANDARDS",
+        paragraph("2.1. Customs. Cadets render", 20),
+    ]
+)
+
+
+def test_sections_pack_within_a_chapter_and_toc_lines_are_not_headings():
+    chunks = chunk_by_sections(HANDBOOK, max_tokens=200)
+    assert [c["section_path"] for c in chunks] == [
+        "Chapter 1 PURPOSE – 1.2 Scope",
+        "Chapter 2 STANDARDS – 2.1 Customs",
+    ]
+    assert chunks[0]["text"].startswith("Table of Contents")  # TOC residue joins its neighbour
+    assert all(approx_tokens(c["text"]) >= MIN_CHUNK_TOKENS for c in chunks)
+    assert chunks[0]["page_start"] is None
+
+
+def test_oversized_sections_are_split_and_pages_tracked():
+    text = "\f".join(
+        [
+            "Chapter 1 – PURPOSE\n" + paragraph("1.1. Intent. These instructions", 200),
+            paragraph("1.2. Scope. They apply"),
+            paragraph("1.3. Waivers. Commanders may"),
+        ]
+    )
+    chunks = chunk_by_sections(text, max_tokens=120)
+    assert len(chunks) > 2
+    assert chunks[0]["page_start"] == chunks[0]["page_end"] == 1
+    assert chunks[-1]["page_end"] == 3
+    assert chunks[-1]["section_path"].endswith("1.3 Waivers")
+    assert all(approx_tokens(c["text"]) <= 120 + MIN_CHUNK_TOKENS for c in chunks)  # fragments merge back
@@ -0,0 +1,43 @@
+import json
+
+import pytest
+
+from final_project import FinalAnswerStream
+
+
+def stream(reply: str, step: int) -> tuple[list[str], FinalAnswerStream]:
+    """Feed `reply` in `step`-character deltas; return what was emitted."""
+    pieces: list[str] = []
+    parser = FinalAnswerStream(pieces.append)
+    for start in range(0, len(reply), step):
+        parser.feed(reply[start:start + step])
+    return pieces, parser
+
+
+def react_reply(tool_name: str, tool_input: str) -> str:
+    return json.dumps({"thought": "done", "action": {"tool_name": tool_name, "tool_input": tool_input}})
+
+
+@pytest.mark.parametrize("step", [1, 2, 3, 7, 1000])
+def test_emits_decoded_final_answer_for_any_chunking(step):
+    answer = 'Wear "service dress".\nSee para 4.7 \\ AFCWI 36-3501 — ✓'
+    pieces, parser = stream(react_reply("final_answer", answer), step)
+    assert "".join(pieces) == answer
+    assert parser.done and parser.emitted
+
+
+def test_other_tools_emit_nothing():
+    pieces, parser = stream(react_reply("course_knowledge_query", "hair standards"), 4)
+    assert pieces == []
+    assert not parser.emitted
+
+
+def test_keeps_full_reply_in_buffer():
+    reply = react_reply("final_answer", "Yes.")
+    _, parser = stream(reply, 5)
+    assert parser.buffer == reply
+
+
+def test_ignores_text_after_the_closing_quote():
+    pieces, _ = stream('{"action": {"tool_name": "final_answer", "tool_input": "ok"}} trailing "x"', 3)
+    assert "".join(pieces) == "ok"
@@ -0,0 +1,95 @@
+import asyncio
+import json
+
+import pytest
+
+import final_project
+from final_project import INGEST_VERSION, load_index_manifest, sync_policy_index
+
+chromadb = pytest.importorskip("chromadb")
+
+MFR = "Chapter 1 – DISCIPLINE\n1.1. Tardiness. " + "Late cadets receive a Form 10 from their element leader. " * 8
+SPINS = "Chapter 2 – DORMS\n2.1. Storage. " + "Storage rooms are inspected every Friday by the CCQ. " * 8
+
+
+@pytest.fixture
+def corpus(tmp_path, monkeypatch):
+    """Two policy files, an index under tmp_path, and extraction/embedding that record what they were asked for."""
+    mfr, spins = tmp_path / "mfr.md", tmp_path / "spins.md"
+    mfr.write_text(MFR, encoding="utf-8")
+    spins.write_text(SPINS, encoding="utf-8")
+    extracted: list[list[str]] = []
+
+    async def extract_policy_documents(paths, workers=None):
+        extracted.append(sorted(path.name for path in paths))
+        return {path.name: path.read_text(encoding="utf-8") for path in paths}
+
+    monkeypatch.setattr(final_project, "POLICY_DOC_PATHS", [mfr, spins])
+    monkeypatch.setattr(final_project, "MANIFEST_PATH", tmp_path / "manifest.json")
+    monkeypatch.setattr(final_project, "BM25_PATH", tmp_path / "bm25.json")
+    monkeypatch.setattr(final_project, "EMBED_CACHE_DIR", tmp_path / "embedding_cache")
+    monkeypatch.setattr(final_project, "extract_policy_documents", extract_policy_documents)
+    monkeypatch.setattr(final_project, "embed_texts", lambda embedder, texts, *args: [[1.0, 0.0, 0.5]] * len(texts))
+    client = chromadb.PersistentClient(path=str(tmp_path / "chroma"))
+    return client, mfr, spins, extracted
+
+
+def sync(client) -> int:
+    return asyncio.run(sync_policy_index(client, embedder=None))
+
+
+def collection_sources(client) -> set[str]:
+    data = client.get_collection(final_project.COLLECTION_NAME).get(include=["metadatas"])
+    return {meta["source"] for meta in data["metadatas"]}
+
+
+def test_unchanged_documents_are_skipped(corpus):
+    client, _, _, extracted = corpus
+    count = sync(client)
+    assert count > 0
+    assert sync(client) == count
+    assert extracted == [["mfr.md", "spins.md"], []]
+    manifest = load_index_manifest()
+    assert set(manifest["documents"]) == {"mfr.md", "spins.md"}
+    assert sum(len(entry["chunk_ids"]) for entry in manifest["documents"].values()) == count
+
+
+def test_changed_document_replaces_its_chunks(corpus):
+    client, mfr, _, extracted = corpus
+    sync(client)
+    old_ids = set(load_index_manifest()["documents"]["mfr.md"]["chunk_ids"])
+    mfr.write_text(MFR + "\n1.2. Absences. Unexcused absences go to the flight commander.", encoding="utf-8")
+    sync(client)
+    assert extracted[-1] == ["mfr.md"]
+    new_ids = set(load_index_manifest()["documents"]["mfr.md"]["chunk_ids"])
+    stored = set(client.get_collection(final_project.COLLECTION_NAME).get()["ids"])
+    assert old_ids.isdisjoint(new_ids)
+    assert new_ids <= stored and not old_ids & stored
+
+
+def test_removed_document_is_purged(corpus, monkeypatch):
+    client, mfr, spins, _ = corpus
+    sync(client)
+    monkeypatch.setattr(final_project, "POLICY_DOC_PATHS", [mfr])
+    count = sync(client)
+    assert collection_sources(client) == {"mfr.md"}
+    assert set(load_index_manifest()["documents"]) == {"mfr.md"}
+    assert count == len(load_index_manifest()["documents"]["mfr.md"]["chunk_ids"])
+    bm25 = final_project.BM25_PATH.read_text(encoding="utf-8")
+    assert "mfr.md" in bm25 and "spins.md" not in bm25
+
+
+def test_new_ingest_version_rebuilds_everything(corpus):
+    client, _, _, extracted = corpus
+    sync(client)
+    manifest = json.loads(final_project.MANIFEST_PATH.read_text(encoding="utf-8"))
+    manifest["ingest_version"] = INGEST_VERSION - 1
+    final_project.MANIFEST_PATH.write_text(json.dumps(manifest), encoding="utf-8")
+    sync(client)
+    assert extracted[-1] == ["mfr.md", "spins.md"]
+    assert load_index_manifest()["ingest_version"] == INGEST_VERSION
+
+
+def test_unreadable_manifest_loads_empty(corpus):
+    final_project.MANIFEST_PATH.write_text("{not json", encoding="utf-8")
+    assert load_index_manifest()["documents"] == {}
@@ -0,0 +1,61 @@
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+
+import pytest
+
+import final_project
+from final_project import evict_ocr_cache, iter_ocr_pages
+
+
+@pytest.fixture
+def fake_ocr(tmp_path, monkeypatch):
+    """OCR cache under tmp_path; 'OCR' returns the page number as text and records each call."""
+    calls: list[int] = []
+
+    def ocr_pdf_page(path: str, page_no: int) -> str:
+        calls.append(page_no)
+        return f"page {page_no} text"
+
+    monkeypatch.setattr(final_project, "OCR_CACHE_PATH", tmp_path / "ocr_cache.sqlite3")
+    monkeypatch.setattr(final_project, "OCR_CACHE_BATCH_PAGES", 2)
+    monkeypatch.setattr(final_project, "ocr_pdf_page", ocr_pdf_page)
+    monkeypatch.setattr(final_project, "tesseract_version", lambda: "5.3.0")
+    monkeypatch.setattr(final_project, "file_sha256", lambda path: "pdf-sha")
+    return calls
+
+
+def cached_pages() -> list[int]:
+    with closing(sqlite3.connect(final_project.OCR_CACHE_PATH)) as conn:
+        return [row[0] for row in conn.execute("SELECT page FROM ocr_pages ORDER BY page")]
+
+
+def test_second_pass_is_served_from_cache(fake_ocr):
+    first = list(iter_ocr_pages(Path("scan.pdf"), pages=[1, 2, 3]))
+    second = list(iter_ocr_pages(Path("scan.pdf"), pages=[1, 2, 3]))
+    assert first == second == [(1, "page 1 text"), (2, "page 2 text"), (3, "page 3 text")]
+    assert fake_ocr == [1, 2, 3]
+    assert cached_pages() == [1, 2, 3]
+
+
+def test_only_missing_pages_are_ocrd(fake_ocr):
+    list(iter_ocr_pages(Path("scan.pdf"), pages=[2]))
+    assert dict(iter_ocr_pages(Path("scan.pdf"), pages=[1, 2, 3])) == {
+        1: "page 1 text", 2: "page 2 text", 3: "page 3 text",
+    }
+    assert fake_ocr == [2, 1, 3]
+
+
+def test_pages_finished_before_an_early_stop_are_kept(fake_ocr):
+    pages = iter_ocr_pages(Path("scan.pdf"), pages=[1, 2, 3, 4, 5], max_workers=1)
+    next(pages)
+    pages.close()
+    assert 1 in cached_pages()
+
+
+def test_eviction_drops_least_recently_used_pages(tmp_path):
+    with closing(sqlite3.connect(tmp_path / "ocr.sqlite3")) as conn:
+        conn.execute("CREATE TABLE ocr_pages (page INTEGER, size INTEGER, last_used REAL)")
+        conn.executemany("INSERT INTO ocr_pages VALUES (?, ?, ?)", [(1, 100, 3.0), (2, 100, 1.0), (3, 100, 2.0)])
+        evict_ocr_cache(conn, 150)
+        assert [row[0] for row in conn.execute("SELECT page FROM ocr_pages")] == [1]
@@ -0,0 +1,113 @@
+import pytest
+
+import policy_cache
+from policy_cache import AnswerCache, EmbeddingCache
+
+V1 = "v1"
+
+
+def test_hit_at_or_above_threshold_only():
+    cache = AnswerCache(threshold=0.95)
+    cache.put([1.0, 0.0], "role=c4c", V1, "Can I wear civvies?", "Yes, off base.")
+    hit = cache.lookup([1.0, 0.1], "role=c4c", V1)  # cosine ~0.995
+    assert hit["answer"] == "Yes, off base."
+    assert hit["similarity"] == pytest.approx(0.995, abs=1e-3)
+    assert "vector" not in hit
+    assert cache.lookup([1.0, 0.5], "role=c4c", V1) is None  # cosine ~0.894
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_vectors_are_normalized():
+    cache = AnswerCache()
+    cache.put([10.0, 0.0], "s", V1, "q", "a")
+    assert cache.lookup([0.5, 0.0], "s", V1)["similarity"] == pytest.approx(1.0)
+
+
+def test_scope_must_match():
+    cache = AnswerCache()
+    cache.put([1.0, 0.0], "role=c4c|source=", V1, "q", "a")
+    assert cache.lookup([1.0, 0.0], "role=c1c|source=", V1) is None
+    assert cache.lookup([1.0, 0.0], "role=c4c|source=AFCWI.pdf", V1) is None
+
+
+def test_new_index_version_drops_everything():
+    cache = AnswerCache()
+    cache.put([1.0, 0.0], "s", V1, "q", "a")
+    assert cache.lookup([1.0, 0.0], "s", "v2") is None
+    assert len(cache) == 0
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(policy_cache.time, "time", lambda: now[0])
+    cache = AnswerCache(ttl_seconds=60)
+    cache.put([1.0, 0.0], "s", V1, "q", "a")
+    now[0] += 59
+    assert cache.lookup([1.0, 0.0], "s", V1) is not None
+    now[0] += 2
+    assert cache.lookup([1.0, 0.0], "s", V1) is None
+
+
+def test_lru_eviction_keeps_recently_hit_entries():
+    cache = AnswerCache(maxsize=2)
+    cache.put([1.0, 0.0, 0.0], "s", V1, "a", "A")
+    cache.put([0.0, 1.0, 0.0], "s", V1, "b", "B")
+    assert cache.lookup([1.0, 0.0, 0.0], "s", V1)["answer"] == "A"  # refreshes "a"
+    cache.put([0.0, 0.0, 1.0], "s", V1, "c", "C")
+    assert cache.lookup([0.0, 1.0, 0.0], "s", V1) is None
+    assert cache.lookup([1.0, 0.0, 0.0], "s", V1)["answer"] == "A"
+
+
+def test_best_match_wins():
+    cache = AnswerCache(threshold=0.9)
+    cache.put([1.0, 0.3], "s", V1, "near", "near answer")
+    cache.put([1.0, 0.05], "s", V1, "nearest", "nearest answer")
+    assert cache.lookup([1.0, 0.0], "s", V1)["answer"] == "nearest answer"
+
+
+def test_embedding_cache_round_trip(tmp_path):
+    cache = EmbeddingCache(tmp_path, "sentence-transformers/all-MiniLM-L6-v2")
+    assert cache.get_many(["hair standards"]) == [None]
+    cache.put_many(["hair standards", "earrings"], [[0.1, 0.2, 0.3], [1.0, -1.0, 0.5]])
+    got = cache.get_many(["earrings", "unknown", "hair standards"])
+    assert got[1] is None
+    assert got[0] == pytest.approx([1.0, -1.0, 0.5])
+    assert got[2] == pytest.approx([0.1, 0.2, 0.3])
+    assert cache.dir.name == "sentence-transformers__all-MiniLM-L6-v2"
+
+
+def test_embedding_cache_encodes_only_missing_distinct_texts(tmp_path):
+    cache = EmbeddingCache(tmp_path, "m")
+    encoded: list[list[str]] = []
+
+    def encode(texts):
+        encoded.append(list(texts))
+        return [[float(len(t)), 1.0] for t in texts]
+
+    first = cache.embed(["a", "bb", "a"], encode)
+    second = cache.embed(["bb", "ccc", "a"], encode)
+    assert encoded == [["a", "bb"], ["ccc"]]
+    assert first == [[1.0, 1.0], [2.0, 1.0], [1.0, 1.0]]
+    assert second == [[2.0, 1.0], [3.0, 1.0], [1.0, 1.0]]
+    assert (cache.hits, cache.misses) == (2, 4)
+
+
+def test_embedding_cache_is_shared_between_instances(tmp_path):
+    reader, writer = EmbeddingCache(tmp_path, "m"), EmbeddingCache(tmp_path, "m")
+    writer.put_many(["a"], [[1.0, 2.0]])
+    assert reader.get_many(["a"]) == [pytest.approx([1.0, 2.0])]
+    writer.put_many(["b", "a"], [[3.0, 4.0], [9.0, 9.0]])  # "a" is kept as first written
+    assert reader.get_many(["b", "a"]) == [pytest.approx([3.0, 4.0]), pytest.approx([1.0, 2.0])]
+    assert EmbeddingCache(tmp_path, "other-model").get_many(["a"]) == [None]
+
+
+def test_embedding_cache_rejects_other_dims_and_clears(tmp_path):
+    cache = EmbeddingCache(tmp_path, "m")
+    cache.put_many(["a"], [[1.0, 2.0]])
+    with pytest.raises(ValueError):
+        cache.put_many(["b"], [[1.0, 2.0, 3.0]])
+    assert cache.get_many(["b"]) == [None]
+    cache.clear()
+    assert cache.get_many(["a"]) == [None]
+    cache.put_many(["a"], [[5.0, 6.0, 7.0]])
+    assert cache.get_many(["a"]) == [pytest.approx([5.0, 6.0, 7.0])]
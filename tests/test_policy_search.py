@@ -0,0 +1,144 @@
+import pytest
+
+import policy_search
+from policy_search import BM25Index, pack_context, rrf_fuse, tokenize
+
+
+def test_tokenize_keeps_identifiers_whole():
+    terms = tokenize("See AFCWI 36-3501, para 4.7.1 and DAF Form 174/10.")
+    assert "36-3501" in terms and "4.7.1" in terms
+    assert {"36", "3501"} <= set(terms)  # hyphenated parts are indexed too
+    assert "174/10" in terms and "10" in terms
+    assert "4" not in terms and "7" not in terms  # dotted numbers are not split
+
+
+def test_tokenize_lowercases_and_drops_trailing_punctuation():
+    assert tokenize("Form 10. EXORD 25-003!") == ["form", "10", "exord", "25-003", "25", "003"]
+
+
+@pytest.fixture
+def index():
+    return BM25Index.build(
+        ["a", "b", "c"],
+        [
+            "Cadets will not wear civilian clothes during duty hours.",
+            "Paragraph 4.7.1 covers hair standards for all cadets.",
+            "A Form 10 documents minor infractions.",
+        ],
+        [{"source": "AFCWI.pdf"}, {"source": "AFCWI.pdf", "section": "4.7.1 Hair"}, {"source": "CS34.md"}],
+    )
+
+
+def test_bm25_finds_exact_identifiers(index):
+    assert index.search("para 4.7.1")[0][0] == "b"
+    assert index.search("form 10")[0][0] == "c"
+
+
+def test_bm25_source_filter_and_top_k(index):
+    assert {i for i, _ in index.search("cadets", source="AFCWI.pdf")} == {"a", "b"}
+    assert index.search("form 10", source="AFCWI.pdf") == []
+    assert len(index.search("cadets", top_k=1)) == 1
+
+
+def test_bm25_save_load_round_trip(index, tmp_path):
+    path = tmp_path / "bm25.json"
+    index.save(path)
+    loaded = BM25Index.load(path)
+    assert loaded.search("para 4.7.1") == index.search("para 4.7.1")
+    assert BM25Index.load(tmp_path / "missing.json") is None
+
+
+def test_rrf_rewards_agreement_between_rankings():
+    fused = rrf_fuse([["a", "b", "c"], ["b", "c", "a"]], k=60)
+    assert [item for item, _ in fused] == ["b", "a", "c"]
+    assert fused[0][1] == pytest.approx(1 / 62 + 1 / 61)
+
+
+def test_rrf_includes_items_from_either_ranking():
+    fused = dict(rrf_fuse([["a"], ["b"]]))
+    assert set(fused) == {"a", "b"} and fused["a"] == fused["b"]
+
+
+# --------------- pack_context ---------------
+
+@pytest.fixture
+def char_tokens(monkeypatch):
+    """Count tokens as ~4 chars each, whether or not tiktoken is installed."""
+    monkeypatch.setattr(policy_search, "_encoding_for", lambda model: None)
+
+
+def chunk(chunk_id: str, text: str) -> dict:
+    return {"id": chunk_id, "text": text, "source": "AFCWI.pdf"}
+
+
+FILLER = "Cadets should consult their chain of command about routine matters every week. "
+
+
+def test_drops_near_duplicate_chunks(char_tokens):
+    text = "Hair must not touch the collar. " + FILLER * 3
+    packed, stats = pack_context("hair", [chunk("a", text), chunk("b", text)], 1000, "gpt-4o")
+    assert [c["id"] for c in packed] == ["a"]
+    assert stats["duplicates_dropped"] == 1
+
+
+def test_removes_sentences_already_packed(char_tokens):
+    first = "Hair must not touch the collar. Beards are not authorized."
+    second = "Beards are not authorized. Mustaches must be neatly trimmed."
+    packed, stats = pack_context("grooming", [chunk("a", first), chunk("b", second)], 1000, "gpt-4o")
+    assert packed[1]["text"] == "Mustaches must be neatly trimmed."
+    assert stats["sentences_trimmed"] == 1
+
+
+def test_stays_within_budget_including_labels(char_tokens):
+    chunks = [chunk(str(i), f"Rule {i} applies to uniforms. " + FILLER * 4) for i in range(10)]
+    packed, stats = pack_context(
+        "uniforms", chunks, 300, "gpt-4o", label=lambda c: f"[SOURCE: {c['source']} | chunk {c['id']}] "
+    )
+    assert stats["context_tokens"] <= 300
+    assert stats["context_tokens"] == sum(c["tokens"] for c in packed)
+    assert 0 < stats["chunks_used"] == len(packed) < len(chunks)
+
+
+def test_trims_oversized_chunk_to_relevant_sentences_in_order(char_tokens):
+    text = (
+        "Tattoos on the hands are prohibited. "
+        + FILLER * 6
+        + "Tattoos on the neck require a waiver from the commander."
+    )
+    packed, stats = pack_context("neck tattoos waiver", [chunk("a", text)], 1000, "gpt-4o", max_chunk_tokens=40)
+    kept = packed[0]["text"]
+    assert kept.endswith("Tattoos on the neck require a waiver from the commander.")
+    assert "chain of command" not in kept
+    assert kept.index("hands") < kept.index("neck")  # document order is preserved
+    assert packed[0]["tokens"] <= 40 + 1
+    assert stats["sentences_trimmed"] > 0
+
+
+def test_stops_when_too_little_room_is_left(char_tokens):
+    chunks = [chunk("a", FILLER * 2), chunk("b", "Hair must not touch the collar.")]
+    packed, _ = pack_context("hair", chunks, 45, "gpt-4o")
+    assert [c["id"] for c in packed] == ["a"]
+
+
+def test_untrimmed_chunks_keep_their_layout(char_tokens):
+    text = "Prohibited items:\n- Earbuds in uniform.\n- Hands in pockets.\n\nSee para 5.2."
+    packed, _ = pack_context("prohibited items", [chunk("a", text)], 1000, "gpt-4o")
+    assert packed[0]["text"] == text
+
+
+def test_trimmed_chunks_keep_line_breaks_between_kept_sentences(char_tokens):
+    first = "Earbuds are prohibited."
+    second = "Uniform rules:\nEarbuds are prohibited.\n- Hands in pockets are prohibited.\n- Caps stay on outdoors."
+    packed, _ = pack_context("uniform", [chunk("a", first), chunk("b", second)], 1000, "gpt-4o")
+    assert packed[1]["text"] == "Uniform rules:\n- Hands in pockets are prohibited.\n- Caps stay on outdoors."
+
+
+def test_text_trimmed_away_is_not_treated_as_seen(char_tokens):
+    detail = "Tattoos on the neck require a waiver from the commander before accession. " * 3
+    lead = "Hair must not touch the collar and must stay neatly groomed while in uniform."
+    packed, stats = pack_context(
+        "hair collar", [chunk("a", f"{lead} {detail}"), chunk("b", detail)], 1000, "gpt-4o", max_chunk_tokens=30
+    )
+    assert packed[0]["text"] == lead
+    assert [c["id"] for c in packed] == ["a", "b"]
+    assert stats["duplicates_dropped"] == 0
@@ -0,0 +1,143 @@
+import asyncio
+import json
+import stat
+
+import pytest
+
+from final_project import APIError, PolicyService, load_or_create_api_token
+
+TOKEN = "s3cret-token"
+HOST = "127.0.0.1:8765"
+
+
+def service(allowed_hosts=frozenset({HOST, "localhost:8765"})) -> PolicyService:
+    """A PolicyService without the model stack (__init__ skipped), for request validation only."""
+    svc = PolicyService.__new__(PolicyService)
+    svc.token = TOKEN
+    svc.allowed_hosts = set(allowed_hosts) if allowed_hosts is not None else None
+    return svc
+
+
+def headers(**overrides) -> dict[str, str]:
+    base = {"host": HOST, "content-type": "application/json", "authorization": f"Bearer {TOKEN}"}
+    base.update(overrides)
+    return {name: value for name, value in base.items() if value is not None}
+
+
+def rejection(svc: PolicyService, method: str, hdrs: dict[str, str]) -> int | None:
+    try:
+        svc.check_headers(method, hdrs)
+    except APIError as e:
+        return e.status
+    return None
+
+
+@pytest.mark.parametrize(
+    "method, hdrs, status",
+    [
+        ("POST", headers(), None),
+        ("POST", headers(**{"content-type": "application/json; charset=utf-8"}), None),
+        ("GET", headers(**{"content-type": None}), None),
+        ("POST", headers(authorization=None), 401),
+        ("POST", headers(authorization="Bearer wrong"), 401),
+        ("POST", headers(host="evil.example:8765"), 403),
+        ("POST", headers(host=None), 403),
+        ("POST", headers(**{"content-type": "text/plain"}), 415),
+        ("POST", headers(**{"content-type": None}), 415),
+    ],
+)
+def test_check_headers(method, hdrs, status):
+    assert rejection(service(), method, hdrs) == status
+
+
+def test_unix_socket_skips_host_check_but_not_token():
+    svc = service(allowed_hosts=None)
+    assert rejection(svc, "POST", headers(host="anything")) is None
+    assert rejection(svc, "POST", headers(host="anything", authorization=None)) == 401
+
+
+def test_no_token_configured_rejects_everything():
+    svc = service()
+    svc.token = None
+    assert rejection(svc, "GET", headers()) == 401
+
+
+def test_document_from_text_or_path(tmp_path):
+    doc = tmp_path / "plan.md"
+    doc.write_text("Event plan", encoding="utf-8")
+    assert asyncio.run(PolicyService.document({"text": "MFR body"})) == ("MFR body", "document.txt")
+    assert asyncio.run(PolicyService.document({"path": str(doc)})) == ("Event plan", "plan.md")
+    assert asyncio.run(PolicyService.document({"path": str(doc), "filename": "x.md"}))[1] == "x.md"
+
+
+@pytest.mark.parametrize(
+    "body, status",
+    [({}, 400), ({"path": "/etc/passwd"}, 400), ({"path": "/nonexistent/plan.md"}, 404)],
+)
+def test_document_validation(body, status):
+    with pytest.raises(APIError) as excinfo:
+        asyncio.run(PolicyService.document(body))
+    assert excinfo.value.status == status
+
+
+async def roundtrip(svc: PolicyService, request: bytes) -> tuple[int, dict]:
+    server = await asyncio.start_server(svc.handle_connection, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    async with server:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(request)
+        await writer.drain()
+        response = await reader.read()
+        writer.close()
+    head, _, body = response.partition(b"\r\n\r\n")
+    return int(head.split()[1]), json.loads(body)
+
+
+def http_request(method: str, path: str, hdrs: dict[str, str], body: bytes = b"") -> bytes:
+    lines = [f"{method} {path} HTTP/1.1"] + [f"{k}: {v}" for k, v in hdrs.items()]
+    lines.append(f"Content-Length: {len(body)}")
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body
+
+
+def test_handle_connection_dispatches_valid_requests():
+    svc = service()
+    seen = []
+
+    async def dispatch(method, path, body):
+        seen.append((method, path, body))
+        return {"ok": True}
+
+    svc.dispatch = dispatch
+    status, payload = asyncio.run(roundtrip(svc, http_request("POST", "/ask?x=1", headers(), b'{"question": "hair?"}')))
+    assert (status, payload) == (200, {"ok": True})
+    assert seen == [("POST", "/ask", {"question": "hair?"})]
+
+
+@pytest.mark.parametrize(
+    "hdrs, body, status",
+    [
+        (headers(authorization=None), b"{}", 401),
+        (headers(host="attacker.test"), b"{}", 403),
+        (headers(**{"content-type": "text/plain"}), b"{}", 415),
+        (headers(), b"[1, 2]", 400),
+        (headers(), b"{not json", 400),
+    ],
+)
+def test_handle_connection_rejects_before_dispatch(hdrs, body, status):
+    svc = service()
+
+    async def dispatch(method, path, body):
+        raise AssertionError("should not dispatch")
+
+    svc.dispatch = dispatch
+    got, payload = asyncio.run(roundtrip(svc, http_request("POST", "/ask", hdrs, body)))
+    assert got == status
+    assert "error" in payload
+
+
+def test_api_token_file_is_private_and_reused(tmp_path):
+    path = tmp_path / "tokens" / "api_token"
+    token = load_or_create_api_token(path)
+    assert len(token) >= 32
+    assert stat.S_IMODE(path.stat().st_mode) == 0o600
+    assert load_or_create_api_token(path) == token